@@ -1,5 +1,5 @@
 import os
-from typing import List
+from typing import Dict, List
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import field_validator
 
@@ -14,6 +14,8 @@ class Settings(BaseSettings):
 	GEMINI_API_KEY: str = ""
 	# Bạn đang dùng Gemini 2.0 Flash:
 	GEMINI_MODEL: str = "gemini-2.0-flash"  # hoặc "gemini-1.5-flash", "gemini-1.5-pro" nếu cần
+	# Tuỳ chọn: proxy hoặc mock server (bench/mock_llm.py); trống = API Google
+	GEMINI_BASE_URL: str = ""
 
 	# ===== OpenAI (giữ để linh hoạt chuyển đổi) =====
 	OPENAI_API_KEY: str = ""
@@ -21,6 +23,137 @@ class Settings(BaseSettings):
 	# Tuỳ chọn cho OpenAI-compatible server (LM Studio/vLLM...):
 	OPENAI_BASE_URL: str = ""
 
+	# ===== LLM HTTP client (dùng chung pool keep-alive) =====
+	LLM_TIMEOUT_S: float = 60.0
+	LLM_MAX_CONNECTIONS: int = 20
+	# Gộp các lời gọi giống hệt nhau (model, prompt, cấu hình) đang chạy đồng thời thành 1 request upstream
+	LLM_SINGLE_FLIGHT: bool = True
+	# Giới hạn phía client theo (provider, model); 0 = không giới hạn. Xem app/services/rate_limit.py
+	LLM_RPM_LIMIT: int = 60
+	LLM_TPM_LIMIT: int = 1_000_000
+	LLM_LIMIT_MAX_WAIT_S: float = 10.0  # phải chờ lâu hơn → báo quá tải (503 / fallback) thay vì xếp hàng
+	LLM_MAX_RETRIES: int = 3
+	LLM_BACKOFF_BASE_S: float = 0.5
+	LLM_BACKOFF_MAX_S: float = 20.0
+	LLM_CIRCUIT_FAILURES: int = 5
+	LLM_CIRCUIT_RESET_S: float = 30.0
+	# Router khi lời gọi không chỉ định provider: "fixed" (= LLM_PROVIDER) | "fallback" | "fastest" | "cheapest"
+	LLM_ROUTING_POLICY: str = "fixed"
+	LLM_ROUTE_BACKENDS: List[str] = ["gemini", "openai"]  # thứ tự fallback (env: JSON list); backend chưa cấu hình bị bỏ qua
+	LLM_COST_PER_MTOK: Dict[str, float] = {"gemini": 0.10, "openai": 2.00}
+	# Hedged request: backend đầu chưa trả lời sau p95 của nó → gửi thêm sang backend thứ hai
+	LLM_HEDGE_ENABLED: bool = True
+	LLM_HEDGE_DELAY_S: float = 3.0  # dùng khi chưa đủ mẫu để tính p95
+	LLM_HEDGE_MIN_DELAY_S: float = 0.5
+	LLM_HEDGE_MIN_SAMPLES: int = 20
+
+	# ===== Khởi động (xem app/core/warmup.py) =====
+	# true = import parser, tạo sẵn process pool, mở kết nối LLM trước khi nhận request
+	# (readiness probe chỉ pass sau warm-up); false = cold start nhanh nhất, mọi thứ tạo lười
+	WARMUP_ON_STARTUP: bool = False
+
+	# ===== Tracing: Server-Timing header + /metrics (Prometheus) =====
+	TRACING_ENABLED: bool = True
+
+	# ===== Summarize =====
+	# Kích thước chunk (token ước lượng, xem app.utils.chunk.estimate_tokens) và phần lặp giữa 2 chunk
+	SUMMARY_CHUNK_TOKENS: int = 4000
+	SUMMARY_CHUNK_OVERLAP_TOKENS: int = 0
+	# Số chunk được tóm tắt song song trong bước map của summarize_text_long
+	SUMMARY_MAP_CONCURRENCY: int = 4
+	# Tree reduce: mỗi lần merge tối đa FAN_IN partial / MAX_CHARS ký tự; MAX_DEPTH = số tầng tối đa
+	SUMMARY_REDUCE_FAN_IN: int = 8
+	SUMMARY_REDUCE_MAX_CHARS: int = 12000
+	SUMMARY_REDUCE_MAX_DEPTH: int = 4
+
+	# ===== Nén extractive cục bộ (TF-IDF / TextRank bằng NumPy, xem app/utils/extractive.py) =====
+	# style → tỉ lệ token giữ lại của mỗi chunk trước khi gửi LLM, ví dụ {"bullet": 0.5}; thiếu / ≥ 1 = không nén (env: JSON)
+	EXTRACTIVE_COMPRESS_RATIO: Dict[str, float] = {}
+	# style → "textrank" (mặc định, O(câu²)) | "tfidf" (nhanh hơn với chunk nhiều câu)
+	EXTRACTIVE_METHOD: Dict[str, str] = {}
+	# Chunk ngắn hơn N token không nén
+	EXTRACTIVE_MIN_TOKENS: int = 500
+	# Chỉ chấm điểm tối đa N câu mỗi lần nén (rải đều trên văn bản); TextRank tốn O(N²) bộ nhớ
+	EXTRACTIVE_MAX_SENTENCES: int = 1000
+	# style="extractive": tóm tắt offline, không gọi LLM, dài tối đa N token
+	EXTRACTIVE_SUMMARY_TOKENS: int = 400
+	# true = provider quá tải / hết quota → trả bản extractive thay vì lỗi 503 / 402
+	SUMMARY_EXTRACTIVE_FALLBACK: bool = False
+
+	# ===== Bỏ trùng trước bước map (xem app/utils/dedupe.py) =====
+	DEDUPE_ENABLED: bool = True
+	# Dòng lặp trên ≥ max(MIN_PAGES, MIN_FRACTION × số trang) trang PDF = header / footer / boilerplate
+	DEDUPE_LINE_MIN_PAGES: int = 3
+	DEDUPE_LINE_MIN_FRACTION: float = 0.5
+	# Luồng trang được bỏ trùng theo cửa sổ N trang (không nạp cả tài liệu vào RAM); tần suất dòng tính trong từng cửa sổ
+	DEDUPE_WINDOW_PAGES: int = 64
+	# Trang / chunk có SimHash cách một trang / chunk trước ≤ N bit (trên 64) bị bỏ
+	DEDUPE_SIMHASH_MAX_DISTANCE: int = 3
+
+	# ===== Extract todos (xem app/services/todo_service.py) =====
+	# Hai todo có text chuẩn hoá giống nhau ≥ ngưỡng này (SequenceMatcher) được gộp; 1.0 = chỉ gộp trùng tuyệt đối
+	TODO_DEDUPE_SIMILARITY: float = 0.85
+
+	# ===== Executors (việc nặng chạy ngoài event loop, xem app/core/executors.py) =====
+	# Process pool cho CPU (0 = số CPU) và thread pool cho I/O blocking
+	EXECUTOR_CPU_WORKERS: int = 0
+	EXECUTOR_CPU_MAX_QUEUE: int = 32
+	EXECUTOR_IO_WORKERS: int = 8
+	EXECUTOR_IO_MAX_QUEUE: int = 32
+	EXECUTOR_TASK_TIMEOUT_S: float = 120.0
+
+	# ===== Upload =====
+	# Body request tối đa (413 nếu vượt); thư mục file tạm (trống = thư mục tạm của hệ thống)
+	UPLOAD_MAX_BYTES: int = 50 * 1024 * 1024
+	UPLOAD_SPOOL_DIR: str = ""
+
+	# ===== PDF extraction =====
+	# PDF từ PDF_PARALLEL_MIN_PAGES trang trở lên được chia thành các dải PDF_PAGES_PER_TASK trang
+	PDF_PAGES_PER_TASK: int = 16
+	PDF_PARALLEL_MIN_PAGES: int = 32
+
+	# ===== OCR cho PDF scan (xem app/services/ocr_service.py) =====
+	OCR_ENABLED: bool = True
+	# Trang có text layer ít hơn N ký tự được coi là trang scan
+	OCR_MIN_TEXT_CHARS: int = 20
+	# Render JPEG xám: 150 DPI đủ cho chữ in (~100–200 KB/trang)
+	OCR_DPI: int = 150
+	OCR_JPEG_QUALITY: int = 70
+	OCR_PAGES_PER_TASK: int = 4
+	# Số trang gộp vào một lời gọi vision, số lời gọi song song, token output tối đa mỗi trang
+	OCR_BATCH_SIZE: int = 4
+	OCR_CONCURRENCY: int = 4
+	OCR_MAX_TOKENS_PER_PAGE: int = 1500
+
+	# ===== Image preprocessing (trước khi gọi vision) =====
+	IMAGE_MAX_DIM: int = 1568
+	IMAGE_TARGET_BYTES: int = 500_000
+	IMAGE_FORMAT: str = "webp"  # webp | jpeg
+	# Ảnh có dHash cách nhau ≤ N bit là ứng viên trùng → dùng lại summary đã cache
+	IMAGE_DEDUPE_MAX_DISTANCE: int = 4
+	# ...nếu thumbnail xám 128x128 chênh nhau ≤ N (0–255) ở mọi điểm ảnh (0 = chỉ dùng lại khi trùng hệt)
+	IMAGE_DEDUPE_MAX_PIXEL_DIFF: int = 32
+
+	# ===== Summary cache =====
+	SUMMARY_CACHE_ENABLED: bool = True
+	SUMMARY_CACHE_MAX_ENTRIES: int = 2048
+	SUMMARY_CACHE_TTL_S: int = 7 * 24 * 3600
+	# Đường dẫn file SQLite cho tầng cache trên đĩa; để trống = chỉ cache trong RAM
+	SUMMARY_CACHE_DB_PATH: str = ""
+	# Số entry tối đa của tầng SQLite (entry cũ nhất bị xoá trước); TTL cũng áp dụng cho tầng này
+	SUMMARY_CACHE_DB_MAX_ENTRIES: int = 100_000
+
+	# ===== Job queue cho tài liệu dài (xem app/services/jobs.py) =====
+	# Thư mục chứa jobs.sqlite3 + file nguồn đang chờ xử lý; để trống = <tmp>/flowai-jobs
+	JOBS_DIR: str = ""
+	JOBS_WORKERS: int = 2
+	# Số job chờ tối đa; vượt quá → 503
+	JOBS_MAX_PENDING: int = 100
+	# Timeout trích xuất text cho một job (lớn hơn EXECUTOR_TASK_TIMEOUT_S vì không có client chờ)
+	JOBS_EXTRACT_TIMEOUT_S: float = 1800.0
+	# Job đã xong / lỗi quá hạn bị xoá khi app khởi động; 0 = giữ mãi
+	JOBS_RETENTION_S: int = 7 * 24 * 3600
+
 	# ===== CORS =====
 	CORS_ORIGINS: List[str] = ["http://localhost:5173"]
 
@@ -29,6 +162,18 @@ class Settings(BaseSettings):
 	def _normalize_provider(cls, v: str) -> str:
 		return (v or "").lower().strip() or "gemini"
 
+	@field_validator("LLM_ROUTING_POLICY")
+	@classmethod
+	def _normalize_policy(cls, v: str) -> str:
+		v = (v or "").lower().strip()
+		return v if v in ("fixed", "fallback", "fastest", "cheapest") else "fixed"
+
+	@field_validator("LLM_ROUTE_BACKENDS", mode="before")
+	@classmethod
+	def _split_backends(cls, v):
+		items = v.split(",") if isinstance(v, str) else v
+		return [str(s).strip().lower() for s in items if str(s).strip()]
+
 	@field_validator("CORS_ORIGINS", mode="before")
 	@classmethod
 	def _split_origins(cls, v):
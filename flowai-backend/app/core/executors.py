@@ -0,0 +1,112 @@
+# app/core/executors.py
+"""
+Executor dùng chung cho việc nặng, để event loop luôn rảnh cho request nhỏ (/health, text...).
+
+- cpu_executor: process pool cho parse PDF / xử lý ảnh / ICS lớn
+- io_executor : thread pool cho I/O blocking (đọc file, điều phối generator đồng bộ...)
+
+run() giới hạn số task đang chờ + chạy (workers + max_queue); vượt quá → ExecutorBusy
+(main.py trả 503 + Retry-After). Task chạy quá timeout → ExecutorTimeout (504).
+Task con gửi thẳng vào .pool (ví dụ các dải trang PDF) không tính vào giới hạn:
+việc chặn tải nằm ở request bao ngoài.
+Lưu ý: task đã quá hạn vẫn chạy nốt trong worker, chỉ request được giải phóng.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+
+class ExecutorBusy(Exception):
+	"""Hàng đợi đã đầy."""
+
+class ExecutorTimeout(Exception):
+	"""Task chạy quá thời gian cho phép."""
+
+class ManagedExecutor:
+	def __init__(self, name: str, kind: str, max_workers: int, max_queue: int, timeout_s: float):
+		self.name = name
+		self.kind = kind
+		self.max_workers = max(1, max_workers)
+		self.max_queue = max(0, max_queue)
+		self.timeout_s = timeout_s
+		self._pool: Optional[Executor] = None
+		self._inflight = 0
+		self._rejected = 0
+		self._timeouts = 0
+		self._lock = threading.Lock()
+
+	@property
+	def pool(self) -> Executor:
+		# tạo lười: không tốn process/thread nếu chưa dùng
+		if self._pool is None:
+			if self.kind == "process":
+				self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+			else:
+				self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+		return self._pool
+
+	def _acquire(self) -> None:
+		with self._lock:
+			if self._inflight >= self.max_workers + self.max_queue:
+				self._rejected += 1
+				raise ExecutorBusy(f"{self.name} executor is busy, try again later")
+			self._inflight += 1
+
+	def _release(self) -> None:
+		with self._lock:
+			self._inflight -= 1
+
+	async def run(self, fn: Callable, *args: Any, timeout: Optional[float] = None) -> Any:
+		self._acquire()
+		try:
+			call = partial(fn, *args)
+			if self.kind == "thread":
+				# giữ contextvars (trace của request) cho code chạy trong thread
+				call = partial(contextvars.copy_context().run, call)
+			fut = asyncio.get_running_loop().run_in_executor(self.pool, call)
+			try:
+				return await asyncio.wait_for(fut, timeout or self.timeout_s)
+			except asyncio.TimeoutError:
+				with self._lock:
+					self._timeouts += 1
+				raise ExecutorTimeout(f"{self.name} task exceeded {timeout or self.timeout_s:.0f}s")
+		finally:
+			self._release()
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			return {
+				"workers": self.max_workers,
+				"max_queue": self.max_queue,
+				"inflight": self._inflight,
+				"rejected": self._rejected,
+				"timeouts": self._timeouts,
+			}
+
+	def shutdown(self) -> None:
+		if self._pool is not None:
+			self._pool.shutdown(wait=False, cancel_futures=True)
+			self._pool = None
+
+cpu_executor = ManagedExecutor(
+	"cpu", "process",
+	max_workers=settings.EXECUTOR_CPU_WORKERS or os.cpu_count() or 1,
+	max_queue=settings.EXECUTOR_CPU_MAX_QUEUE,
+	timeout_s=settings.EXECUTOR_TASK_TIMEOUT_S,
+)
+
+io_executor = ManagedExecutor(
+	"io", "thread",
+	max_workers=settings.EXECUTOR_IO_WORKERS,
+	max_queue=settings.EXECUTOR_IO_MAX_QUEUE,
+	timeout_s=settings.EXECUTOR_TASK_TIMEOUT_S,
+)
+
+def shutdown_executors() -> None:
+	cpu_executor.shutdown()
+	io_executor.shutdown()
@@ -0,0 +1,72 @@
+# app/core/middleware.py
+import time
+
+from fastapi import HTTPException
+from starlette.datastructures import MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import tracing
+from app.core.config import settings
+
+class MaxBodySizeMiddleware:
+	"""
+	Chặn request có body lớn hơn max_bytes (413) trước/trong khi đọc body,
+	để upload quá cỡ không bị spool hết xuống đĩa rồi mới bị từ chối.
+	"""
+	def __init__(self, app: ASGIApp, max_bytes: int):
+		self.app = app
+		self.max_bytes = max_bytes
+
+	async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+		if scope["type"] != "http" or not self.max_bytes:
+			await self.app(scope, receive, send)
+			return
+
+		length = dict(scope.get("headers") or []).get(b"content-length")
+		if length and length.isdigit() and int(length) > self.max_bytes:
+			resp = JSONResponse({"detail": "Request body too large."}, status_code=413)
+			await resp(scope, receive, send)
+			return
+
+		received = 0
+
+		async def _receive() -> Message:
+			nonlocal received
+			message = await receive()
+			if message["type"] == "http.request":
+				received += len(message.get("body", b""))
+				if received > self.max_bytes:
+					# FastAPI giữ nguyên HTTPException khi parse body → trả 413
+					raise HTTPException(status_code=413, detail="Request body too large.")
+			return message
+
+		await self.app(scope, _receive, send)
+
+class TracingMiddleware:
+	"""
+	Mỗi request một Trace (contextvar): các span trong lúc xử lý được gộp vào header
+	Server-Timing khi response bắt đầu, và thời gian request vào histogram theo route.
+	Response streaming: chỉ có các span xảy ra trước khi gửi header.
+	"""
+	def __init__(self, app: ASGIApp):
+		self.app = app
+
+	async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+		if scope["type"] != "http" or not settings.TRACING_ENABLED:
+			await self.app(scope, receive, send)
+			return
+
+		trace = tracing.start_trace()
+
+		async def _send(message: Message) -> None:
+			if message["type"] == "http.response.start":
+				MutableHeaders(scope=message).append("Server-Timing", trace.server_timing())
+				route = scope.get("route")
+				tracing.http_seconds.observe(
+					(scope["method"], getattr(route, "path", "unmatched"), str(message["status"])),
+					time.perf_counter() - trace.start,
+				)
+			await send(message)
+
+		await self.app(scope, receive, _send)
@@ -0,0 +1,183 @@
+# app/core/tracing.py
+"""
+Đo thời gian theo từng stage của request, không cần thư viện ngoài.
+
+- span("pdf.parse", pages=n): context manager đo thời gian + đếm số liệu (bytes, chunks, tokens...)
+- record(name, seconds, **counts): ghi một span đã đo sẵn (ví dụ thời gian chờ future)
+- TracingMiddleware (app/core/middleware.py) tạo Trace cho mỗi request và gắn header Server-Timing
+- render_metrics(): histogram/counter dạng Prometheus text cho /metrics
+
+Span trong io_executor vẫn thuộc request (executor copy contextvars); code chạy trong
+process pool thì đo ở phía gọi. TRACING_ENABLED=false → span() trả object no-op dùng chung,
+middleware chuyển thẳng request: gần như không tốn gì.
+"""
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+# ========= Trace của request hiện tại =========
+class Trace:
+	def __init__(self):
+		self.start = time.perf_counter()
+		self.spans: List[Tuple[str, float]] = []  # list.append an toàn giữa các thread
+
+	def add(self, name: str, seconds: float) -> None:
+		self.spans.append((name, seconds))
+
+	def server_timing(self) -> str:
+		# gộp các span cùng tên: tổng thời gian + số lần (desc)
+		agg: Dict[str, List[float]] = {}
+		for name, seconds in list(self.spans):
+			a = agg.setdefault(name, [0.0, 0])
+			a[0] += seconds
+			a[1] += 1
+		parts = [
+			f'{name};dur={total * 1000:.1f}' + (f';desc="x{n}"' if n > 1 else "")
+			for name, (total, n) in agg.items()
+		]
+		parts.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.1f}")
+		return ", ".join(parts)
+
+_current: ContextVar[Optional[Trace]] = ContextVar("flowai_trace", default=None)
+
+def start_trace() -> Trace:
+	trace = Trace()
+	_current.set(trace)
+	return trace
+
+# ========= Metrics =========
+_INF = 'le="+Inf"'
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+	pairs = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+	if extra:
+		pairs.append(extra)
+	return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Histogram:
+	def __init__(self, name: str, help: str, label_names: Tuple[str, ...], buckets: Tuple[float, ...] = _BUCKETS):
+		self.name = name
+		self.help = help
+		self.label_names = label_names
+		self.buckets = buckets
+		self._series: Dict[Tuple[str, ...], List[float]] = {}  # counts theo bucket..., +Inf, sum
+		self._lock = threading.Lock()
+
+	def observe(self, labels: Tuple[str, ...], value: float) -> None:
+		with self._lock:
+			s = self._series.get(labels)
+			if s is None:
+				s = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+			for i, b in enumerate(self.buckets):
+				if value <= b:
+					s[i] += 1
+			s[-2] += 1
+			s[-1] += value
+
+	def render(self) -> List[str]:
+		out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+		with self._lock:
+			series = {k: list(v) for k, v in self._series.items()}
+		for labels, s in sorted(series.items()):
+			for b, c in zip(self.buckets, s):
+				le = 'le="%s"' % b
+				out.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {int(c)}")
+			out.append(f"{self.name}_bucket{_labels(self.label_names, labels, _INF)} {int(s[-2])}")
+			out.append(f"{self.name}_sum{_labels(self.label_names, labels)} {s[-1]:.6f}")
+			out.append(f"{self.name}_count{_labels(self.label_names, labels)} {int(s[-2])}")
+		return out
+
+class Counter:
+	def __init__(self, name: str, help: str, label_names: Tuple[str, ...]):
+		self.name = name
+		self.help = help
+		self.label_names = label_names
+		self._values: Dict[Tuple[str, ...], float] = {}
+		self._lock = threading.Lock()
+
+	def inc(self, labels: Tuple[str, ...], value: float = 1.0) -> None:
+		with self._lock:
+			self._values[labels] = self._values.get(labels, 0.0) + value
+
+	def render(self) -> List[str]:
+		out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+		with self._lock:
+			values = dict(self._values)
+		for labels, v in sorted(values.items()):
+			out.append(f"{self.name}{_labels(self.label_names, labels)} {v:g}")
+		return out
+
+http_seconds = Histogram(
+	"flowai_http_request_duration_seconds", "HTTP request latency (until response start)", ("method", "route", "status")
+)
+stage_seconds = Histogram("flowai_stage_duration_seconds", "Duration of a pipeline stage", ("stage",))
+stage_total = Counter("flowai_stage_items_total", "Items processed by a stage (bytes, pages, chunks, tokens...)", ("stage", "item"))
+
+# ========= Span =========
+def record(name: str, seconds: float, **counts: float) -> None:
+	if not settings.TRACING_ENABLED:
+		return
+	trace = _current.get()
+	if trace is not None:
+		trace.add(name, seconds)
+	stage_seconds.observe((name,), seconds)
+	for item, n in counts.items():
+		if n:
+			stage_total.inc((name, item), n)
+
+class _Span:
+	__slots__ = ("name", "counts", "t0")
+
+	def __init__(self, name: str, counts: Dict[str, float]):
+		self.name = name
+		self.counts = counts
+
+	def set(self, **counts: float) -> None:
+		"""Bổ sung số liệu chỉ biết sau khi chạy (số chunk, token output...)."""
+		self.counts.update(counts)
+
+	def __enter__(self) -> "_Span":
+		self.t0 = time.perf_counter()
+		return self
+
+	def __exit__(self, *exc) -> None:
+		record(self.name, time.perf_counter() - self.t0, **self.counts)
+
+class _NoopSpan:
+	__slots__ = ()
+
+	def set(self, **counts: float) -> None:
+		pass
+
+	def __enter__(self) -> "_NoopSpan":
+		return self
+
+	def __exit__(self, *exc) -> None:
+		pass
+
+_NOOP = _NoopSpan()
+
+def span(name: str, **counts: float):
+	if not settings.TRACING_ENABLED:
+		return _NOOP
+	return _Span(name, counts)
+
+# ========= /metrics =========
+def render_metrics(gauges: Optional[Dict[str, float]] = None) -> str:
+	"""
+	Prometheus text format. gauges: số liệu tức thời gom từ cache / executor / LLM client,
+	key là tên series, có thể kèm label: 'flowai_executor_inflight{pool="cpu"}'.
+	"""
+	lines = http_seconds.render() + stage_seconds.render() + stage_total.render()
+	typed = set()
+	for series, value in (gauges or {}).items():
+		name = series.split("{", 1)[0]
+		if name not in typed:
+			typed.add(name)
+			lines.append(f"# TYPE {name} gauge")
+		lines.append(f"{series} {float(value):g}")
+	return "\n".join(lines) + "\n"
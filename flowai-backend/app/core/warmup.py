@@ -0,0 +1,35 @@
+# app/core/warmup.py
+"""
+Warm-up khi khởi động (WARMUP_ON_STARTUP=true). Chạy trong lifespan, trước khi uvicorn nhận
+request, nên readiness probe (/health) chỉ pass khi đã xong. Mặc định tắt: thư viện nặng
+(PyMuPDF, pdfplumber, Pillow) và pool chỉ được tạo ở lần dùng đầu.
+
+Thời gian từng bước được ghi vào stage histogram (warmup.*) trên /metrics.
+"""
+import asyncio
+import time
+
+from app.core.executors import cpu_executor, io_executor
+from app.core.tracing import record
+from app.services import llm_client
+
+def _import_parsers() -> None:
+	import fitz  # noqa: F401
+	import pdfplumber  # noqa: F401
+	from PIL import Image  # noqa: F401
+
+async def warm_up() -> None:
+	t0 = time.perf_counter()
+	await io_executor.run(_import_parsers)
+	record("warmup.imports", time.perf_counter() - t0)
+
+	# tạo đủ worker của process pool, mỗi worker import sẵn parser
+	t0 = time.perf_counter()
+	loop = asyncio.get_running_loop()
+	pool = cpu_executor.pool
+	await asyncio.gather(*(loop.run_in_executor(pool, _import_parsers) for _ in range(cpu_executor.max_workers)))
+	record("warmup.cpu_pool", time.perf_counter() - t0)
+
+	t0 = time.perf_counter()
+	await llm_client.warm_up()
+	record("warmup.llm", time.perf_counter() - t0)
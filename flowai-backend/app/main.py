@@ -1,19 +1,55 @@
 # app/main.py
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Body
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, Response
-from typing import Optional, List
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Optional, List, AsyncIterator, Dict, Any
 import datetime as dt
+import json
+import math
 
 from app.core.config import settings
-from app.services.summarize_service import summarize_text_long, summarize_image
-from app.services.pdf_service import extract_text_from_pdf
-from app.services.planner_service import plan_goals, schedule_tasks, make_ics
+from app.core.executors import cpu_executor, io_executor, shutdown_executors, ExecutorBusy, ExecutorTimeout
+from app.core.middleware import MaxBodySizeMiddleware, TracingMiddleware
+from app.core.tracing import render_metrics, span
+from app.core.warmup import warm_up
+from app.services.summarize_service import (
+	summarize_text_long, summarize_text_stream, summarize_image,
+	summarize_chunks, summarize_chunks_stream,
+)
+from app.services.ocr_service import pdf_to_chunks
+from app.services.image_service import preprocess_image
+from app.services.ics import validate_events
+from app.services.planner_service import plan_goals, schedule_tasks, replan_tasks, schedule_batch, batch_plan_ids, merge_scheduled, iter_ics
+from app.services import llm_client
+from app.services.cache import summary_cache
+from app.services.rate_limit import guard_stats
+from app.services.jobs import JobQueueFull, job_manager, public_view
+from app.services.todo_service import extract_todos
+from app.utils.upload import spool_upload
+
+# ===== Lifespan: warm-up (tuỳ chọn) + worker job queue; đóng pool HTTP của LLM client + executors khi tắt app =====
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+	if settings.WARMUP_ON_STARTUP:
+		await warm_up()
+	await job_manager.start()
+	yield
+	await job_manager.stop()
+	await llm_client.aclose()
+	shutdown_executors()
 
 # ===== FastAPI app (PHẢI khai báo trước khi dùng @app.*) =====
-app = FastAPI(title="FlowAI Summarizer", version="0.1.0")
+app = FastAPI(title="FlowAI Summarizer", version="0.1.0", lifespan=lifespan)
+
+# ===== Giới hạn kích thước body (upload) =====
+app.add_middleware(MaxBodySizeMiddleware, max_bytes=settings.UPLOAD_MAX_BYTES)
+
+# ===== Tracing: Server-Timing + histogram theo route (bọc ngoài giới hạn body) =====
+app.add_middleware(TracingMiddleware)
 
-# ===== CORS =====
+# ===== CORS (thêm sau cùng → bọc ngoài cùng, lỗi 413 vẫn có header CORS) =====
 app.add_middleware(
 	CORSMiddleware,
 	allow_origins=settings.CORS_ORIGINS,
@@ -24,24 +60,54 @@ app.add_middleware(
 
 from app.core.ai_router import router as ai_router
 app.include_router(ai_router)
-for r in app.router.routes:
-    try:
-        print("ROUTE:", r.path, list(getattr(r, "methods", [])))
-    except Exception:
-        pass
 
 
-# ===== Helper: map lỗi quota thành 402 =====
+# ===== Helper: map lỗi quota thành 402, executor / job queue quá tải thành 503/504 =====
 def _httpize_exception(e: Exception):
+	if isinstance(e, ExecutorBusy):
+		raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+	if isinstance(e, JobQueueFull):
+		raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+	if isinstance(e, ExecutorTimeout):
+		raise HTTPException(status_code=504, detail=str(e))
+	if isinstance(e, llm_client.LLMUnavailable):
+		# quá tải / circuit mở: trả 503 để client thử lại sau, không đổ lỗi 500
+		retry = str(max(1, math.ceil(e.retry_after)))
+		raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": retry})
 	msg = str(e)
 	low = msg.lower()
 	if "insufficient_quota" in low or "exceeded your current quota" in low:
 		raise HTTPException(status_code=402, detail="Out of credits or billing inactive.")
 	return JSONResponse({"error": msg}, status_code=500)
 
+# ===== Helper: Server-Sent Events =====
+def _sse(ev: Dict[str, Any]) -> str:
+	return f"event: {ev['event']}\ndata: {json.dumps(ev, ensure_ascii=False)}\n\n"
+
+def _sse_response(events: AsyncIterator[Dict[str, Any]]) -> StreamingResponse:
+	async def _gen():
+		try:
+			async for ev in events:
+				yield _sse(ev)
+		except Exception as e:
+			# header 200 đã gửi → báo lỗi bằng event cuối
+			yield _sse({"event": "error", "error": str(e)})
+	headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+	return StreamingResponse(_gen(), media_type="text/event-stream", headers=headers)
+
+# ===== Helper: ICS streaming (generator đồng bộ → Starlette chạy trong threadpool) =====
+def _ics_response(scheduled: List[Dict[str, Any]], calendar_name: str) -> StreamingResponse:
+	# kiểm tra trước: khi đã stream thì status 200 đã gửi, lỗi chỉ còn là body rỗng
+	try:
+		validate_events(scheduled)
+	except ValueError as e:
+		raise HTTPException(status_code=422, detail=str(e))
+	headers = {"Content-Disposition": 'attachment; filename="flowai_plan.ics"'}
+	return StreamingResponse(iter_ics(scheduled, calendar_name), media_type="text/calendar", headers=headers)
+
 # ===== Health =====
 @app.get("/health")
-def health():
+async def health():
 	return {"status": "ok"}
 
 # ===== Summarize: TEXT =====
@@ -51,7 +117,7 @@ async def summarize_text_endpoint(
 	style: str = Form("bullet")
 ):
 	try:
-		summary = summarize_text_long(text, style=style)
+		summary = await summarize_text_long(text, style=style)
 		return {"mode": "text", "summary": summary}
 	except Exception as e:
 		return _httpize_exception(e)
@@ -63,17 +129,42 @@ async def summarize_pdf_endpoint(
 	style: str = Form("bullet")
 ):
 	try:
-		data = await file.read()
-		full_text = extract_text_from_pdf(data)
-		if not full_text:
-			raise HTTPException(status_code=422, detail="No extractable text in PDF (try OCR workflow).")
-		summary = summarize_text_long(full_text, style=style)
-		return {"mode": "pdf", "summary": summary}
+		# upload → file tạm; trang được trích xuất song song theo đường dẫn, trang scan được OCR
+		preprocess: Dict[str, Any] = {}
+		async with spool_upload(file, suffix=".pdf") as path:
+			chunks = await pdf_to_chunks(path, preprocess)
+		if not chunks:
+			raise HTTPException(status_code=422, detail="No extractable text in PDF.")
+		summary = await summarize_chunks(chunks, style=style)
+		# provenance: dòng lặp / chunk trùng đã bỏ trước khi gửi LLM
+		return {"mode": "pdf", "summary": summary, "preprocess": preprocess}
 	except HTTPException:
 		raise
 	except Exception as e:
 		return _httpize_exception(e)
 
+# ===== Summarize (streaming SSE): TEXT / PDF =====
+@app.post("/summarize/text/stream")
+async def summarize_text_stream_endpoint(
+	text: str = Form(..., description="raw text to summarize"),
+	style: str = Form("bullet")
+):
+	return _sse_response(summarize_text_stream(text, style=style))
+
+@app.post("/summarize/pdf/stream")
+async def summarize_pdf_stream_endpoint(
+	file: UploadFile = File(...),
+	style: str = Form("bullet")
+):
+	try:
+		async with spool_upload(file, suffix=".pdf") as path:
+			chunks = await pdf_to_chunks(path)
+	except Exception as e:
+		return _httpize_exception(e)
+	if not chunks:
+		raise HTTPException(status_code=422, detail="No extractable text in PDF.")
+	return _sse_response(summarize_chunks_stream(chunks, style=style))
+
 # ===== Summarize: IMAGE =====
 @app.post("/summarize/image")
 async def summarize_image_endpoint(
@@ -81,13 +172,59 @@ async def summarize_image_endpoint(
 	style: str = Form("bullet")
 ):
 	try:
-		img_bytes = await file.read()
-		content_type = file.content_type or "image/png"
-		summary = summarize_image(img_bytes, content_type=content_type, style=style)
+		# xoay EXIF, thu nhỏ, nén lại + phash / thumbnail trên process pool
+		async with spool_upload(file) as path:
+			with span("image.preprocess") as sp:
+				img_bytes, mime, phash, thumb = await cpu_executor.run(preprocess_image, path)
+				sp.set(bytes=len(img_bytes))
+		content_type = mime or file.content_type or "image/png"
+		summary = await summarize_image(img_bytes, content_type=content_type, style=style, phash=phash, thumb=thumb)
 		return {"mode": "image", "summary": summary}
+	except HTTPException:
+		raise
+	except Exception as e:
+		return _httpize_exception(e)
+
+# ===== Jobs: tài liệu dài xử lý nền, client poll tiến độ =====
+@app.post("/jobs/summarize/pdf", status_code=202)
+async def submit_pdf_job(
+	file: UploadFile = File(...),
+	style: str = Form("bullet")
+):
+	try:
+		async with spool_upload(file, suffix=".pdf") as path:
+			job, deduplicated = await job_manager.submit("pdf", style, path)
+		return {**public_view(job), "deduplicated": deduplicated}
 	except Exception as e:
 		return _httpize_exception(e)
 
+@app.post("/jobs/summarize/text", status_code=202)
+async def submit_text_job(
+	text: str = Form(...),
+	style: str = Form("bullet")
+):
+	try:
+		job, deduplicated = await job_manager.submit_text(text, style)
+		return {**public_view(job), "deduplicated": deduplicated}
+	except Exception as e:
+		return _httpize_exception(e)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+	job = await job_manager.get(job_id)
+	if job is None:
+		raise HTTPException(status_code=404, detail="Job not found")
+	return public_view(job)
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+	job = await job_manager.get(job_id)
+	if job is None:
+		raise HTTPException(status_code=404, detail="Job not found")
+	if job["status"] != "done":
+		raise HTTPException(status_code=409, detail=f"Job is {job['status']}", headers={"Retry-After": "5"})
+	return {"job_id": job["id"], "mode": job["kind"], "summary": job["result"]}
+
 # ===== NOTE: summarize current note =====
 @app.post("/ai/summarize-note")
 async def summarize_note_endpoint(
@@ -95,19 +232,28 @@ async def summarize_note_endpoint(
 	style: str = Form("bullet")
 ):
 	try:
-		return {"mode": "note", "summary": summarize_text_long(text, style=style)}
+		return {"mode": "note", "summary": await summarize_text_long(text, style=style)}
 	except Exception as e:
 		return _httpize_exception(e)
 
-# ===== NOTE: extract todos (bulleted) =====
+# ===== NOTE: extract todos (JSON theo chunk, gộp trùng tại chỗ; start_date → xếp lịch luôn) =====
 @app.post("/ai/extract-todos")
-async def extract_todos_endpoint(text: str = Form(...)):
+async def extract_todos_endpoint(
+	text: str = Form(...),
+	start_date: Optional[str] = Form(None)
+):
+	if start_date:
+		# kiểm tra trước khi gọi LLM: ngày sai là lỗi của client (422), không phải 500
+		try:
+			dt.date.fromisoformat(start_date)
+		except ValueError:
+			raise HTTPException(status_code=422, detail=f"Invalid start_date: {start_date!r} (expected yyyy-mm-dd)")
 	try:
-		prompt = (
-			"From the following note, extract a concise checklist of actionable items. "
-			"Return bullet points only:\n\n" + text
-		)
-		return {"todos": summarize_text_long(prompt, style="bullet")}
+		todos = await extract_todos(text)
+		out: Dict[str, Any] = {"todos": todos}
+		if start_date:
+			out["scheduled"] = await cpu_executor.run(schedule_tasks, todos, start_date)
+		return out
 	except Exception as e:
 		return _httpize_exception(e)
 
@@ -119,7 +265,7 @@ async def plan_goals_endpoint(payload: dict = Body(...)):
 		timeframe = payload.get("timeframe", "week")
 		if not goal:
 			raise HTTPException(status_code=400, detail="Missing 'goal'")
-		tasks = plan_goals(goal, timeframe)
+		tasks = await plan_goals(goal, timeframe)
 		return {"tasks": tasks}
 	except HTTPException:
 		raise
@@ -134,19 +280,82 @@ async def schedule_endpoint(payload: dict = Body(...)):
 		start_date = payload.get("start_date") or dt.date.today().isoformat()
 		work_hours = payload.get("work_hours", "09:00-17:00")
 		tz = payload.get("timezone", "Asia/Ho_Chi_Minh")
-		scheduled = schedule_tasks(tasks, start_date, work_hours, tz)
+		scheduled = await cpu_executor.run(partial(
+			schedule_tasks,
+			tasks, start_date, work_hours, tz,
+			busy=payload.get("busy"),
+			holidays=payload.get("holidays"),
+			lunch=payload.get("lunch", "12:00-13:00"),
+			plan_id=payload.get("plan_id"),
+		))
 		return {"scheduled": scheduled}
 	except Exception as e:
 		return _httpize_exception(e)
 
+# ===== TRACKER: incremental re-plan (chỉ trả các event thay đổi) =====
+@app.post("/ai/schedule/incremental")
+async def schedule_incremental_endpoint(payload: dict = Body(...)):
+	"""
+	payload: {previous: [events đã xếp], delta: [{op: add|remove|resize|pin, ...}],
+	          work_hours?, timezone?, busy?, holidays?, lunch?, start_date?, plan_id?, format?: "json" | "ics", calendar_name?}
+	"""
+	try:
+		# replan chạy trên process pool như schedule_tasks: lịch lớn không chặn event loop
+		result = await cpu_executor.run(partial(
+			replan_tasks,
+			payload.get("previous", []),
+			payload.get("delta", []),
+			payload.get("work_hours", "09:00-17:00"),
+			payload.get("timezone", "Asia/Ho_Chi_Minh"),
+			busy=payload.get("busy"),
+			holidays=payload.get("holidays"),
+			lunch=payload.get("lunch", "12:00-13:00"),
+			start_date=payload.get("start_date"),
+			plan_id=payload.get("plan_id"),
+		))
+		if payload.get("format") == "ics":
+			events = result["changed"] + result["cancelled"]
+			return _ics_response(events, payload.get("calendar_name", "FlowAI Plan"))
+		return result
+	except HTTPException:
+		raise
+	except (KeyError, ValueError) as e:
+		raise HTTPException(status_code=400, detail=f"Invalid delta: {e}")
+	except Exception as e:
+		return _httpize_exception(e)
+
+# ===== TRACKER: batch schedule (nhiều plan / nhiều user trong một request) =====
+@app.post("/ai/schedule/batch")
+async def schedule_batch_endpoint(payload: dict = Body(...)):
+	"""
+	payload: {plans: [{id, tasks, start_date?, work_hours?, timezone?, busy?, holidays?, lunch?}, ...],
+	          format?: "json" | "ics", calendar_name?}
+	"""
+	try:
+		plans = payload.get("plans", [])
+		if not isinstance(plans, list):
+			raise HTTPException(status_code=400, detail="'plans' must be a list")
+		try:
+			batch_plan_ids(plans)
+		except ValueError as e:
+			raise HTTPException(status_code=422, detail=str(e))
+		results = await io_executor.run(schedule_batch, plans, cpu_executor.pool, cpu_executor.max_workers)
+		if payload.get("format") == "ics":
+			return _ics_response(merge_scheduled(results), payload.get("calendar_name", "FlowAI Plan"))
+		return {"results": results}
+	except HTTPException:
+		raise
+	except Exception as e:
+		return _httpize_exception(e)
+
 # ===== Calendar: export ICS =====
 @app.post("/calendar/export-ics")
 async def export_ics_endpoint(payload: dict = Body(...)):
 	try:
 		scheduled = payload.get("scheduled", [])
-		ics = make_ics(scheduled, calendar_name=payload.get("calendar_name", "FlowAI Plan"))
-		headers = {"Content-Disposition": 'attachment; filename="flowai_plan.ics"'}
-		return Response(content=ics, media_type="text/calendar", headers=headers)
+		return _ics_response(scheduled, payload.get("calendar_name", "FlowAI Plan"))
+	except HTTPException:
+		raise
 	except Exception as e:
 		return _httpize_exception(e)
 
@@ -158,5 +367,32 @@ def debug_llm():
 		"provider": settings.LLM_PROVIDER,
 		"model": settings.GEMINI_MODEL,
 		"key_prefix": key[:6],
-		"has_key": bool(key)
+		"has_key": bool(key),
+		"single_flight": llm_client.single_flight_stats(),
+		"limits": guard_stats(),
+		"routing": llm_client.router.stats(),
 	}
+
+@app.get("/debug/cache", include_in_schema=False)
+def debug_cache():
+	return summary_cache.stats()
+
+@app.get("/debug/executors", include_in_schema=False)
+def debug_executors():
+	return {"cpu": cpu_executor.stats(), "io": io_executor.stats()}
+
+# ===== Prometheus =====
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+	gauges: Dict[str, float] = {}
+	for k, v in summary_cache.stats().items():
+		gauges[f"flowai_summary_cache_{k}"] = v
+	for pool in (cpu_executor, io_executor):
+		for k, v in pool.stats().items():
+			gauges[f'flowai_executor_{k}{{pool="{pool.name}"}}'] = v
+	for k, v in llm_client.single_flight_stats().items():
+		gauges[f"flowai_llm_single_flight_{k}"] = v
+	for key, g in guard_stats().items():
+		gauges[f'flowai_llm_rate_scale{{backend="{key}"}}'] = g["scale"]
+		gauges[f'flowai_llm_circuit_open{{backend="{key}"}}'] = g["circuit"]["state"] != "closed"
+	return PlainTextResponse(render_metrics(gauges), media_type="text/plain; version=0.0.4")
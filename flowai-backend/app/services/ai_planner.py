@@ -1,16 +1,12 @@
-import os, json, re, math
-import requests
+import json, re, math
 from datetime import datetime
 from typing import Dict, Any, List
-from dotenv import load_dotenv
 from pydantic import TypeAdapter, ValidationError
+from app.core.config import settings
 from app.models.ai import PlanGoalRequest, PlanGoalResponse, Subtask
+from app.services import llm_client
 
-load_dotenv()
-
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
-DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
-GL_API = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+DEFAULT_MODEL = settings.GEMINI_MODEL
 
 # --------- local fallback heuristics ----------
 def _smart_split(title: str, desc: str) -> List[str]:
@@ -51,7 +47,7 @@ def _fallback_plan(req: PlanGoalRequest) -> Dict[str, Any]:
 		subtasks.append({"id": i, "text": text, "duration": dur})
 	return {"subtasks": subtasks, "notes": "fallback_local"}
 
-# --------- call Gemini (REST) ----------
+# --------- call Gemini (async REST client) ----------
 def _prompt(req: PlanGoalRequest) -> str:
 	return "\n".join([
 		"Bạn là trợ lý lập kế hoạch & quản trị công việc.",
@@ -68,29 +64,15 @@ def _prompt(req: PlanGoalRequest) -> str:
 		f"Due: {req.due or ''}"
 	])
 
-def _call_gemini(req: PlanGoalRequest) -> Dict[str, Any]:
-	if not GEMINI_API_KEY:
-		raise RuntimeError("Missing GEMINI_API_KEY")
-	model = req.model or DEFAULT_MODEL
-	url = GL_API.format(model=model) + f"?key={GEMINI_API_KEY}"
-
-	payload = {
-		"contents": [{"role": "user", "parts": [{"text": _prompt(req)}]}],
-		"generationConfig": {
-			"response_mime_type": "application/json"
-		}
-	}
-	r = requests.post(url, json=payload, timeout=60)
-	r.raise_for_status()
-	data = r.json()
-
-	# lấy JSON string từ candidates -> content -> parts[0].text
-	txt = ""
-	try:
-		txt = data["candidates"][0]["content"]["parts"][0]["text"]
-	except Exception:
-		raise RuntimeError("LLM returned unexpected structure")
-    
+async def _call_gemini(req: PlanGoalRequest) -> Dict[str, Any]:
+	# client ném RuntimeError khi thiếu key / cấu trúc trả về lạ
+	txt = await llm_client.generate_text(
+		_prompt(req),
+		max_tokens=None,
+		provider="gemini",
+		model=req.model or DEFAULT_MODEL,
+		json_mode=True,
+	)
 	return json.loads(txt)
 
 # --------- public entry ----------
@@ -102,10 +84,13 @@ def _norm_date(s):
     except Exception:
         return None
 
-def plan_goal(req: PlanGoalRequest) -> PlanGoalResponse:
+async def plan_goal(req: PlanGoalRequest) -> PlanGoalResponse:
     try:
-        raw = _call_gemini(req)
+        raw = await _call_gemini(req)
 		
+    except llm_client.LLMUnavailable:
+        # quá tải / circuit mở -> giảm cấp sang heuristics local
+        raw = _fallback_plan(req)
     except RuntimeError as e:
         # lỗi cấu hình/quota -> cho nổi lên
         raise
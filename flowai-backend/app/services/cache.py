@@ -0,0 +1,186 @@
+# app/services/cache.py
+"""
+Cache kết quả tóm tắt theo nội dung (content-addressed).
+
+- Tầng 1: LRU trong RAM (giới hạn số entry + TTL)
+- Tầng 2 (tuỳ chọn): SQLite trên đĩa, sống sót qua restart (SUMMARY_CACHE_DB_PATH),
+  giới hạn SUMMARY_CACHE_DB_MAX_ENTRIES entry + cùng TTL (prune định kỳ khi ghi)
+  Code async dùng aget/aset: truy vấn SQLite chạy trên io_executor (lock riêng), không chặn event loop
+
+Key = sha256 của (router scope = policy + backend, style, phiên bản prompt, nội dung) → xem make_key().
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, Union
+
+from app.core.config import settings
+from app.core.executors import ExecutorBusy, ExecutorTimeout, io_executor
+
+def make_key(*parts: Union[str, bytes]) -> str:
+	h = hashlib.sha256()
+	for p in parts:
+		b = p if isinstance(p, bytes) else str(p).encode("utf-8")
+		# tiền tố độ dài để ("ab","c") và ("a","bc") không đụng key
+		h.update(len(b).to_bytes(8, "big"))
+		h.update(b)
+	return h.hexdigest()
+
+class SummaryCache:
+	# prune tầng SQLite (TTL + số entry) sau mỗi N lần ghi
+	PRUNE_EVERY = 64
+
+	def __init__(self, max_entries: int = 2048, ttl_s: float = 0, db_path: str = "", db_max_entries: int = 0):
+		self.max_entries = max_entries
+		self.ttl_s = ttl_s
+		self.db_max_entries = db_max_entries
+		self._mem: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+		# _lock chỉ giữ quanh LRU + stats (event loop dùng); SQLite có lock riêng (io thread giữ lâu)
+		self._lock = threading.Lock()
+		self._db_lock = threading.Lock()
+		self._stats: Dict[str, int] = {
+			"hits_memory": 0, "hits_disk": 0, "misses": 0, "sets": 0, "evictions": 0, "evictions_disk": 0,
+		}
+		self._db: Optional[sqlite3.Connection] = None
+		self._disk_writes = 0
+		if db_path:
+			self._db = sqlite3.connect(db_path, check_same_thread=False)
+			self._db.execute(
+				"CREATE TABLE IF NOT EXISTS summary_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+			)
+			self._db.execute("CREATE INDEX IF NOT EXISTS summary_cache_created ON summary_cache (created_at)")
+			self._db.commit()
+			self._prune_disk(time.time())
+
+	def _expired(self, created_at: float) -> bool:
+		return bool(self.ttl_s) and time.time() - created_at > self.ttl_s
+
+	def _mem_put(self, key: str, created_at: float, value: str) -> None:
+		self._mem[key] = (created_at, value)
+		self._mem.move_to_end(key)
+		while len(self._mem) > self.max_entries:
+			self._mem.popitem(last=False)
+			self._stats["evictions"] += 1
+
+	def _get_memory(self, key: str) -> Optional[str]:
+		with self._lock:
+			hit = self._mem.get(key)
+			if hit is not None:
+				if not self._expired(hit[0]):
+					self._mem.move_to_end(key)
+					self._stats["hits_memory"] += 1
+					return hit[1]
+				del self._mem[key]
+			if self._db is None:
+				self._stats["misses"] += 1
+			return None
+
+	def _get_disk(self, key: str) -> Optional[str]:
+		with self._db_lock:
+			row = self._db.execute(
+				"SELECT value, created_at FROM summary_cache WHERE key = ?", (key,)
+			).fetchone()
+			if row is not None and self._expired(row[1]):
+				self._db.execute("DELETE FROM summary_cache WHERE key = ?", (key,))
+				self._db.commit()
+				row = None
+		with self._lock:
+			if row is None:
+				self._stats["misses"] += 1
+				return None
+			value, created_at = row
+			self._mem_put(key, created_at, value)
+			self._stats["hits_disk"] += 1
+			return value
+
+	def _set_memory(self, key: str, value: str, now: float) -> None:
+		with self._lock:
+			self._mem_put(key, now, value)
+			self._stats["sets"] += 1
+
+	def _set_disk(self, key: str, value: str, now: float) -> None:
+		with self._db_lock:
+			self._db.execute(
+				"INSERT OR REPLACE INTO summary_cache (key, value, created_at) VALUES (?, ?, ?)",
+				(key, value, now),
+			)
+			self._db.commit()
+			self._disk_writes += 1
+			prune = self._disk_writes % self.PRUNE_EVERY == 0
+		if prune:
+			self._prune_disk(now)
+
+	def _prune_disk(self, now: float) -> None:
+		# xoá entry hết TTL, rồi entry cũ nhất cho tới khi còn ≤ db_max_entries
+		with self._db_lock:
+			removed = 0
+			if self.ttl_s:
+				removed += self._db.execute(
+					"DELETE FROM summary_cache WHERE created_at < ?", (now - self.ttl_s,)
+				).rowcount
+			if self.db_max_entries:
+				(count,) = self._db.execute("SELECT COUNT(*) FROM summary_cache").fetchone()
+				if count > self.db_max_entries:
+					removed += self._db.execute(
+						"DELETE FROM summary_cache WHERE key IN "
+						"(SELECT key FROM summary_cache ORDER BY created_at LIMIT ?)",
+						(count - self.db_max_entries,),
+					).rowcount
+			self._db.commit()
+		if removed:
+			with self._lock:
+				self._stats["evictions_disk"] += removed
+
+	def get(self, key: str) -> Optional[str]:
+		hit = self._get_memory(key)
+		if hit is None and self._db is not None:
+			hit = self._get_disk(key)
+		return hit
+
+	def set(self, key: str, value: str) -> None:
+		now = time.time()
+		self._set_memory(key, value, now)
+		if self._db is not None:
+			self._set_disk(key, value, now)
+
+	# bản async cho event loop: LRU tra tại chỗ, chỉ tầng SQLite chạy trên io_executor
+	# io_executor đầy / quá hạn → coi như miss / bỏ qua ghi: cache không được làm hỏng request
+	async def aget(self, key: str) -> Optional[str]:
+		hit = self._get_memory(key)
+		if hit is None and self._db is not None:
+			try:
+				hit = await io_executor.run(self._get_disk, key)
+			except (ExecutorBusy, ExecutorTimeout):
+				with self._lock:
+					self._stats["misses"] += 1
+		return hit
+
+	async def aset(self, key: str, value: str) -> None:
+		now = time.time()
+		self._set_memory(key, value, now)
+		if self._db is not None:
+			try:
+				await io_executor.run(self._set_disk, key, value, now)
+			except (ExecutorBusy, ExecutorTimeout):
+				pass
+
+	def clear(self) -> None:
+		with self._lock:
+			self._mem.clear()
+		if self._db is not None:
+			with self._db_lock:
+				self._db.execute("DELETE FROM summary_cache")
+				self._db.commit()
+
+	def stats(self) -> Dict[str, int]:
+		with self._lock:
+			return {**self._stats, "size_memory": len(self._mem)}
+
+summary_cache = SummaryCache(
+	max_entries=settings.SUMMARY_CACHE_MAX_ENTRIES,
+	ttl_s=settings.SUMMARY_CACHE_TTL_S,
+	db_path=settings.SUMMARY_CACHE_DB_PATH,
+	db_max_entries=settings.SUMMARY_CACHE_DB_MAX_ENTRIES,
+)
@@ -0,0 +1,191 @@
+# app/services/ics.py
+"""
+Sinh file ICS (RFC 5545) dạng generator: trả từng VEVENT ngay khi dựng xong,
+không giữ toàn bộ dòng trong bộ nhớ.
+
+- Escape TEXT (\\ ; , xuống dòng) và gập dòng > 75 octet (không cắt giữa ký tự UTF-8).
+- DTSTART/DTEND kèm TZID + VTIMEZONE sinh từ zoneinfo theo field `timezone` của event.
+- UID: field `uid` nếu có (scheduler gắn sẵn, giữ nguyên qua re-plan → xuất lại sau khi dời lịch
+  vẫn cập nhật đúng event cũ trong Google/Outlook Calendar); không có thì băm
+  (calendar_name, id, part, ngày, giờ bắt đầu) để hai plan cùng tên lịch, cùng id 1..N không đè nhau.
+"""
+import hashlib
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+_HHMM = re.compile(r"^(\d{1,2}):(\d{2})$")
+
+def escape_text(s: str) -> str:
+	return (
+		str(s).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+		.replace("\r\n", "\\n").replace("\n", "\\n").replace("\r", "\\n")
+	)
+
+def fold(line: str) -> str:
+	"""Gập dòng theo RFC 5545 §3.1: tối đa 75 octet, dòng tiếp theo bắt đầu bằng một dấu cách."""
+	if len(line) <= 75 and line.isascii():
+		return line + "\r\n"
+	out: List[str] = []
+	cur: List[str] = []
+	size, limit = 0, 75
+	for ch in line:
+		n = len(ch.encode("utf-8"))
+		if size + n > limit:
+			out.append("".join(cur))
+			cur, size, limit = [], 0, 74  # dòng sau có 1 octet cho dấu cách
+		cur.append(ch)
+		size += n
+	out.append("".join(cur))
+	return "\r\n ".join(out) + "\r\n"
+
+def _tz(name: Optional[str]) -> Optional[ZoneInfo]:
+	if not name:
+		return None
+	try:
+		return ZoneInfo(name)
+	except (ZoneInfoNotFoundError, ValueError):
+		return None
+
+def _fmt_offset(td: timedelta) -> str:
+	total = int(td.total_seconds())
+	sign = "+" if total >= 0 else "-"
+	total = abs(total)
+	return f"{sign}{total // 3600:02d}{total % 3600 // 60:02d}"
+
+def _transitions(tz: ZoneInfo, year: int) -> List[Tuple[datetime, timedelta, timedelta, bool]]:
+	"""Các lần đổi offset trong năm: (giờ địa phương theo offset cũ, offset trước, offset sau, là DST)."""
+	out = []
+	start = datetime(year, 1, 1, tzinfo=timezone.utc)
+	prev = start.astimezone(tz).utcoffset()
+	day = start
+	for _ in range(366):
+		nxt = day + timedelta(days=1)
+		off = nxt.astimezone(tz).utcoffset()
+		if off != prev:
+			# tìm nhị phân tới mức phút trong ngày đó
+			lo, hi = day, nxt
+			while hi - lo > timedelta(minutes=1):
+				mid = lo + (hi - lo) / 2
+				if mid.astimezone(tz).utcoffset() == prev:
+					lo = mid
+				else:
+					hi = mid
+			# RFC 5545: DTSTART của STANDARD/DAYLIGHT tính theo offset TRƯỚC khi đổi
+			local = (hi + prev).replace(tzinfo=None, second=0, microsecond=0)
+			out.append((local, prev, off, bool(hi.astimezone(tz).dst())))
+			prev = off
+		day = nxt
+		if day.year != year:
+			break
+	return out
+
+def vtimezone(tzid: str, years: Iterable[int]) -> Iterator[str]:
+	tz = ZoneInfo(tzid)
+	yield "BEGIN:VTIMEZONE\r\n"
+	yield fold(f"TZID:{tzid}")
+	years = sorted(set(years))
+	changes = [t for y in years for t in _transitions(tz, y)]
+	# observance phủ đầu năm đầu tiên (event tháng 1 trước lần đổi giờ đầu tiên):
+	# lần đổi cuối của năm trước, không có thì một observance gốc theo offset ngày 1/1
+	earlier = _transitions(tz, years[0] - 1)
+	if earlier:
+		changes.insert(0, earlier[-1])
+	else:
+		jan1 = datetime(years[0], 1, 1, tzinfo=tz)
+		off, kind = _fmt_offset(jan1.utcoffset()), "DAYLIGHT" if jan1.dst() else "STANDARD"
+		yield f"BEGIN:{kind}\r\nDTSTART:19700101T000000\r\n"
+		yield f"TZOFFSETFROM:{off}\r\nTZOFFSETTO:{off}\r\nEND:{kind}\r\n"
+	for local, before, after, is_dst in changes:
+		kind = "DAYLIGHT" if is_dst else "STANDARD"
+		yield f"BEGIN:{kind}\r\nDTSTART:{local.strftime('%Y%m%dT%H%M%S')}\r\n"
+		yield f"TZOFFSETFROM:{_fmt_offset(before)}\r\nTZOFFSETTO:{_fmt_offset(after)}\r\nEND:{kind}\r\n"
+	yield "END:VTIMEZONE\r\n"
+
+def event_uid(ev: Dict[str, Any], calendar_name: str) -> str:
+	if ev.get("uid"):
+		return str(ev["uid"])
+	raw = "\x00".join(str(x) for x in (calendar_name, ev.get("id", "x"), ev.get("part") or 1, ev.get("dateStr"), ev.get("start")))
+	return f"flowai-{hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]}@flowai"
+
+def _local(d: date, hhmm: str) -> str:
+	h, m = [int(x) for x in hhmm.split(":")]
+	return f"{d.year:04d}{d.month:02d}{d.day:02d}T{h:02d}{m:02d}00"
+
+def validate_events(scheduled: Any) -> None:
+	"""
+	Kiểm tra các field vevent() cần trước khi bắt đầu stream: lỗi giữa chừng không đổi được
+	status 200 đã gửi. Sai → ValueError kèm vị trí event.
+	"""
+	if not isinstance(scheduled, list):
+		raise ValueError("'scheduled' must be a list")
+	for i, ev in enumerate(scheduled):
+		try:
+			if not isinstance(ev, dict):
+				raise ValueError("must be an object")
+			date.fromisoformat(str(ev.get("dateStr")))
+			for field in ("start", "end"):
+				m = _HHMM.match(str(ev.get(field)))
+				if m is None or int(m.group(1)) > 23 or int(m.group(2)) > 59:
+					raise ValueError(f"{field} must be HH:MM")
+			if "sequence" in ev:
+				int(ev["sequence"])
+		except ValueError as e:
+			raise ValueError(f"Invalid event #{i}: {e}") from None
+
+def vevent(ev: Dict[str, Any], calendar_name: str, dtstamp: str, tzids: Set[str]) -> str:
+	d = date.fromisoformat(ev["dateStr"])
+	tzid = ev.get("timezone")
+	param = f";TZID={tzid}" if tzid in tzids else ""
+	lines = [
+		"BEGIN:VEVENT",
+		f"UID:{event_uid(ev, calendar_name)}",
+		f"DTSTAMP:{dtstamp}",
+		f"DTSTART{param}:{_local(d, ev['start'])}",
+		f"DTEND{param}:{_local(d, ev['end'])}",
+		f"SUMMARY:{escape_text(ev.get('title', 'Task'))}",
+	]
+	# re-plan: SEQUENCE tăng mỗi lần dời, STATUS:CANCELLED để client xoá event cũ
+	if "sequence" in ev:
+		lines.append(f"SEQUENCE:{int(ev['sequence'])}")
+	if ev.get("status") == "cancelled":
+		lines.append("STATUS:CANCELLED")
+	lines.append("END:VEVENT")
+	return "".join(fold(l) for l in lines)
+
+def iter_ics(scheduled: List[Dict[str, Any]], calendar_name: str = "FlowAI Plan") -> Iterator[str]:
+	# lượt 1: chỉ gom các timezone + năm cần cho VTIMEZONE (bộ nhớ O(số timezone))
+	years: Dict[str, Set[int]] = {}
+	for ev in scheduled:
+		tzid = ev.get("timezone")
+		if tzid and (tzid in years or _tz(tzid) is not None):
+			years.setdefault(tzid, set()).add(int(ev["dateStr"][:4]))
+
+	yield "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//FlowAI//Planner//EN\r\nCALSCALE:GREGORIAN\r\n"
+	yield fold(f"X-WR-CALNAME:{escape_text(calendar_name)}")
+	for tzid, ys in years.items():
+		yield "".join(vtimezone(tzid, ys))
+
+	# lượt 2: stream từng event
+	dtstamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+	tzids = set(years)
+	for ev in scheduled:
+		yield vevent(ev, calendar_name, dtstamp, tzids)
+	yield "END:VCALENDAR\r\n"
+
+def buffered(parts: Iterable[str], size: int = 64 * 1024) -> Iterator[str]:
+	"""
+	Gom các mẩu nhỏ thành khối ~size ký tự: StreamingResponse chạy generator đồng bộ
+	qua threadpool từng phần tử một, nên mỗi VEVENT một chunk rất tốn.
+	"""
+	buf: List[str] = []
+	n = 0
+	for part in parts:
+		buf.append(part)
+		n += len(part)
+		if n >= size:
+			yield "".join(buf)
+			buf, n = [], 0
+	if buf:
+		yield "".join(buf)
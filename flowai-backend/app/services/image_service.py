@@ -0,0 +1,122 @@
+# app/services/image_service.py
+"""
+Tiền xử lý ảnh trước khi gọi vision LLM:
+xoay theo EXIF → thu nhỏ cạnh dài ≤ IMAGE_MAX_DIM → nén WebP/JPEG dưới IMAGE_TARGET_BYTES,
+kèm perceptual hash (dHash 64-bit) + thumbnail xám để ảnh gần trùng dùng lại summary đã cache.
+
+dHash chỉ để tìm ứng viên: ảnh chụp / screenshot các trang chữ khác nhau có dHash gần như y hệt,
+nên ứng viên phải khớp thêm thumbnail THUMB_SIZE x THUMB_SIZE (chênh lệch tối đa từng điểm ảnh
+≤ IMAGE_DEDUPE_MAX_PIXEL_DIFF) mới được coi là trùng.
+"""
+import io
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional, Tuple
+
+if TYPE_CHECKING:
+	from PIL import Image
+
+from app.core.config import settings
+
+_QUALITIES = (85, 75, 65, 50, 40)
+THUMB_SIZE = 128
+
+def dhash(img: "Image.Image", size: int = 8) -> str:
+	from PIL import Image
+
+	# so sánh độ sáng các điểm ảnh kề nhau trên ảnh xám (size+1) x size
+	small = img.convert("L").resize((size + 1, size), Image.Resampling.LANCZOS)
+	px = list(small.getdata())
+	bits = 0
+	for row in range(size):
+		for col in range(size):
+			left = px[row * (size + 1) + col]
+			right = px[row * (size + 1) + col + 1]
+			bits = (bits << 1) | (left > right)
+	return f"{bits:016x}"
+
+def thumbprint(img: "Image.Image", size: int = THUMB_SIZE) -> bytes:
+	from PIL import Image
+
+	# đủ chi tiết để phân biệt hai trang chữ khác nhau, đủ thô để bỏ qua nhiễu nén lại / thu nhỏ
+	return img.convert("L").resize((size, size), Image.Resampling.BOX).tobytes()
+
+def _encode(img: "Image.Image", fmt: str, quality: int) -> bytes:
+	buf = io.BytesIO()
+	if fmt == "JPEG":
+		img.convert("RGB").save(buf, "JPEG", quality=quality, optimize=True)
+	else:
+		img.save(buf, "WEBP", quality=quality, method=4)
+	return buf.getvalue()
+
+def preprocess_image(path: str) -> Tuple[bytes, Optional[str], Optional[str], Optional[bytes]]:
+	"""
+	Chạy trên cpu_executor (process pool). Trả (bytes, mime, phash, thumb).
+	Nếu Pillow không đọc được ảnh → trả nguyên bytes gốc, mime=phash=thumb=None.
+	"""
+	from PIL import Image, ImageOps  # import lười: chỉ worker xử lý ảnh mới cần Pillow
+
+	try:
+		with Image.open(path) as img:
+			max_dim = settings.IMAGE_MAX_DIM
+			# JPEG: giải mã ở độ phân giải thấp ngay từ đầu (nhanh hơn nhiều so với resize sau)
+			img.draft("RGB", (max_dim, max_dim))
+			img = ImageOps.exif_transpose(img)
+			img.thumbnail((max_dim, max_dim), Image.Resampling.LANCZOS)
+			if img.mode not in ("RGB", "RGBA"):
+				img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+			phash, thumb = dhash(img), thumbprint(img)
+
+			fmt = "JPEG" if settings.IMAGE_FORMAT.lower() in ("jpg", "jpeg") else "WEBP"
+			for _ in range(3):
+				for q in _QUALITIES:
+					data = _encode(img, fmt, q)
+					if len(data) <= settings.IMAGE_TARGET_BYTES:
+						return data, f"image/{fmt.lower()}", phash, thumb
+				# vẫn quá lớn ở chất lượng thấp nhất → thu nhỏ thêm rồi thử lại
+				img = img.resize((max(1, img.width * 3 // 4), max(1, img.height * 3 // 4)), Image.Resampling.LANCZOS)
+			return data, f"image/{fmt.lower()}", phash, thumb
+	except Exception:
+		with open(path, "rb") as f:
+			return f.read(), None, None, None
+
+class PhashIndex:
+	"""
+	Nhớ các ảnh gần đây theo key nội dung (sha256). canonical() trả key của ảnh đã biết có
+	dHash cách ≤ max_distance bit (Hamming) VÀ thumbnail khớp (chênh lệch từng điểm ≤ max_pixel_diff);
+	không có → ghi nhận ảnh mới và trả chính key của nó.
+	"""
+	def __init__(self, max_entries: int = 512, max_distance: int = 4, max_pixel_diff: int = 32):
+		self.max_entries = max_entries
+		self.max_distance = max_distance
+		self.max_pixel_diff = max_pixel_diff
+		self._entries: "OrderedDict[str, Tuple[int, bytes]]" = OrderedDict()
+		self._lock = threading.Lock()
+
+	def _same_pixels(self, a: bytes, b: bytes) -> bool:
+		import numpy as np
+
+		if len(a) != len(b):
+			return False
+		diff = np.abs(np.frombuffer(a, dtype=np.uint8).astype(np.int16) - np.frombuffer(b, dtype=np.uint8))
+		return int(diff.max()) <= self.max_pixel_diff
+
+	def canonical(self, phash: str, thumb: bytes, key: str) -> str:
+		h = int(phash, 16)
+		with self._lock:
+			if key in self._entries:
+				self._entries.move_to_end(key)
+				return key
+			for known_key, (known, known_thumb) in self._entries.items():
+				if bin(known ^ h).count("1") <= self.max_distance and self._same_pixels(thumb, known_thumb):
+					self._entries.move_to_end(known_key)
+					return known_key
+			self._entries[key] = (h, thumb)
+			while len(self._entries) > self.max_entries:
+				self._entries.popitem(last=False)
+			return key
+
+phash_index = PhashIndex(
+	max_distance=settings.IMAGE_DEDUPE_MAX_DISTANCE,
+	max_pixel_diff=settings.IMAGE_DEDUPE_MAX_PIXEL_DIFF,
+)
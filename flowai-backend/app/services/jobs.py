@@ -0,0 +1,339 @@
+# app/services/jobs.py
+"""
+Hàng đợi job cho tài liệu dài: request chỉ nộp file và nhận job_id ngay,
+worker trong process chạy extract → chunk → map → reduce, client poll tiến độ / lấy kết quả.
+
+- Lưu trạng thái trong SQLite (JOBS_DIR/jobs.sqlite3), không cần broker ngoài.
+- job_id = băm (kind, style, sha256 nội dung): nộp lại cùng tài liệu → cùng job (dedupe).
+- Checkpoint từng chunk (job_chunks): worker lỗi / restart → chỉ làm lại các chunk chưa xong.
+  Job đang chờ / đang chạy khi app tắt được xếp lại hàng khi app khởi động.
+- Mọi truy vấn SQLite từ code async chạy trên io_executor (JobManager._db), không chặn event loop.
+"""
+import asyncio
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.executors import ExecutorBusy, io_executor
+from app.services.cache import make_key
+from app.services.ocr_service import pdf_to_chunks
+from app.services.summarize_service import PROMPT_VERSION, chunk_text, summarize_chunks_resumable
+
+class JobQueueFull(Exception):
+	"""Quá nhiều job đang chờ."""
+
+# ========= Store =========
+class JobStore:
+	def __init__(self, db_path: str):
+		self._db = sqlite3.connect(db_path, check_same_thread=False)
+		self._db.row_factory = sqlite3.Row
+		self._lock = threading.Lock()
+		with self._lock:
+			self._db.executescript(
+				"""
+				CREATE TABLE IF NOT EXISTS jobs (
+					id TEXT PRIMARY KEY, kind TEXT NOT NULL, style TEXT NOT NULL, content_hash TEXT NOT NULL,
+					status TEXT NOT NULL, stage TEXT NOT NULL, done INTEGER NOT NULL DEFAULT 0,
+					total INTEGER NOT NULL DEFAULT 0, result TEXT, error TEXT, source_path TEXT,
+					created_at REAL NOT NULL, updated_at REAL NOT NULL
+				);
+				CREATE TABLE IF NOT EXISTS job_chunks (
+					job_id TEXT NOT NULL, idx INTEGER NOT NULL, chunk_hash TEXT NOT NULL, summary TEXT NOT NULL,
+					PRIMARY KEY (job_id, idx)
+				);
+				"""
+			)
+			self._db.commit()
+
+	def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+		with self._lock:
+			row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+		return dict(row) if row is not None else None
+
+	def create_or_get(self, job_id: str, kind: str, style: str, content_hash: str, source_path: str) -> Tuple[Dict[str, Any], bool]:
+		"""Trả (job, created). Job cũ bị lỗi được xếp lại hàng (giữ checkpoint)."""
+		now = time.time()
+		with self._lock:
+			row = self._db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+			if row is None:
+				self._db.execute(
+					"INSERT INTO jobs (id, kind, style, content_hash, status, stage, source_path, created_at, updated_at) "
+					"VALUES (?, ?, ?, ?, 'queued', 'queued', ?, ?, ?)",
+					(job_id, kind, style, content_hash, source_path, now, now),
+				)
+				created = True
+			elif row["status"] == "failed":
+				self._db.execute(
+					"UPDATE jobs SET status = 'queued', stage = 'queued', error = NULL, source_path = ?, updated_at = ? WHERE id = ?",
+					(source_path, now, job_id),
+				)
+				created = True
+			else:
+				created = False
+			self._db.commit()
+		return self.get(job_id), created
+
+	def update(self, job_id: str, **fields: Any) -> None:
+		fields["updated_at"] = time.time()
+		cols = ", ".join(f"{k} = ?" for k in fields)
+		with self._lock:
+			self._db.execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+			self._db.commit()
+
+	def checkpoints(self, job_id: str) -> Dict[int, Tuple[str, str]]:
+		with self._lock:
+			rows = self._db.execute("SELECT idx, chunk_hash, summary FROM job_chunks WHERE job_id = ?", (job_id,)).fetchall()
+		return {r["idx"]: (r["chunk_hash"], r["summary"]) for r in rows}
+
+	def save_checkpoint(self, job_id: str, idx: int, chunk_hash: str, summary: str) -> None:
+		with self._lock:
+			self._db.execute(
+				"INSERT OR REPLACE INTO job_chunks (job_id, idx, chunk_hash, summary) VALUES (?, ?, ?, ?)",
+				(job_id, idx, chunk_hash, summary),
+			)
+			# đếm lại từ bảng checkpoint: chunk được lưu lại (chạy lại sau lỗi) không bị cộng hai lần
+			self._db.execute(
+				"UPDATE jobs SET done = (SELECT COUNT(*) FROM job_chunks WHERE job_id = ?), updated_at = ? WHERE id = ?",
+				(job_id, time.time(), job_id),
+			)
+			self._db.commit()
+
+	def drop_checkpoints(self, job_id: str, idxs: List[int]) -> None:
+		# checkpoint không còn khớp chunk nào: xoá để `done` (đếm theo bảng checkpoint) đúng
+		with self._lock:
+			self._db.executemany("DELETE FROM job_chunks WHERE job_id = ? AND idx = ?", [(job_id, i) for i in idxs])
+			self._db.commit()
+
+	def pending_ids(self) -> List[str]:
+		with self._lock:
+			rows = self._db.execute(
+				"SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+			).fetchall()
+		return [r["id"] for r in rows]
+
+	def purge(self, older_than_s: float) -> int:
+		# job đã xong / lỗi quá hạn: xoá cả checkpoint
+		cutoff = time.time() - older_than_s
+		with self._lock:
+			ids = [r["id"] for r in self._db.execute(
+				"SELECT id FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (cutoff,)
+			).fetchall()]
+			self._db.executemany("DELETE FROM job_chunks WHERE job_id = ?", [(i,) for i in ids])
+			self._db.executemany("DELETE FROM jobs WHERE id = ?", [(i,) for i in ids])
+			self._db.commit()
+		return len(ids)
+
+	def close(self) -> None:
+		with self._lock:
+			self._db.close()
+
+# ========= Helpers (chạy trên io_executor) =========
+def _file_sha256(path: str) -> str:
+	h = hashlib.sha256()
+	with open(path, "rb") as f:
+		for block in iter(lambda: f.read(1024 * 1024), b""):
+			h.update(block)
+	return h.hexdigest()
+
+def _adopt(src: str, dst: str) -> None:
+	# upload của request → thư mục job; hard link nếu cùng ổ đĩa, không thì chép.
+	# Không move: file nguồn có thể không thuộc spool_upload (upload đã nằm sẵn trên đĩa)
+	if not os.path.exists(dst):
+		try:
+			os.link(src, dst)
+		except OSError:
+			shutil.copyfile(src, dst)
+
+def _write_text(text: str, root: str) -> str:
+	fd, path = tempfile.mkstemp(prefix="flowai-", suffix=".txt", dir=root if os.path.isdir(root) else None)
+	with os.fdopen(fd, "w", encoding="utf-8") as f:
+		f.write(text)
+	return path
+
+def _unlink(path: str) -> None:
+	try:
+		os.unlink(path)
+	except OSError:
+		pass
+
+def _text_chunks(path: str) -> List[str]:
+	with open(path, encoding="utf-8") as f:
+		return chunk_text(f.read())
+
+def _chunk_hash(chunk: str) -> str:
+	return hashlib.sha256(chunk.encode("utf-8")).hexdigest()[:16]
+
+def public_view(job: Dict[str, Any]) -> Dict[str, Any]:
+	return {
+		"job_id": job["id"],
+		"kind": job["kind"],
+		"status": job["status"],
+		"stage": job["stage"],
+		"progress": {"done": job["done"], "total": job["total"]},
+		"error": job["error"],
+		"created_at": job["created_at"],
+		"updated_at": job["updated_at"],
+	}
+
+# ========= Manager =========
+class JobManager:
+	def __init__(self, root: str, workers: int, max_pending: int):
+		self.root = root
+		self.workers = max(1, workers)
+		self.max_pending = max_pending
+		self._store: Optional[JobStore] = None
+		self._store_lock = threading.Lock()
+		self._queue: Optional["asyncio.Queue[str]"] = None
+		self._tasks: List["asyncio.Task[None]"] = []
+		self._queued: set = set()
+		self._stopping = False
+
+	@property
+	def db_path(self) -> str:
+		return os.path.join(self.root, "jobs.sqlite3")
+
+	@property
+	def store(self) -> JobStore:
+		# mở lười: không tạo thư mục / DB nếu không ai dùng job
+		with self._store_lock:
+			if self._store is None:
+				os.makedirs(self.root, exist_ok=True)
+				self._store = JobStore(self.db_path)
+			return self._store
+
+	async def _db(self, method: str, *args: Any, **kwargs: Any) -> Any:
+		# gọi JobStore trên thread pool io; đi thẳng vào .pool: job nền không nên bị từ chối vì hàng đợi đầy
+		return await asyncio.get_running_loop().run_in_executor(
+			io_executor.pool, lambda: getattr(self.store, method)(*args, **kwargs)
+		)
+
+	def _enqueue(self, job_id: str) -> None:
+		if job_id not in self._queued:
+			self._queued.add(job_id)
+			self._queue.put_nowait(job_id)
+
+	async def start(self) -> None:
+		"""Khởi động worker; xếp lại các job còn dang dở từ lần chạy trước."""
+		if self._queue is not None:
+			return
+		self._queue, self._stopping = asyncio.Queue(), False
+		self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+		# chưa từng có job (chưa có DB) → không có gì để xếp lại, không mở DB lúc khởi động
+		if self._store is None and not os.path.exists(self.db_path):
+			return
+		if settings.JOBS_RETENTION_S:
+			await self._db("purge", settings.JOBS_RETENTION_S)
+		for job_id in await self._db("pending_ids"):
+			self._enqueue(job_id)
+
+	async def stop(self) -> None:
+		self._stopping = True
+		for t in self._tasks:
+			t.cancel()
+		await asyncio.gather(*self._tasks, return_exceptions=True)
+		self._tasks, self._queue = [], None
+		self._queued.clear()
+		with self._store_lock:
+			if self._store is not None:
+				self._store.close()
+				self._store = None
+
+	async def submit(self, kind: str, style: str, path: str) -> Tuple[Dict[str, Any], bool]:
+		"""
+		Nộp file (đường dẫn tạm, sẽ được chuyển vào JOBS_DIR). Trả (job, deduplicated).
+		"""
+		await self.start()
+		content_hash = await io_executor.run(_file_sha256, path)
+		job_id = make_key("job", kind, style, PROMPT_VERSION, content_hash)[:32]
+		existing = await self._db("get", job_id)
+		if existing is not None and existing["status"] != "failed":
+			return existing, True
+		if len(self._queued) >= self.max_pending:
+			raise JobQueueFull("Too many pending jobs, try again later")
+
+		source = os.path.join(self.root, f"{job_id}.{kind}")
+		await io_executor.run(_adopt, path, source)
+		job, created = await self._db("create_or_get", job_id, kind, style, content_hash, source)
+		if created:
+			self._enqueue(job_id)
+		return job, not created
+
+	async def submit_text(self, text: str, style: str) -> Tuple[Dict[str, Any], bool]:
+		path = await io_executor.run(_write_text, text, self.root)
+		try:
+			return await self.submit("text", style, path)
+		finally:
+			await io_executor.run(_unlink, path)
+
+	async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+		if self._store is None and not os.path.exists(self.db_path):
+			return None
+		return await self._db("get", job_id)
+
+	async def _worker(self) -> None:
+		while not self._stopping:
+			job_id = await self._queue.get()
+			try:
+				await self._run(job_id)
+			finally:
+				self._queued.discard(job_id)
+
+	async def _run(self, job_id: str) -> None:
+		db = self._db
+		try:
+			job = await db("get", job_id)
+			if job is None or job["status"] not in ("queued", "running"):
+				return
+			source = job["source_path"]
+			if not source or not os.path.exists(source):
+				await db("update", job_id, status="failed", stage="failed", error="Source file is missing, please resubmit.")
+				return
+			await db("update", job_id, status="running", stage="extract")
+			while True:
+				try:
+					if job["kind"] == "pdf":
+						# trang scan được OCR (có cache theo trang: chạy lại không tốn thêm lời gọi)
+						chunks = await pdf_to_chunks(source, timeout=settings.JOBS_EXTRACT_TIMEOUT_S)
+					else:
+						chunks = await io_executor.run(_text_chunks, source, timeout=settings.JOBS_EXTRACT_TIMEOUT_S)
+					break
+				except ExecutorBusy:
+					await asyncio.sleep(2)  # job không có client chờ: đợi executor rảnh thay vì fail
+			if not chunks:
+				await db("update", job_id, status="failed", stage="failed", error="No extractable text in document.")
+				return
+
+			# chỉ dùng checkpoint khớp đúng nội dung chunk (cấu hình chunk có thể đã đổi)
+			hashes = [_chunk_hash(c) for c in chunks]
+			saved = await db("checkpoints", job_id)
+			done = {i: summary for i, (h, summary) in saved.items() if i < len(chunks) and hashes[i] == h}
+			if len(done) < len(saved):
+				await db("drop_checkpoints", job_id, [i for i in saved if i not in done])
+			await db("update", job_id, stage="map", total=len(chunks), done=len(done))
+			summary = await summarize_chunks_resumable(
+				chunks, style=job["style"], done=done,
+				on_partial=lambda i, s: db("save_checkpoint", job_id, i, hashes[i], s),
+				on_reduce=lambda: db("update", job_id, stage="reduce"),
+			)
+			await db("update", job_id, status="done", stage="done", result=summary, error=None)
+			await io_executor.run(_unlink, source)
+		except asyncio.CancelledError:
+			# app đang tắt: giữ trạng thái running → lần khởi động sau sẽ chạy tiếp từ checkpoint
+			raise
+		except Exception as e:
+			try:
+				await db("update", job_id, status="failed", stage="failed", error=str(e) or type(e).__name__)
+			except Exception:
+				pass  # DB lỗi cả khi ghi trạng thái: bỏ qua để worker vẫn sống, job được xếp lại khi khởi động lại
+
+job_manager = JobManager(
+	root=settings.JOBS_DIR or os.path.join(tempfile.gettempdir(), "flowai-jobs"),
+	workers=settings.JOBS_WORKERS,
+	max_pending=settings.JOBS_MAX_PENDING,
+)
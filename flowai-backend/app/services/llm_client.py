@@ -0,0 +1,625 @@
+# app/services/llm_client.py
+"""
+Async LLM client dùng chung cho summarize_service, planner_service và ai_planner.
+
+- Gemini: REST `generateContent` / `streamGenerateContent` (SSE)
+- OpenAI-compatible: `/chat/completions` (OpenAI, LM Studio, vLLM...), stream=true cho SSE
+
+Tất cả backend dùng chung một httpx.AsyncClient (pool keep-alive), timeout theo từng request.
+generate_text / generate_vision đi qua single-flight: các lời gọi giống hệt nhau
+(provider, model, prompt, ảnh, cấu hình) đang chạy cùng lúc chỉ tạo một request upstream.
+Mỗi request upstream qua rate limiter RPM/TPM + circuit breaker (app/services/rate_limit.py),
+429/5xx/timeout được thử lại với exponential backoff có jitter, tôn trọng Retry-After.
+Lời gọi không chỉ định provider/model đi qua LLMRouter (policy + hedged request).
+"""
+import abc
+import asyncio
+import base64
+import json
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.core.tracing import record, span
+from app.services.cache import make_key
+from app.services.rate_limit import Guard, LLMUnavailable, get_guard, parse_retry_after
+from app.utils.chunk import estimate_tokens
+
+_GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+_OPENAI_BASE_URL = "https://api.openai.com/v1"
+
+# ========= Shared HTTP pool =========
+_http: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+	global _http
+	if _http is None or _http.is_closed:
+		_http = httpx.AsyncClient(
+			timeout=settings.LLM_TIMEOUT_S,
+			limits=httpx.Limits(
+				max_connections=settings.LLM_MAX_CONNECTIONS,
+				max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+			),
+		)
+	return _http
+
+async def aclose() -> None:
+	global _http
+	if _http is not None and not _http.is_closed:
+		await _http.aclose()
+	_http = None
+
+async def warm_up() -> None:
+	"""Mở sẵn kết nối keep-alive (DNS + TLS) tới các backend router sẽ dùng; không gọi model, không tốn token."""
+	for base_url in {backend.base_url for backend in router.order()}:
+		try:
+			await get_http_client().head(base_url, timeout=5)
+		except httpx.HTTPError:
+			pass
+
+# ========= Backends =========
+class LLMBackend(abc.ABC):
+	name = "base"
+
+	def __init__(self, model: str):
+		self.model = model
+
+	@abc.abstractmethod
+	async def generate(
+		self,
+		prompt: str,
+		images: Optional[List[Tuple[bytes, str]]] = None,
+		max_tokens: Optional[int] = 400,
+		json_mode: bool = False,
+		timeout: Optional[float] = None,
+	) -> str:
+		...
+
+	@abc.abstractmethod
+	def stream(
+		self,
+		prompt: str,
+		max_tokens: Optional[int] = 400,
+		timeout: Optional[float] = None,
+	) -> AsyncIterator[str]:
+		"""Trả từng đoạn text ngay khi provider gửi về."""
+		...
+
+async def _iter_sse_data(resp: httpx.Response) -> AsyncIterator[str]:
+	# chỉ lấy các dòng "data: ..." của Server-Sent Events
+	async for line in resp.aiter_lines():
+		if line.startswith("data:"):
+			yield line[5:].strip()
+
+class GeminiBackend(LLMBackend):
+	name = "gemini"
+
+	def __init__(self, model: str, api_key: str, base_url: str = ""):
+		super().__init__(model)
+		self.api_key = api_key
+		self.base_url = (base_url or _GEMINI_BASE_URL).rstrip("/")
+
+	def _payload(self, prompt, images=None, max_tokens=400, json_mode=False) -> Dict:
+		if not self.api_key:
+			raise RuntimeError("Missing GEMINI_API_KEY")
+		parts: List[Dict] = [{"text": prompt}]
+		for data, mime in images or []:
+			parts.append({"inline_data": {"mime_type": mime, "data": base64.b64encode(data).decode("ascii")}})
+		config: Dict = {}
+		if max_tokens:
+			config["maxOutputTokens"] = max_tokens
+		if json_mode:
+			config["responseMimeType"] = "application/json"
+		return {"contents": [{"role": "user", "parts": parts}], "generationConfig": config}
+
+	@staticmethod
+	def _text(data: Dict) -> str:
+		# candidates -> content -> parts[].text
+		try:
+			return "".join(p.get("text", "") for p in data["candidates"][0]["content"]["parts"])
+		except (KeyError, IndexError, TypeError):
+			raise RuntimeError("LLM returned unexpected structure")
+
+	@staticmethod
+	def _stream_text(data: Any) -> str:
+		# chunk SSE không có text (chunk cuối chỉ mang usageMetadata / finishReason) là bình thường: bỏ qua
+		if isinstance(data, dict) and data.get("error"):
+			raise RuntimeError(f"LLM stream error: {data['error']}")
+		try:
+			parts = data["candidates"][0]["content"]["parts"]
+		except (KeyError, IndexError, TypeError):
+			return ""
+		return "".join(p.get("text", "") for p in parts if isinstance(p, dict))
+
+	async def generate(self, prompt, images=None, max_tokens=400, json_mode=False, timeout=None) -> str:
+		resp = await get_http_client().post(
+			f"{self.base_url}/models/{self.model}:generateContent",
+			json=self._payload(prompt, images, max_tokens, json_mode),
+			headers={"x-goog-api-key": self.api_key},
+			timeout=timeout or settings.LLM_TIMEOUT_S,
+		)
+		resp.raise_for_status()
+		return self._text(resp.json()).strip()
+
+	async def stream(self, prompt, max_tokens=400, timeout=None) -> AsyncIterator[str]:
+		async with get_http_client().stream(
+			"POST",
+			f"{self.base_url}/models/{self.model}:streamGenerateContent",
+			params={"alt": "sse"},
+			json=self._payload(prompt, max_tokens=max_tokens),
+			headers={"x-goog-api-key": self.api_key},
+			timeout=timeout or settings.LLM_TIMEOUT_S,
+		) as resp:
+			resp.raise_for_status()
+			async for data in _iter_sse_data(resp):
+				text = self._stream_text(json.loads(data))
+				if text:
+					yield text
+
+class OpenAIBackend(LLMBackend):
+	name = "openai"
+
+	def __init__(self, model: str, api_key: str, base_url: str = ""):
+		super().__init__(model)
+		self.api_key = api_key
+		self.base_url = (base_url or _OPENAI_BASE_URL).rstrip("/")
+
+	async def generate(self, prompt, images=None, max_tokens=400, json_mode=False, timeout=None) -> str:
+		if images:
+			content = [{"type": "text", "text": prompt}]
+			for data, mime in images:
+				b64 = base64.b64encode(data).decode("ascii")
+				content.append({"type": "image_url", "image_url": {"url": f"data:{mime};base64,{b64}"}})
+		else:
+			content = prompt
+		payload: Dict = {
+			"model": self.model,
+			"messages": [{"role": "user", "content": content}],
+		}
+		if max_tokens:
+			payload["max_tokens"] = max_tokens
+		if json_mode:
+			payload["response_format"] = {"type": "json_object"}
+		headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+
+		resp = await get_http_client().post(
+			f"{self.base_url}/chat/completions",
+			json=payload,
+			headers=headers,
+			timeout=timeout or settings.LLM_TIMEOUT_S,
+		)
+		resp.raise_for_status()
+		data = resp.json()
+		try:
+			out = data["choices"][0]["message"]["content"] or ""
+		except (KeyError, IndexError, TypeError):
+			raise RuntimeError("LLM returned unexpected structure")
+		return out.strip()
+
+	async def stream(self, prompt, max_tokens=400, timeout=None) -> AsyncIterator[str]:
+		payload: Dict = {
+			"model": self.model,
+			"messages": [{"role": "user", "content": prompt}],
+			"stream": True,
+		}
+		if max_tokens:
+			payload["max_tokens"] = max_tokens
+		headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+
+		async with get_http_client().stream(
+			"POST",
+			f"{self.base_url}/chat/completions",
+			json=payload,
+			headers=headers,
+			timeout=timeout or settings.LLM_TIMEOUT_S,
+		) as resp:
+			resp.raise_for_status()
+			async for data in _iter_sse_data(resp):
+				if data == "[DONE]":
+					break
+				try:
+					text = json.loads(data)["choices"][0]["delta"].get("content") or ""
+				except (KeyError, IndexError, TypeError):
+					raise RuntimeError("LLM returned unexpected structure")
+				if text:
+					yield text
+
+def get_backend(provider: Optional[str] = None, model: Optional[str] = None) -> LLMBackend:
+	provider = (provider or settings.LLM_PROVIDER).lower().strip()
+	if provider == "gemini":
+		return GeminiBackend(model or settings.GEMINI_MODEL, settings.GEMINI_API_KEY, settings.GEMINI_BASE_URL)
+	return OpenAIBackend(model or settings.OPENAI_MODEL, settings.OPENAI_API_KEY, settings.OPENAI_BASE_URL)
+
+# ========= Rate limit / retry / circuit breaker =========
+def _estimate_request_tokens(prompt: str, images: Optional[List[Tuple[bytes, str]]], max_tokens: Optional[int]) -> int:
+	# prompt + phần output tối đa; mỗi ảnh (đã thu nhỏ) tính ~ 1 tile
+	return estimate_tokens(prompt) + (max_tokens or 1024) + 300 * len(images or [])
+
+def _on_upstream_error(guard: Guard, e: Exception) -> float:
+	"""Ghi nhận lỗi upstream; trả Retry-After (giây) nếu đáng thử lại, ngược lại ném lỗi ra."""
+	if isinstance(e, httpx.HTTPStatusError):
+		resp = e.response
+		if resp.status_code != 429 and resp.status_code < 500:
+			guard.breaker.record_success()  # upstream vẫn sống, request này sai
+			raise e
+		try:
+			body = resp.text
+		except httpx.ResponseNotRead:
+			body = ""
+		if "insufficient_quota" in body:
+			# hết tiền chứ không phải quá tải: thử lại vô ích
+			guard.breaker.record_success()
+			raise RuntimeError(f"insufficient_quota: {body[:200]}") from e
+		retry_after = parse_retry_after(resp.headers.get("retry-after"))
+		if resp.status_code == 429:
+			guard.limiter.on_throttled(retry_after)
+		guard.breaker.record_failure()
+		return retry_after
+	guard.breaker.record_failure()
+	return 0.0
+
+def _backoff(attempt: int, retry_after: float, err: Exception) -> float:
+	# full jitter, nhưng không sớm hơn Retry-After; chờ quá lâu → báo quá tải để caller giảm cấp
+	delay = max(retry_after, random.uniform(0, min(settings.LLM_BACKOFF_MAX_S, settings.LLM_BACKOFF_BASE_S * 2 ** attempt)))
+	if attempt > settings.LLM_MAX_RETRIES or delay > settings.LLM_BACKOFF_MAX_S:
+		raise LLMUnavailable(f"LLM upstream unavailable: {err}", retry_after=max(1.0, retry_after)) from err
+	return delay
+
+async def _guarded(backend: LLMBackend, tokens: int, call: Callable[[], Awaitable[Any]]) -> Any:
+	guard = get_guard(backend.name, backend.model)
+	attempt = 0
+	while True:
+		guard.breaker.allow()
+		await guard.limiter.acquire(tokens, settings.LLM_LIMIT_MAX_WAIT_S)
+		try:
+			out = await call()
+		except (httpx.HTTPStatusError, httpx.TransportError) as e:
+			retry_after = _on_upstream_error(guard, e)
+			attempt += 1
+			await asyncio.sleep(_backoff(attempt, retry_after, e))
+			continue
+		guard.breaker.record_success()
+		guard.limiter.on_success()
+		return out
+
+# ========= Single-flight =========
+class SingleFlight:
+	"""
+	Lời gọi đầu tiên với một key tạo task upstream; các lời gọi trùng key tới trong lúc
+	task đang chạy chờ cùng kết quả (hoặc cùng lỗi). Task bọc bằng shield nên
+	một client ngắt kết nối không huỷ request của những client còn lại; khi waiter cuối
+	cùng bỏ đi (huỷ) thì task bị huỷ theo, không tiếp tục tốn quota.
+	"""
+	def __init__(self):
+		# key → [task, số waiter đang chờ]
+		self._inflight: Dict[str, List[Any]] = {}
+		self.calls = 0
+		self.coalesced = 0
+		self.abandoned = 0
+
+	async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+		self.calls += 1
+		entry = self._inflight.get(key)
+		if entry is None:
+			task = asyncio.ensure_future(fn())
+			entry = self._inflight[key] = [task, 0]
+			task.add_done_callback(lambda t, k=key: self._forget(k, t))
+		else:
+			self.coalesced += 1
+		task = entry[0]
+		entry[1] += 1
+		try:
+			return await asyncio.shield(task)
+		finally:
+			entry[1] -= 1
+			if entry[1] == 0 and not task.done():
+				self.abandoned += 1
+				# bỏ key ngay: caller mới tới trong lúc task còn đang huỷ dở phải tạo task mới, không nhận CancelledError
+				if self._inflight.get(key) is entry:
+					del self._inflight[key]
+				task.cancel()
+
+	def _forget(self, key: str, task: "asyncio.Task[Any]") -> None:
+		entry = self._inflight.get(key)
+		if entry is not None and entry[0] is task:
+			del self._inflight[key]
+		if not task.cancelled():
+			task.exception()  # đánh dấu đã đọc lỗi khi mọi waiter đều đã bỏ đi
+
+	def stats(self) -> Dict[str, int]:
+		return {
+			"calls": self.calls, "coalesced": self.coalesced,
+			"abandoned": self.abandoned, "inflight": len(self._inflight),
+		}
+
+_single_flight = SingleFlight()
+
+def single_flight_stats() -> Dict[str, int]:
+	return _single_flight.stats()
+
+
+# ========= Router: chọn backend theo policy + hedged request =========
+class BackendStats:
+	"""Latency (các mẫu gần nhất) và tỉ lệ lỗi (EWMA) của một backend."""
+	def __init__(self, window: int = 200):
+		self.latencies: Deque[float] = deque(maxlen=window)
+		self.requests = 0
+		self.errors = 0
+		self.hedge_wins = 0
+		self.error_rate = 0.0
+
+	def record(self, latency: Optional[float]) -> None:
+		# latency=None → lỗi
+		self.requests += 1
+		if latency is None:
+			self.errors += 1
+		else:
+			self.latencies.append(latency)
+		self.error_rate = 0.8 * self.error_rate + 0.2 * (latency is None)
+
+	def quantile(self, q: float) -> Optional[float]:
+		if len(self.latencies) < settings.LLM_HEDGE_MIN_SAMPLES:
+			return None
+		xs = sorted(self.latencies)
+		return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+	def snapshot(self) -> Dict[str, Any]:
+		p50, p95 = self.quantile(0.5), self.quantile(0.95)
+		return {
+			"requests": self.requests,
+			"errors": self.errors,
+			"error_rate": round(self.error_rate, 3),
+			"p50_s": None if p50 is None else round(p50, 3),
+			"p95_s": None if p95 is None else round(p95, 3),
+			"hedge_wins": self.hedge_wins,
+		}
+
+class LLMRouter:
+	"""
+	Policy (settings.LLM_ROUTING_POLICY):
+	- "fixed"   : chỉ settings.LLM_PROVIDER (như trước)
+	- "fallback": theo thứ tự LLM_ROUTE_BACKENDS
+	- "fastest" : p50 thấp nhất trước (backend chưa có số liệu được thử trước)
+	- "cheapest": LLM_COST_PER_MTOK thấp nhất trước
+	Backend lỗi / circuit mở bị đẩy xuống cuối; lỗi ở backend này → thử backend kế tiếp.
+	Hedge: backend đầu chưa trả lời sau p95 của nó → gửi thêm sang backend thứ hai,
+	lấy kết quả về trước và huỷ request còn lại.
+	"""
+	def __init__(self):
+		self._stats: Dict[str, BackendStats] = {}
+
+	def stats_for(self, backend: LLMBackend) -> BackendStats:
+		key = f"{backend.name}:{backend.model}"
+		if key not in self._stats:
+			self._stats[key] = BackendStats()
+		return self._stats[key]
+
+	def candidates(self) -> List[LLMBackend]:
+		out: List[LLMBackend] = []
+		for name in settings.LLM_ROUTE_BACKENDS:
+			if name == "gemini" and not settings.GEMINI_API_KEY:
+				continue
+			if name == "openai" and not (settings.OPENAI_API_KEY or settings.OPENAI_BASE_URL):
+				continue
+			out.append(get_backend(name))
+		return out or [get_backend()]
+
+	def _healthy(self, backend: LLMBackend) -> bool:
+		guard = get_guard(backend.name, backend.model)
+		return guard.breaker.state != "open" and self.stats_for(backend).error_rate < 0.5
+
+	def order(self, policy: Optional[str] = None) -> List[LLMBackend]:
+		policy = policy or settings.LLM_ROUTING_POLICY
+		if policy == "fixed":
+			return [get_backend()]
+		backends = self.candidates()
+		if policy == "fastest":
+			backends.sort(key=lambda b: self.stats_for(b).quantile(0.5) or 0.0)
+		elif policy == "cheapest":
+			backends.sort(key=lambda b: settings.LLM_COST_PER_MTOK.get(b.name, 0.0))
+		# sort ổn định: giữ thứ tự policy trong từng nhóm khoẻ / không khoẻ
+		backends.sort(key=lambda b: not self._healthy(b))
+		return backends
+
+	async def attempt(self, backend: LLMBackend, prompt, images, max_tokens, json_mode, timeout) -> str:
+		stats = self.stats_for(backend)
+		t0 = time.perf_counter()
+		with span("llm.generate", prompt_tokens=estimate_tokens(prompt), images=len(images or [])) as sp:
+			try:
+				out = await _guarded(
+					backend,
+					_estimate_request_tokens(prompt, images, max_tokens),
+					lambda: backend.generate(prompt, images=images, max_tokens=max_tokens, json_mode=json_mode, timeout=timeout),
+				)
+			except Exception:
+				stats.record(None)
+				sp.set(errors=1)
+				raise
+			sp.set(output_tokens=estimate_tokens(out))
+		stats.record(time.perf_counter() - t0)
+		return out
+
+	async def _hedged(self, first: LLMBackend, second: LLMBackend, *args: Any) -> str:
+		delay = self.stats_for(first).quantile(0.95) or settings.LLM_HEDGE_DELAY_S
+		t1 = asyncio.ensure_future(self.attempt(first, *args))
+		pending = {t1}
+		try:
+			# t1 xong trước p95 (thành công hoặc lỗi) → không cần hedge
+			done, _ = await asyncio.wait(pending, timeout=max(settings.LLM_HEDGE_MIN_DELAY_S, delay))
+			if done and t1.exception() is None:
+				return t1.result()
+			t2 = asyncio.ensure_future(self.attempt(second, *args))
+			pending = {t2} if done else {t1, t2}
+			err: Optional[BaseException] = t1.exception() if done else None
+			while pending:
+				done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+				for t in done:
+					if t.exception() is None:
+						if t is t2:
+							self.stats_for(second).hedge_wins += 1
+						return t.result()
+					err = t.exception()
+			raise err
+		finally:
+			# bên thua (hoặc cả hai khi caller bị huỷ) bị huỷ ngay
+			for t in pending:
+				t.cancel()
+
+	async def generate(self, prompt, images, max_tokens, json_mode, timeout, hedge: bool = False) -> str:
+		backends = self.order()
+		args = (prompt, images, max_tokens, json_mode, timeout)
+		err: Optional[Exception] = None
+		if hedge and len(backends) >= 2:
+			try:
+				return await self._hedged(backends[0], backends[1], *args)
+			except Exception as e:
+				err, backends = e, backends[2:]
+		for backend in backends:
+			try:
+				return await self.attempt(backend, *args)
+			except Exception as e:
+				err = e
+		raise err
+
+	def scope(self) -> str:
+		# policy + tập backend có thể trả lời (theo cấu hình, không theo thứ tự sức khoẻ đang đổi)
+		backends = [get_backend()] if settings.LLM_ROUTING_POLICY == "fixed" else self.candidates()
+		return "|".join([settings.LLM_ROUTING_POLICY] + [f"{b.name}:{b.model}" for b in backends])
+
+	def stats(self) -> Dict[str, Any]:
+		return {
+			"policy": settings.LLM_ROUTING_POLICY,
+			"order": [f"{b.name}:{b.model}" for b in self.order()],
+			"backends": {k: v.snapshot() for k, v in self._stats.items()},
+		}
+
+router = LLMRouter()
+
+def cache_scope() -> str:
+	"""
+	Phần "model" của cache key cho lời gọi qua router: router có thể trả lời bằng backend
+	khác LLM_PROVIDER, nên key theo policy + các backend của nó chứ không theo get_backend().
+	"""
+	return router.scope()
+
+async def _generate(
+	provider: Optional[str],
+	model: Optional[str],
+	prompt: str,
+	images: Optional[List[Tuple[bytes, str]]],
+	max_tokens: Optional[int],
+	json_mode: bool,
+	timeout: Optional[float],
+) -> str:
+	args = (prompt, images, max_tokens, json_mode, timeout)
+	if provider is None and model is None:
+		# không chỉ định backend → để router chọn theo policy
+		route = f"route:{settings.LLM_ROUTING_POLICY}"
+		call = lambda: router.generate(*args, hedge=settings.LLM_HEDGE_ENABLED)
+	else:
+		backend = get_backend(provider, model)
+		route = f"{backend.name}:{backend.model}"
+		call = lambda: router.attempt(backend, *args)
+
+	if not settings.LLM_SINGLE_FLIGHT:
+		return await call()
+	key = make_key(
+		route, prompt, str(max_tokens), str(json_mode),
+		*(part for data, mime in images or [] for part in (mime, data)),
+	)
+	return await _single_flight.do(key, call)
+
+# ========= Public helpers =========
+async def generate_text(
+	prompt: str,
+	max_tokens: Optional[int] = 400,
+	provider: Optional[str] = None,
+	model: Optional[str] = None,
+	json_mode: bool = False,
+	timeout: Optional[float] = None,
+) -> str:
+	return await _generate(provider, model, prompt, None, max_tokens, json_mode, timeout)
+
+async def generate_vision(
+	prompt: str,
+	image_bytes: bytes,
+	content_type: str,
+	max_tokens: int = 400,
+	provider: Optional[str] = None,
+	model: Optional[str] = None,
+	timeout: Optional[float] = None,
+) -> str:
+	return await _generate(provider, model, prompt, [(image_bytes, content_type)], max_tokens, False, timeout)
+
+async def generate_multimodal(
+	prompt: str,
+	images: List[Tuple[bytes, str]],
+	max_tokens: Optional[int] = 400,
+	provider: Optional[str] = None,
+	model: Optional[str] = None,
+	json_mode: bool = False,
+	timeout: Optional[float] = None,
+) -> str:
+	"""Một lời gọi với nhiều ảnh (theo thứ tự), ví dụ nhiều trang PDF scan."""
+	return await _generate(provider, model, prompt, images, max_tokens, json_mode, timeout)
+
+async def _stream_guarded(backend: LLMBackend, prompt: str, max_tokens: Optional[int], timeout: Optional[float]) -> AsyncIterator[str]:
+	guard = get_guard(backend.name, backend.model)
+	tokens = _estimate_request_tokens(prompt, None, max_tokens)
+	attempt = 0
+	while True:
+		guard.breaker.allow()
+		await guard.limiter.acquire(tokens, settings.LLM_LIMIT_MAX_WAIT_S)
+		started = False
+		try:
+			async for piece in backend.stream(prompt, max_tokens=max_tokens, timeout=timeout):
+				started = True
+				yield piece
+		except (httpx.HTTPStatusError, httpx.TransportError) as e:
+			retry_after = _on_upstream_error(guard, e)
+			if started:
+				raise  # đã gửi một phần cho client → không thử lại được
+			attempt += 1
+			await asyncio.sleep(_backoff(attempt, retry_after, e))
+			continue
+		guard.breaker.record_success()
+		guard.limiter.on_success()
+		return
+
+async def stream_text(
+	prompt: str,
+	max_tokens: Optional[int] = 400,
+	provider: Optional[str] = None,
+	model: Optional[str] = None,
+	timeout: Optional[float] = None,
+) -> AsyncIterator[str]:
+	if provider is None and model is None:
+		backends = router.order()
+	else:
+		backends = [get_backend(provider, model)]
+	err: Optional[Exception] = None
+	for backend in backends:
+		stats = router.stats_for(backend)
+		t0 = time.perf_counter()
+		started = False
+		out_chars = 0
+		try:
+			async for piece in _stream_guarded(backend, prompt, max_tokens, timeout):
+				if not started:
+					started = True
+					stats.record(time.perf_counter() - t0)  # stream: tính latency tới token đầu
+					record("llm.stream.first_token", time.perf_counter() - t0)
+				out_chars += len(piece)
+				yield piece
+			record("llm.stream", time.perf_counter() - t0, prompt_tokens=estimate_tokens(prompt), output_chars=out_chars)
+			return
+		except Exception as e:
+			if started:
+				raise
+			stats.record(None)
+			err = e  # chưa gửi gì cho client → thử backend kế tiếp
+	raise err
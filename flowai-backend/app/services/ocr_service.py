@@ -0,0 +1,201 @@
+# app/services/ocr_service.py
+"""
+PDF scan: trang không có text layer được render thành ảnh rồi chép lại chữ bằng vision LLM.
+
+- Chỉ OCR các trang thiếu text (< OCR_MIN_TEXT_CHARS ký tự); trang trắng bị bỏ qua
+- Render song song trên process pool (pdf_service.render_pages), theo từng cửa sổ trang:
+  cửa sổ sau được render trong lúc cửa sổ trước đang gọi LLM
+- OCR_BATCH_SIZE trang mỗi lời gọi (JSON {pages: [...]}), tối đa OCR_CONCURRENCY lời gọi song song
+  → số lời gọi ≈ số trang / batch thay vì mỗi trang một lời gọi
+- Cache theo hash ảnh trang: tài liệu nộp lại / trang trùng không tốn thêm lời gọi
+"""
+import asyncio
+import hashlib
+import json
+import re
+import tempfile
+from typing import IO, Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.executors import io_executor
+from app.core.tracing import span
+from app.services import llm_client
+from app.services.cache import make_key, summary_cache
+from app.services.pdf_service import iter_pdf_pages, render_pages
+from app.services.summarize_service import chunk_text
+from app.utils.concurrency import gather_bounded
+
+# Tăng khi sửa prompt để không dùng lại cache cũ
+PROMPT_VERSION = "ocr-v1"
+
+_MIME = "image/jpeg"
+
+def _prompt(n: int) -> str:
+	return "\n".join([
+		f"You are given {n} scanned document page image(s), in order.",
+		"Transcribe all readable text of each page faithfully, keeping the reading order and line breaks.",
+		"Do not summarize, translate or add commentary. Use an empty string for a page without text.",
+		f'Return JSON only: {{"pages": [string, ...]}} with exactly {n} entries, one per image, in the same order.',
+	])
+
+def _cache_key(page_hash: str) -> Optional[str]:
+	if not settings.SUMMARY_CACHE_ENABLED:
+		return None
+	return make_key("ocr", llm_client.cache_scope(), PROMPT_VERSION, page_hash)
+
+def _parse_pages(raw: str, n: int) -> Optional[List[str]]:
+	try:
+		data = json.loads(raw)
+	except (TypeError, ValueError):
+		return None
+	pages = data.get("pages") if isinstance(data, dict) else data
+	if not isinstance(pages, list) or len(pages) != n:
+		return None
+	return [p if isinstance(p, str) else "" for p in pages]
+
+# chuỗi JSON (kể cả chuỗi cuối bị cắt cụt, chưa đóng ngoặc kép)
+_JSON_STRING = re.compile(r'"((?:[^"\\]|\\.)*)(?:"|\\?\Z)')
+
+def _salvage(raw: str) -> str:
+	"""Lấy chữ từ output không parse được: text thường giữ nguyên; JSON hỏng → chỉ các chuỗi giá trị."""
+	text = (raw or "").strip()
+	if not text.startswith(("{", "[")):
+		return text
+	# thường là JSON bị cắt giữa chừng (hết max_tokens): bỏ khoá, ngoặc, dấu phẩy
+	body = text.split('"pages"', 1)[-1]
+	parts: List[str] = []
+	for m in _JSON_STRING.finditer(body):
+		if body[m.end():].lstrip().startswith(":"):
+			continue  # khoá của object
+		try:
+			parts.append(json.loads(f'"{m.group(1)}"'))
+		except ValueError:
+			continue
+	return "\n".join(p for p in parts if p.strip())
+
+async def _ocr_batch(batch: List[Tuple[int, bytes]]) -> Tuple[Dict[int, str], Set[int]]:
+	"""Trả ({trang: text}, các trang mà output không parse được → không cache)."""
+	raw = await llm_client.generate_multimodal(
+		_prompt(len(batch)),
+		[(img, _MIME) for _, img in batch],
+		max_tokens=settings.OCR_MAX_TOKENS_PER_PAGE * len(batch),
+		json_mode=True,
+	)
+	pages = _parse_pages(raw, len(batch))
+	if pages is not None:
+		return {i: text for (i, _), text in zip(batch, pages)}, set()
+	if len(batch) == 1:
+		return {batch[0][0]: _salvage(raw)}, {batch[0][0]}
+	# số trang trả về không khớp → không biết text nào của trang nào: gọi lại từng trang
+	out: Dict[int, str] = {}
+	unparsed: Set[int] = set()
+	for item in batch:
+		texts, bad = await _ocr_batch([item])
+		out.update(texts)
+		unparsed |= bad
+	return out, unparsed
+
+async def _ocr_rendered(rendered: List[Tuple[int, Optional[bytes]]]) -> Dict[int, str]:
+	out: Dict[int, str] = {}
+	keys: Dict[int, Optional[str]] = {}
+	todo: List[Tuple[int, bytes]] = []
+	for i, img in rendered:
+		if img is None:
+			continue
+		key = _cache_key(hashlib.sha256(img).hexdigest())
+		hit = await summary_cache.aget(key) if key else None
+		if hit is not None:
+			out[i] = hit
+		else:
+			keys[i] = key
+			todo.append((i, img))
+
+	async def _save(_: int, result: Tuple[Dict[int, str], Set[int]]) -> None:
+		texts, unparsed = result
+		for i, text in texts.items():
+			out[i] = text
+			# output hỏng dùng tạm cho lần này, không cache (lần sau OCR lại)
+			if keys.get(i) and i not in unparsed:
+				await summary_cache.aset(keys[i], text)
+
+	size = max(1, settings.OCR_BATCH_SIZE)
+	batches = [todo[k:k + size] for k in range(0, len(todo), size)]
+	# batch lỗi → huỷ các batch còn lại; batch đã xong vẫn được cache
+	await gather_bounded(batches, _ocr_batch, on_result=_save, limit=settings.OCR_CONCURRENCY)
+	return out
+
+async def ocr_pages(source: str, pages: List[int], timeout: Optional[float] = None) -> Dict[int, str]:
+	"""Chép lại chữ các trang (chỉ số từ 0) của PDF; trả {trang: text} (trang trắng không có trong kết quả)."""
+	if not pages:
+		return {}
+	window = max(1, settings.OCR_BATCH_SIZE) * max(1, settings.OCR_CONCURRENCY)
+	groups = [pages[k:k + window] for k in range(0, len(pages), window)]
+	out: Dict[int, str] = {}
+
+	def _render(group: List[int]) -> "asyncio.Future":
+		return asyncio.ensure_future(io_executor.run(render_pages, source, group, timeout=timeout))
+
+	with span("ocr", pages=len(pages)) as sp:
+		pending = _render(groups[0])
+		try:
+			for k in range(len(groups)):
+				rendered = await pending
+				# render cửa sổ kế tiếp song song với các lời gọi vision của cửa sổ này
+				pending = _render(groups[k + 1]) if k + 1 < len(groups) else None
+				out.update(await _ocr_rendered(rendered))
+		finally:
+			if pending is not None:
+				pending.cancel()
+				await asyncio.gather(pending, return_exceptions=True)
+		sp.set(ocr_pages=len(out))
+	return out
+
+# ===== PDF → chunks (text layer + OCR cho trang scan) =====
+def _spool_pages(path: str) -> Tuple[IO[bytes], List[Tuple[int, int]], List[int]]:
+	# lượt 1: parse PDF một lần, ghi text từng trang ra file tạm (không giữ cả tài liệu trong RAM)
+	# và ghi nhận trang thiếu text layer
+	spool = tempfile.TemporaryFile()
+	spans: List[Tuple[int, int]] = []
+	scanned: List[int] = []
+	try:
+		for i, text in enumerate(iter_pdf_pages(path)):
+			data = text.encode("utf-8")
+			spans.append((spool.tell(), len(data)))
+			spool.write(data)
+			if len(text.strip()) < settings.OCR_MIN_TEXT_CHARS:
+				scanned.append(i)
+	except BaseException:
+		spool.close()
+		raise
+	return spool, spans, scanned
+
+def _spooled_pages(spool: IO[bytes], spans: List[Tuple[int, int]], ocr: Dict[int, str]) -> Iterator[str]:
+	# lượt 2: đọc lại từng trang theo thứ tự, trang scan thay bằng text OCR
+	for i, (offset, size) in enumerate(spans):
+		if i in ocr:
+			yield ocr[i]
+			continue
+		spool.seek(offset)
+		yield spool.read(size).decode("utf-8")
+
+async def pdf_to_chunks(path: str, report: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> List[str]:
+	"""
+	Trích text từng trang; trang thiếu text layer được OCR (OCR_ENABLED) rồi ghép đúng vị trí,
+	sau đó chunk như PDF thường. report (tuỳ chọn) nhận provenance của chunk_text + các trang đã OCR.
+	Trang được stream vào chunk_text (qua file tạm khi cần OCR), không nạp cả tài liệu vào RAM.
+	"""
+	if not settings.OCR_ENABLED:
+		chunks = await io_executor.run(lambda: chunk_text(iter_pdf_pages(path), report), timeout=timeout)
+		if report is not None:
+			report["ocr_pages"] = []
+		return chunks
+
+	spool, spans, scanned = await io_executor.run(_spool_pages, path, timeout=timeout)
+	try:
+		ocr = await ocr_pages(path, scanned, timeout=timeout) if scanned else {}
+		chunks = await io_executor.run(chunk_text, _spooled_pages(spool, spans, ocr), report, timeout=timeout)
+	finally:
+		spool.close()
+	if report is not None:
+		report["ocr_pages"] = sorted(ocr)
+	return chunks
@@ -1,23 +1,139 @@
 import io
-import fitz  # PyMuPDF
-import pdfplumber
+import time
+from typing import Iterator, List, Optional, Tuple, Union
 
-def extract_text_from_pdf(file_bytes: bytes) -> str:
-	# Ưu tiên pdfplumber (thường giữ bố cục dòng tốt)
+from app.core.config import settings
+from app.core.executors import cpu_executor
+from app.core.tracing import record
+
+# ===== Chọn engine theo từng trang =====
+def _needs_layout(page) -> bool:
+	"""
+	Trang nhiều cột / dạng bảng: có nhiều dòng text nằm cùng hàng nhưng khác cột.
+	Khi đó pdfplumber giữ bố cục dòng tốt hơn; còn lại dùng PyMuPDF (nhanh hơn nhiều).
+	"""
+	lines = sorted(
+		(ln["bbox"] for b in page.get_text("dict", flags=0)["blocks"] for ln in b.get("lines", [])),
+		key=lambda r: r[1],
+	)
+	side_by_side = 0
+	for prev, cur in zip(lines, lines[1:]):
+		same_row = cur[1] < prev[3] and prev[1] < cur[3]
+		disjoint_x = cur[0] >= prev[2] or prev[0] >= cur[2]
+		if same_row and disjoint_x:
+			side_by_side += 1
+	return side_by_side >= 3
+
+# PDF nguồn: đường dẫn file (ưu tiên – worker tự mở, không copy bytes qua process) hoặc bytes
+PdfSource = Union[str, bytes]
+
+# fitz / pdfplumber import lười: nặng (~0.2s), chỉ cần khi thật sự có PDF
+def _open_fitz(source: PdfSource):
+	import fitz  # PyMuPDF
+
+	if isinstance(source, str):
+		return fitz.open(source)
+	return fitz.open(stream=source, filetype="pdf")
+
+def _open_plumber(source: PdfSource):
+	import pdfplumber
+
+	if isinstance(source, str):
+		return pdfplumber.open(source)
+	return pdfplumber.open(io.BytesIO(source))
+
+def _extract_range(source: PdfSource, start: int, end: int) -> Tuple[List[str], int]:
+	# chạy trong worker process: mỗi worker tự mở tài liệu; trả (text từng trang, số trang dùng pdfplumber)
+	out: List[str] = []
+	layout_pages = 0
+	plumber = None
+	with _open_fitz(source) as doc:
+		try:
+			for i in range(start, end):
+				page = doc[i]
+				text = page.get_text("text", sort=True)
+				if text.strip() and _needs_layout(page):
+					try:
+						if plumber is None:
+							plumber = _open_plumber(source)
+						text = plumber.pages[i].extract_text() or text
+						layout_pages += 1
+					except Exception:
+						pass
+				out.append(text)
+		finally:
+			if plumber is not None:
+				plumber.close()
+	return out, layout_pages
+
+def iter_pdf_pages(source: PdfSource) -> Iterator[str]:
+	"""
+	Trả text từng trang theo đúng thứ tự. Hàm đồng bộ, chặn → gọi qua io_executor.
+	Việc parse chạy trên process pool của cpu_executor: PDF lớn (≥ PDF_PARALLEL_MIN_PAGES trang)
+	được chia thành các dải PDF_PAGES_PER_TASK trang chạy song song; PDF nhỏ là một task duy nhất.
+	"""
+	with _open_fitz(source) as doc:
+		n_pages = doc.page_count
+
+	step = max(1, settings.PDF_PAGES_PER_TASK)
+	if n_pages < settings.PDF_PARALLEL_MIN_PAGES:
+		step = max(1, n_pages)
+
+	pool = cpu_executor.pool
+	futures = [
+		pool.submit(_extract_range, source, start, min(n_pages, start + step))
+		for start in range(0, n_pages, step)
+	]
 	try:
-		texts = []
-		with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
-			for page in pdf.pages:
-				texts.append(page.extract_text() or "")
-		text = "\n".join(texts).strip()
-		if text:
-			return text
-	except Exception:
-		pass
-
-	# Fallback: PyMuPDF
-	doc = fitz.open(stream=file_bytes, filetype="pdf")
-	out = []
-	for page in doc:
-		out.append(page.get_text("text"))
-	return "\n".join(out).strip()
+		for f in futures:
+			# thời gian chờ worker (phần parse chưa chồng lên việc chunk/summarize phía sau)
+			t0 = time.perf_counter()
+			texts, layout_pages = f.result()
+			record("pdf.parse", time.perf_counter() - t0, pages=len(texts), layout_pages=layout_pages)
+			yield from texts
+	finally:
+		for f in futures:
+			f.cancel()
+
+# ===== Rasterize trang scan (OCR, xem app/services/ocr_service.py) =====
+def _render_range(source: PdfSource, pages: List[int], dpi: int, quality: int) -> List[Tuple[int, Optional[bytes]]]:
+	# chạy trong worker process; trang không có ảnh lẫn nét vẽ = trang trắng → None (khỏi OCR)
+	import fitz  # PyMuPDF
+
+	out: List[Tuple[int, Optional[bytes]]] = []
+	with _open_fitz(source) as doc:
+		for i in pages:
+			page = doc[i]
+			if not page.get_images(full=False) and not page.get_drawings():
+				out.append((i, None))
+				continue
+			# ảnh xám JPEG: đủ cho chữ, nhỏ hơn RGB/PNG nhiều lần
+			pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+			out.append((i, pix.tobytes("jpeg", jpg_quality=quality)))
+	return out
+
+def render_pages(source: PdfSource, pages: List[int]) -> List[Tuple[int, Optional[bytes]]]:
+	"""
+	Render các trang (chỉ số từ 0) thành JPEG xám OCR_DPI; mỗi OCR_PAGES_PER_TASK trang là một task
+	trên process pool, chạy song song. Hàm đồng bộ, chặn → gọi qua io_executor.
+	"""
+	step = max(1, settings.OCR_PAGES_PER_TASK)
+	pool = cpu_executor.pool
+	futures = [
+		pool.submit(_render_range, source, pages[i:i + step], settings.OCR_DPI, settings.OCR_JPEG_QUALITY)
+		for i in range(0, len(pages), step)
+	]
+	out: List[Tuple[int, Optional[bytes]]] = []
+	try:
+		for f in futures:
+			t0 = time.perf_counter()
+			part = f.result()
+			record("pdf.render", time.perf_counter() - t0, pages=len(part), bytes=sum(len(b or b"") for _, b in part))
+			out.extend(part)
+	finally:
+		for f in futures:
+			f.cancel()
+	return out
+
+def extract_text_from_pdf(source: PdfSource) -> str:
+	return "\n".join(iter_pdf_pages(source)).strip()
@@ -1,14 +1,14 @@
 # app/services/planner_service.py
-import json, re, math
-import requests
-from datetime import date, datetime, timedelta, time
-from typing import List, Dict, Any, Tuple
+import json, re, math, time
+from collections import Counter
+from datetime import date
+from typing import List, Dict, Any, Iterator, Optional
 
-from app.core.config import settings
-
-# ========= LLM (Gemini via REST) =========
-_GEMINI_URL = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={key}"
+from app.core.tracing import record, span
+from app.services import ics, llm_client, scheduler
+from app.services.scheduler import WorkHours
 
+# ========= LLM (Gemini via async REST client) =========
 def _prompt(goal: str, timeframe: str, desc: str, due: str, locale: str) -> str:
 	return "\n".join([
 		"Bạn là trợ lý lập kế hoạch & quản trị công việc.",
@@ -25,18 +25,13 @@ def _prompt(goal: str, timeframe: str, desc: str, due: str, locale: str) -> str:
 		f"Due: {due or ''}"
 	])
 
-def _call_gemini(goal: str, timeframe: str, desc: str = "", due: str = "", locale: str = "vi-VN") -> Dict[str, Any]:
-	if not settings.GEMINI_API_KEY:
-		raise RuntimeError("Missing GEMINI_API_KEY")
-	url = _GEMINI_URL.format(model=settings.GEMINI_MODEL, key=settings.GEMINI_API_KEY)
-	payload = {
-		"contents": [{"role": "user", "parts": [{"text": _prompt(goal, timeframe, desc, due, locale)}]}],
-		"generationConfig": {"response_mime_type": "application/json"}
-	}
-	resp = requests.post(url, json=payload, timeout=60)
-	resp.raise_for_status()
-	data = resp.json()
-	txt = data["candidates"][0]["content"]["parts"][0]["text"]
+async def _call_gemini(goal: str, timeframe: str, desc: str = "", due: str = "", locale: str = "vi-VN") -> Dict[str, Any]:
+	txt = await llm_client.generate_text(
+		_prompt(goal, timeframe, desc, due, locale),
+		max_tokens=None,
+		provider="gemini",
+		json_mode=True,
+	)
 	return json.loads(txt)
 
 # ========= Heuristic fallback (khi model lỗi) =========
@@ -74,12 +69,12 @@ def _fallback_plan(goal: str, desc: str = "") -> Dict[str, Any]:
 	}
 
 # ========= Public: Plan goals =========
-def plan_goals(goal: str, timeframe: str = "week", desc: str = "", due: str = "", locale: str = "vi-VN") -> List[Dict[str, Any]]:
+async def plan_goals(goal: str, timeframe: str = "week", desc: str = "", due: str = "", locale: str = "vi-VN") -> List[Dict[str, Any]]:
 	"""
 	returns: list[{id, text, duration, dateStr?}]
 	"""
 	try:
-		raw = _call_gemini(goal, timeframe, desc, due, locale)
+		raw = await _call_gemini(goal, timeframe, desc, due, locale)
 	except Exception:
 		raw = _fallback_plan(goal, desc)
 
@@ -100,158 +95,123 @@ def plan_goals(goal: str, timeframe: str = "week", desc: str = "", due: str = ""
 	return out
 
 # ========= Scheduling =========
-def _parse_work_hours(s: str) -> Tuple[time, time]:
-	# "09:00-17:00"
-	try:
-		start_str, end_str = s.split("-", 1)
-		h1, m1 = [int(x) for x in start_str.split(":")]
-		h2, m2 = [int(x) for x in end_str.split(":")]
-		return time(h1, m1), time(h2, m2)
-	except Exception:
-		return time(9, 0), time(17, 0)
-
-def _is_weekday(d: date) -> bool:
-	return d.weekday() < 5  # Mon..Fri
-
-def _next_workday(d: date) -> date:
-	cur = d
-	while not _is_weekday(cur):
-		cur += timedelta(days=1)
-	return cur
-
-def _add_hours(dt: datetime, hours: float) -> datetime:
-	return dt + timedelta(hours=hours)
-
-def schedule_tasks(tasks: List[Dict[str, Any]], start_date: str, work_hours: str = "09:00-17:00", tz: str = "Asia/Ho_Chi_Minh") -> List[Dict[str, Any]]:
+def schedule_tasks(
+	tasks: List[Dict[str, Any]],
+	start_date: str,
+	work_hours: WorkHours = "09:00-17:00",
+	tz: str = "Asia/Ho_Chi_Minh",
+	busy: Optional[List[Dict[str, Any]]] = None,
+	holidays: Optional[List[str]] = None,
+	lunch: Optional[str] = "12:00-13:00",
+	plan_id: Optional[str] = None,
+) -> List[Dict[str, Any]]:
 	"""
-	Input tasks: [{text, duration (hours), id? , dateStr?}, ...]
-	Output: list events [{title, dateStr, start, end, duration, id}]
-	- Ưu tiên đặt vào ngày chỉ định nếu task có dateStr và là ngày làm việc.
-	- Tránh khung trưa 12:00–13:00.
-	- Nếu hết slot trong ngày → sang ngày làm việc tiếp theo.
+	Input tasks: [{text|title, duration (hours), id? , dateStr?}, ...]
+	Output: list events [{title, dateStr, start, end, duration, id, timezone, part?, parts?}]
+	- work_hours: "09:00-17:00" (Thứ 2–6) hoặc dict ghi đè theo thứ/ngày, ví dụ {"sat": "08:00-12:00", "2025-01-02": ""}.
+	- busy: lịch đã có [{dateStr, start, end}]; holidays: ["yyyy-mm-dd", ...]; lunch: khung trưa (None = bỏ).
+	- Task có dateStr → bắt đầu tìm từ ngày đó; task dài hơn khe trống được chia thành nhiều phần.
+	- plan_id (tuỳ chọn): UID event suy ra từ plan_id; thiếu → từ id + tên các task (xếp lại cùng plan → cùng UID).
+	Xem app/services/scheduler.py.
 	"""
-	# parse work hours
-	t_start, t_end = _parse_work_hours(work_hours)
-	lunch_start, lunch_end = time(12, 0), time(13, 0)
-
-	cur_date = _next_workday(datetime.fromisoformat(start_date).date())
-	cur_dt = datetime.combine(cur_date, t_start)
-
-	events: List[Dict[str, Any]] = []
-
-	def _place_on_day(day: date, duration_h: float) -> Tuple[datetime, datetime]:
-		nonlocal cur_dt
-		start_dt = datetime.combine(day, cur_dt.time())
-		end_dt = _add_hours(start_dt, duration_h)
-
-		# nếu cắt qua giờ trưa → chia đôi: trước trưa + sau trưa
-		lunch_s = datetime.combine(day, lunch_start)
-		lunch_e = datetime.combine(day, lunch_end)
-
-		if start_dt < lunch_s and end_dt > lunch_s:
-			# phần trước trưa
-			before = (lunch_s - start_dt).total_seconds() / 3600.0
-			if before > 0:
-				# đặt trước trưa
-				e1_end = lunch_s
-				# CHÚ Ý: để đơn giản, đẩy toàn bộ block sang sau trưa nếu không đủ trước trưa
-				# → chuyển sang sau trưa
-				pass
-
-			# chuyển cả block sau trưa
-			start_dt = lunch_e
-			end_dt = _add_hours(start_dt, duration_h)
-
-		# nếu vượt quá giờ làm việc → chuyển sang ngày hôm sau
-		day_end = datetime.combine(day, t_end)
-		if end_dt > day_end:
-			return None, None
-
-		return start_dt, end_dt
-
-	for idx, t in enumerate(tasks, 1):
-		title = str(t.get("text", "")).strip()
-		if not title: continue
-		dur = int(math.ceil(float(t.get("duration") or 1)))
-		if dur < 1: dur = 1
-
-		# nếu task có dateStr → đặt lại con trỏ ngày
-		task_date_str = t.get("dateStr")
-		if task_date_str:
-			try:
-				td = datetime.fromisoformat(task_date_str).date()
-				if _is_weekday(td):
-					cur_date = td
-					cur_dt = datetime.combine(cur_date, t_start)
-				else:
-					# nếu rơi cuối tuần, dời đến ngày làm việc kế
-					cur_date = _next_workday(td)
-					cur_dt = datetime.combine(cur_date, t_start)
-			except Exception:
-				pass
-
-		# thử đặt vào ngày hiện tại (và cuộn ngày nếu cần)
-		while True:
-			cur_date = _next_workday(cur_date)
-			start_end = _place_on_day(cur_date, dur)
-			if start_end != (None, None):
-				start_dt, end_dt = start_end
-				events.append({
-					"id": t.get("id") or idx,
-					"title": title,
-					"dateStr": start_dt.date().isoformat(),
-					"start": start_dt.strftime("%H:%M"),
-					"end": end_dt.strftime("%H:%M"),
-					"duration": dur,
-					"timezone": tz
-				})
-				# cập nhật con trỏ thời gian cho task tiếp theo
-				cur_dt = end_dt
-				# nếu vượt quá giờ làm việc → chuyển sang đầu ngày kế
-				if cur_dt.time() >= t_end:
-					cur_date = cur_date + timedelta(days=1)
-					cur_dt = datetime.combine(cur_date, t_start)
-				break
-			else:
-				# không đủ chỗ trong ngày → nhảy sang ngày sau, đặt lại giờ bắt đầu
-				cur_date = cur_date + timedelta(days=1)
-				cur_dt = datetime.combine(cur_date, t_start)
-
+	with span("schedule", tasks=len(tasks)) as sp:
+		events = scheduler.schedule(
+			tasks, start_date, work_hours, tz,
+			busy=busy or [], holidays=holidays or [], lunch=lunch, plan_id=plan_id,
+		)
+		sp.set(events=len(events))
 	return events
 
-# ========= ICS =========
-def _pad2(n: int) -> str:
-	return str(n).zfill(2)
-
-def _dtstamp(dt: datetime) -> str:
-	return dt.strftime("%Y%m%dT%H%M%SZ")
+def replan_tasks(
+	previous: List[Dict[str, Any]],
+	delta: List[Dict[str, Any]],
+	work_hours: WorkHours = "09:00-17:00",
+	tz: str = "Asia/Ho_Chi_Minh",
+	busy: Optional[List[Dict[str, Any]]] = None,
+	holidays: Optional[List[str]] = None,
+	lunch: Optional[str] = "12:00-13:00",
+	start_date: Optional[str] = None,
+	plan_id: Optional[str] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+	"""
+	Cập nhật lịch đã xếp theo delta (add / remove / resize / pin) thay vì xếp lại từ đầu.
+	Trả {"changed": [...], "cancelled": [...]}. Xem scheduler.replan.
+	"""
+	with span("schedule.replan", ops=len(delta)):
+		return scheduler.replan(
+			previous, delta, work_hours, tz,
+			busy=busy or [], holidays=holidays or [], lunch=lunch, start_date=start_date, plan_id=plan_id,
+		)
+
+# ========= Batch scheduling =========
+def _schedule_plan(plan: Any) -> Dict[str, Any]:
+	# chạy trong worker process; lỗi của một plan không làm hỏng cả batch
+	if not isinstance(plan, dict):
+		return {"error": "plan must be an object"}
+	try:
+		return {"scheduled": schedule_tasks(
+			plan.get("tasks", []),
+			plan.get("start_date") or date.today().isoformat(),
+			plan.get("work_hours", "09:00-17:00"),
+			plan.get("timezone", "Asia/Ho_Chi_Minh"),
+			busy=plan.get("busy"),
+			holidays=plan.get("holidays"),
+			lunch=plan.get("lunch", "12:00-13:00"),
+			plan_id=None if plan.get("id") is None else str(plan["id"]),
+		)}
+	except Exception as e:
+		return {"error": str(e)}
+
+def batch_plan_ids(plans: List[Any]) -> List[str]:
+	"""plan_id của từng plan (thiếu id / không phải object → chỉ số); id trùng → ValueError."""
+	ids = [
+		str(p["id"] if isinstance(p, dict) and p.get("id") is not None else i)
+		for i, p in enumerate(plans)
+	]
+	dupes = sorted(i for i, n in Counter(ids).items() if n > 1)
+	if dupes:
+		raise ValueError(f"Duplicate plan id(s): {', '.join(dupes)}")
+	return ids
 
-def _dtlocal(d: date, hhmm: str) -> str:
-	h, m = [int(x) for x in hhmm.split(":")]
-	return f"{d.year}{_pad2(d.month)}{_pad2(d.day)}T{_pad2(h)}{_pad2(m)}00"
+def schedule_batch(plans: List[Any], pool=None, workers: int = 1) -> Dict[str, Dict[str, Any]]:
+	"""
+	Xếp lịch nhiều plan độc lập; trả {plan_id: {"scheduled": [...]}} hoặc {plan_id: {"error": "..."}}.
+	pool: executor để chạy song song (process pool, `workers` worker); None → chạy tuần tự.
+	"""
+	ids = batch_plan_ids(plans)
+	with span("schedule.batch", plans=len(plans)):
+		if pool is None or len(plans) < 2:
+			results = map(_schedule_plan, plans)
+		else:
+			# gom nhiều plan mỗi lần gửi để giảm chi phí pickle/IPC
+			chunksize = max(1, len(plans) // (4 * max(1, workers)))
+			results = pool.map(_schedule_plan, plans, chunksize=chunksize)
+		return dict(zip(ids, results))
+
+def merge_scheduled(results: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+	# gộp event của mọi plan cho một file ICS chung; id gắn plan_id để UID không trùng
+	merged = []
+	for plan_id, res in results.items():
+		for ev in res.get("scheduled", []):
+			merged.append({**ev, "id": f"{plan_id}-{ev.get('id', 'x')}"})
+	return merged
+
+# ========= ICS (xem app/services/ics.py) =========
+def iter_ics(scheduled: List[Dict[str, Any]], calendar_name: str = "FlowAI Plan") -> Iterator[str]:
+	# chỉ cộng thời gian sinh nội dung, không tính lúc chờ gửi ra mạng giữa các khối
+	parts = ics.buffered(ics.iter_ics(scheduled, calendar_name))
+	spent, size = 0.0, 0
+	try:
+		while True:
+			t0 = time.perf_counter()
+			part = next(parts, None)
+			spent += time.perf_counter() - t0
+			if part is None:
+				return
+			size += len(part)
+			yield part
+	finally:
+		record("ics.generate", spent, events=len(scheduled), chars=size)
 
 def make_ics(scheduled: List[Dict[str, Any]], calendar_name: str = "FlowAI Plan") -> str:
-	now = datetime.utcnow()
-	lines = [
-		"BEGIN:VCALENDAR",
-		"VERSION:2.0",
-		"PRODID:-//FlowAI//Planner//EN",
-		f"X-WR-CALNAME:{calendar_name}"
-	]
-	for ev in scheduled:
-		ds = ev["dateStr"]
-		start = _dtlocal(datetime.fromisoformat(ds).date(), ev["start"])
-		end = _dtlocal(datetime.fromisoformat(ds).date(), ev["end"])
-		uid = f"flowai-{ev.get('id','x')}-{ds.replace('-','')}-{ev['start'].replace(':','')}"
-		summary = ev.get("title","Task")
-		lines += [
-			"BEGIN:VEVENT",
-			f"UID:{uid}@flowai",
-			f"DTSTAMP:{_dtstamp(now)}",
-			f"DTSTART:{start}",
-			f"DTEND:{end}",
-			f"SUMMARY:{summary}",
-			"END:VEVENT"
-		]
-	lines.append("END:VCALENDAR")
-	return "\r\n".join(lines)
+	return "".join(ics.iter_ics(scheduled, calendar_name))
@@ -0,0 +1,180 @@
+# app/services/rate_limit.py
+"""
+Giới hạn tải phía client cho LLM, theo từng (provider, model):
+
+- AdaptiveLimiter: 2 token bucket RPM + TPM (token ước lượng của prompt + max_tokens).
+  Gặp 429 → giảm tốc (×0.5, tối thiểu 10%) và dừng tới hết Retry-After; thành công → tăng dần lại.
+- CircuitBreaker: lỗi upstream liên tiếp (429/5xx/timeout) ≥ ngưỡng → mở mạch, từ chối ngay
+  trong reset_s giây rồi cho một request thử (half-open).
+
+Khi phải chờ quá lâu hoặc mạch đang mở → LLMUnavailable (kèm retry_after),
+để caller giảm cấp (planner dùng heuristics local, endpoint trả 503 + Retry-After).
+"""
+import asyncio
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+from app.core.config import settings
+
+class LLMUnavailable(Exception):
+	"""Upstream đang quá tải / hết quota tạm thời; thử lại sau retry_after giây."""
+	def __init__(self, message: str, retry_after: float = 0.0):
+		super().__init__(message)
+		self.retry_after = retry_after
+
+class CircuitOpen(LLMUnavailable):
+	"""Circuit breaker đang mở."""
+
+class TokenBucket:
+	"""
+	Bucket cho phép nợ: reserve() trừ ngay và trả số giây phải chờ,
+	nên các request được phục vụ theo thứ tự tới (không cần vòng lặp chờ).
+	"""
+	def __init__(self, per_minute: float):
+		self.capacity = float(per_minute)
+		self.rate = per_minute / 60.0
+		self.tokens = self.capacity
+		self.updated = time.monotonic()
+
+	def _refill(self, now: float, scale: float) -> None:
+		self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate * scale)
+		self.updated = now
+
+	def reserve(self, amount: float, now: float, scale: float = 1.0) -> float:
+		self._refill(now, scale)
+		self.tokens -= min(amount, self.capacity)
+		return 0.0 if self.tokens >= 0 else -self.tokens / (self.rate * scale)
+
+	def refund(self, amount: float) -> None:
+		self.tokens = min(self.capacity, self.tokens + min(amount, self.capacity))
+
+class AdaptiveLimiter:
+	def __init__(self, rpm: int, tpm: int, min_scale: float = 0.1):
+		self.rpm = TokenBucket(rpm) if rpm > 0 else None
+		self.tpm = TokenBucket(tpm) if tpm > 0 else None
+		self.min_scale = min_scale
+		self.scale = 1.0
+		self.paused_until = 0.0
+		self.throttled = 0
+		self._lock = threading.Lock()
+
+	async def acquire(self, tokens: int, max_wait: float) -> None:
+		with self._lock:
+			now = time.monotonic()
+			wait = max(0.0, self.paused_until - now)
+			if self.rpm is not None:
+				wait = max(wait, self.rpm.reserve(1, now, self.scale))
+			if self.tpm is not None:
+				wait = max(wait, self.tpm.reserve(tokens, now, self.scale))
+			if wait > max_wait:
+				# không chờ nổi → trả lại phần đã giữ và báo quá tải ngay
+				if self.rpm is not None:
+					self.rpm.refund(1)
+				if self.tpm is not None:
+					self.tpm.refund(tokens)
+				raise LLMUnavailable(f"LLM rate limit reached, retry in {wait:.0f}s", retry_after=wait)
+		if wait > 0:
+			await asyncio.sleep(wait)
+
+	def on_throttled(self, retry_after: float = 0.0) -> None:
+		with self._lock:
+			self.throttled += 1
+			self.scale = max(self.min_scale, self.scale * 0.5)
+			if retry_after > 0:
+				self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+	def on_success(self) -> None:
+		with self._lock:
+			if self.scale < 1.0:
+				self.scale = min(1.0, self.scale + 0.05)
+
+	def stats(self) -> Dict[str, float]:
+		with self._lock:
+			return {
+				"scale": round(self.scale, 3),
+				"throttled": self.throttled,
+				"paused_for_s": round(max(0.0, self.paused_until - time.monotonic()), 1),
+			}
+
+class CircuitBreaker:
+	def __init__(self, failure_threshold: int, reset_s: float):
+		self.failure_threshold = max(1, failure_threshold)
+		self.reset_s = reset_s
+		self.state = "closed"
+		self.failures = 0
+		self.opened_at = 0.0
+		self._probe_at = 0.0
+		self._lock = threading.Lock()
+
+	def allow(self) -> None:
+		with self._lock:
+			if self.state == "closed":
+				return
+			now = time.monotonic()
+			remaining = self.opened_at + self.reset_s - now
+			if self.state == "open" and remaining <= 0:
+				self.state = "half_open"
+				self._probe_at = 0.0
+			# half-open: chỉ một request thử; request thử bị huỷ giữa chừng → sau reset_s cho thử lại
+			if self.state == "half_open" and now - self._probe_at >= self.reset_s:
+				self._probe_at = now
+				return
+			raise CircuitOpen("LLM circuit is open, using degraded mode", retry_after=max(1.0, remaining))
+
+	def record_success(self) -> None:
+		with self._lock:
+			self.state = "closed"
+			self.failures = 0
+
+	def record_failure(self) -> None:
+		with self._lock:
+			self.failures += 1
+			if self.state == "half_open" or self.failures >= self.failure_threshold:
+				self.state = "open"
+				self.opened_at = time.monotonic()
+
+	def stats(self) -> Dict[str, object]:
+		with self._lock:
+			return {"state": self.state, "failures": self.failures}
+
+class Guard:
+	"""Limiter + breaker của một (provider, model)."""
+	def __init__(self, limiter: AdaptiveLimiter, breaker: CircuitBreaker):
+		self.limiter = limiter
+		self.breaker = breaker
+
+	def stats(self) -> Dict[str, object]:
+		return {**self.limiter.stats(), "circuit": self.breaker.stats()}
+
+_guards: Dict[str, Guard] = {}
+_guards_lock = threading.Lock()
+
+def get_guard(provider: str, model: str) -> Guard:
+	key = f"{provider}:{model}"
+	with _guards_lock:
+		guard = _guards.get(key)
+		if guard is None:
+			guard = _guards[key] = Guard(
+				AdaptiveLimiter(settings.LLM_RPM_LIMIT, settings.LLM_TPM_LIMIT),
+				CircuitBreaker(settings.LLM_CIRCUIT_FAILURES, settings.LLM_CIRCUIT_RESET_S),
+			)
+		return guard
+
+def guard_stats() -> Dict[str, Dict[str, object]]:
+	with _guards_lock:
+		return {key: g.stats() for key, g in _guards.items()}
+
+def parse_retry_after(value: Optional[str]) -> float:
+	"""Retry-After dạng số giây hoặc HTTP-date → số giây (0 nếu không đọc được)."""
+	if not value:
+		return 0.0
+	try:
+		return max(0.0, float(value))
+	except ValueError:
+		pass
+	try:
+		return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+	except (TypeError, ValueError):
+		return 0.0
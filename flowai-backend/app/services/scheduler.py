@@ -0,0 +1,412 @@
+# app/services/scheduler.py
+"""
+Engine xếp lịch cho planner_service.schedule_tasks.
+
+Thời gian rảnh được giữ dưới dạng danh sách khoảng [start, end) đã sắp xếp (phút tính từ
+00:00 của ngày gốc), sinh lười theo từng ngày từ giờ làm việc − giờ trưa − lịch bận − ngày nghỉ.
+Tìm chỗ trống sớm nhất sau con trỏ bằng bisect (O(log n)); các khe đã bỏ qua không bị quét lại
+vì con trỏ chỉ tiến (trừ khi task ghim ngày). Task dài hơn một khe được chia thành nhiều phần.
+"""
+import hashlib
+import json
+import math
+import re
+from bisect import bisect_right
+from functools import lru_cache
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+_WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+_DEFAULT_HOURS = (9 * 60, 17 * 60)
+
+# "09:00-17:00" | {"default": "09:00-17:00", "sat": "09:00-12:00", "2025-01-02": "", ...}
+WorkHours = Union[str, Dict[str, Optional[str]]]
+
+def _hhmm(s: str) -> int:
+	h, m = [int(x) for x in s.strip().split(":")]
+	return h * 60 + m
+
+def parse_range(s: Optional[str]) -> Optional[Tuple[int, int]]:
+	"""'HH:MM-HH:MM' → (phút bắt đầu, phút kết thúc); rỗng/None → None (ngày nghỉ)."""
+	if not s:
+		return None
+	start_str, end_str = s.split("-", 1)
+	start, end = _hhmm(start_str), _hhmm(end_str)
+	if not 0 <= start < end < 24 * 60:
+		raise ValueError(f"Invalid time range: {s!r}")
+	return start, end
+
+def _fmt(minutes: int) -> str:
+	return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+class WorkCalendar:
+	"""Giờ làm việc theo từng ngày: mặc định / theo thứ / theo ngày cụ thể, trừ ngày nghỉ."""
+
+	def __init__(self, work_hours: WorkHours = "09:00-17:00", holidays: Iterable[str] = ()):
+		overrides = dict(work_hours) if isinstance(work_hours, dict) else {"default": work_hours}
+		# "default" áp cho Thứ 2–6; các key theo thứ / ngày ghi đè lên
+		try:
+			default = parse_range(overrides.pop("default", "09:00-17:00")) or _DEFAULT_HOURS
+		except (ValueError, TypeError):
+			default = _DEFAULT_HOURS
+		self.by_weekday: Dict[int, Optional[Tuple[int, int]]] = {wd: default for wd in range(5)}
+		self.by_date: Dict[date, Optional[Tuple[int, int]]] = {}
+		for key, val in overrides.items():
+			rng = parse_range(val)
+			k = key.strip().lower()[:3]
+			if k in _WEEKDAYS:
+				self.by_weekday[_WEEKDAYS.index(k)] = rng
+			else:
+				self.by_date[date.fromisoformat(key)] = rng
+		for h in holidays or ():
+			self.by_date[date.fromisoformat(h)] = None
+
+	def hours(self, d: date) -> Optional[Tuple[int, int]]:
+		if d in self.by_date:
+			return self.by_date[d]
+		return self.by_weekday.get(d.weekday())
+
+@lru_cache(maxsize=256)
+def _calendar_cached(work_hours_key: str, holidays: Tuple[str, ...]) -> WorkCalendar:
+	return WorkCalendar(json.loads(work_hours_key), holidays)
+
+def get_calendar(work_hours: WorkHours, holidays: Iterable[str] = ()) -> WorkCalendar:
+	"""WorkCalendar đã parse, dùng lại giữa các lần gọi có cùng work_hours/holidays (batch, re-plan)."""
+	key = json.dumps(work_hours, sort_keys=True)
+	return _calendar_cached(key, tuple(sorted(holidays or ())))
+
+class FreeTimeline:
+	def __init__(
+		self,
+		origin: date,
+		calendar: WorkCalendar,
+		busy: Iterable[Dict[str, Any]] = (),
+		lunch: Optional[str] = "12:00-13:00",
+		horizon_days: int = 3660,
+	):
+		self.origin = origin
+		self.calendar = calendar
+		self.lunch = parse_range(lunch) if lunch else None
+		self.horizon_days = horizon_days
+		self.busy: Dict[date, List[Tuple[int, int]]] = {}
+		for ev in busy or ():
+			d = date.fromisoformat(ev["dateStr"])
+			self.busy.setdefault(d, []).append((_hhmm(ev["start"]), _hhmm(ev["end"])))
+		# hai list song song, sắp xếp theo start, đơn vị phút tính từ origin
+		self._starts: List[int] = []
+		self._ends: List[int] = []
+		self._next_day = 0  # số ngày đã sinh khoảng rảnh
+
+	# ----- sinh khoảng rảnh theo ngày -----
+	def _free_of_day(self, offset: int) -> List[Tuple[int, int]]:
+		d = self.origin + timedelta(days=offset)
+		rng = self.calendar.hours(d)
+		if rng is None:
+			return []
+		blocked = sorted(([self.lunch] if self.lunch else []) + self.busy.get(d, []))
+		free, cur = [], rng[0]
+		for b_start, b_end in blocked:
+			if b_start > cur:
+				free.append((cur, min(b_start, rng[1])))
+			cur = max(cur, b_end)
+			if cur >= rng[1]:
+				break
+		if cur < rng[1]:
+			free.append((cur, rng[1]))
+		base = offset * 24 * 60
+		return [(base + s, base + e) for s, e in free if e > s]
+
+	def _materialize_next_day(self) -> None:
+		if self._next_day >= self.horizon_days:
+			raise ValueError(f"Cannot fit tasks within {self.horizon_days} days of {self.origin.isoformat()}")
+		for s, e in self._free_of_day(self._next_day):
+			self._starts.append(s)
+			self._ends.append(e)
+		self._next_day += 1
+
+	def _ensure_until(self, minute: int) -> None:
+		while self._next_day * 24 * 60 <= minute:
+			self._materialize_next_day()
+
+	# ----- cấp phát -----
+	def allocate(self, cursor: int, need: int, min_block: int = 60) -> List[Tuple[int, int]]:
+		"""
+		Lấy `need` phút rảnh sớm nhất từ `cursor`, có thể chia thành nhiều phần;
+		mỗi phần ≥ min(min_block, phần còn lại). Trả danh sách (start, end).
+		"""
+		self._ensure_until(cursor)
+		i = bisect_right(self._starts, cursor) - 1
+		if i < 0 or self._ends[i] <= cursor:
+			i += 1
+		pieces: List[Tuple[int, int]] = []
+		while need > 0:
+			while i >= len(self._starts):
+				self._materialize_next_day()
+			s, e = max(self._starts[i], cursor), self._ends[i]
+			block = min(need, e - s)
+			if block <= 0 or block < min(min_block, need):
+				i += 1
+				continue
+			# cắt [s, s+block) khỏi khoảng rảnh i
+			if s > self._starts[i]:
+				self._ends[i] = s
+				if s + block < e:
+					self._starts.insert(i + 1, s + block)
+					self._ends.insert(i + 1, e)
+				i += 1
+			elif s + block < e:
+				self._starts[i] = s + block
+			else:
+				del self._starts[i]
+				del self._ends[i]
+			pieces.append((s, s + block))
+			need -= block
+			cursor = s + block
+		return pieces
+
+	def to_datetime(self, minute: int) -> datetime:
+		return datetime.combine(self.origin, datetime.min.time()) + timedelta(minutes=minute)
+
+def _task_hours(t: Dict[str, Any]) -> int:
+	return max(1, int(math.ceil(float(t.get("duration") or 1))))
+
+_UID_SALT = re.compile(r"^flowai-([0-9a-f]{12})-")
+
+def _plan_salt(tasks: Iterable[Any], plan_id: Optional[str] = None) -> str:
+	# salt tất định: xếp / xuất lại cùng plan → cùng UID (Calendar cập nhật thay vì nhân đôi);
+	# plan khác (plan_id khác, hoặc không có plan_id thì id + tên task khác) → UID khác
+	if plan_id is not None:
+		basis = f"plan:{plan_id}"
+	else:
+		basis = json.dumps([
+			[str(t.get("id") or idx), str(t.get("text") or t.get("title") or "").strip()]
+			for idx, t in enumerate(tasks, 1) if isinstance(t, dict)
+		], ensure_ascii=False)
+	return hashlib.sha256(basis.encode("utf-8")).hexdigest()[:12]
+
+def _uid(salt: str, task_id: Any, part: int) -> str:
+	return f"flowai-{salt}-{task_id}-{part}@flowai"
+
+def _events_for(
+	timeline: FreeTimeline, pieces: List[Tuple[int, int]], task_id: Any, title: str, tz: str,
+	salt: str, first_part: int = 1,
+) -> List[Dict[str, Any]]:
+	total = first_part - 1 + len(pieces)
+	events = []
+	for part, (s, e) in enumerate(pieces, first_part):
+		ev = {
+			"id": task_id,
+			"title": title,
+			"dateStr": timeline.to_datetime(s).date().isoformat(),
+			"start": _fmt(s % (24 * 60)),
+			"end": _fmt(e % (24 * 60)),
+			"duration": (e - s) // 60 if (e - s) % 60 == 0 else round((e - s) / 60, 2),
+			"timezone": tz,
+			"uid": _uid(salt, task_id, part),
+		}
+		if total > 1:
+			ev["part"], ev["parts"] = part, total
+		events.append(ev)
+	return events
+
+def schedule(
+	tasks: List[Dict[str, Any]],
+	start_date: str,
+	work_hours: WorkHours = "09:00-17:00",
+	tz: str = "Asia/Ho_Chi_Minh",
+	busy: Iterable[Dict[str, Any]] = (),
+	holidays: Iterable[str] = (),
+	lunch: Optional[str] = "12:00-13:00",
+	min_block_minutes: int = 60,
+	plan_id: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+	origin = datetime.fromisoformat(start_date).date()
+	timeline = FreeTimeline(origin, get_calendar(work_hours, holidays), busy=busy, lunch=lunch)
+	cursor = 0
+	salt = _plan_salt(tasks, plan_id)
+	events: List[Dict[str, Any]] = []
+
+	for idx, t in enumerate(tasks, 1):
+		title = str(t.get("text") or t.get("title") or "").strip()
+		if not title:
+			continue
+
+		# task có dateStr → bắt đầu tìm từ đầu ngày đó (không sớm hơn ngày gốc)
+		task_date_str = t.get("dateStr")
+		if task_date_str:
+			try:
+				td = datetime.fromisoformat(task_date_str).date()
+				cursor = max(0, (td - origin).days) * 24 * 60
+			except ValueError:
+				pass
+
+		pieces = timeline.allocate(cursor, _task_hours(t) * 60, min_block_minutes)
+		cursor = pieces[-1][1]
+		events += _events_for(timeline, pieces, t.get("id") or idx, title, tz, salt)
+	return events
+
+# ========= Re-plan tăng dần =========
+def _ev_start(ev: Dict[str, Any]) -> datetime:
+	return datetime.fromisoformat(f"{ev['dateStr']}T{ev['start']}")
+
+def _ev_end(ev: Dict[str, Any]) -> datetime:
+	return datetime.fromisoformat(f"{ev['dateStr']}T{ev['end']}")
+
+def _ev_key(ev: Dict[str, Any]) -> Tuple[str, int]:
+	return str(ev.get("id")), int(ev.get("part") or 1)
+
+def replan(
+	previous: List[Dict[str, Any]],
+	delta: List[Dict[str, Any]],
+	work_hours: WorkHours = "09:00-17:00",
+	tz: str = "Asia/Ho_Chi_Minh",
+	busy: Iterable[Dict[str, Any]] = (),
+	holidays: Iterable[str] = (),
+	lunch: Optional[str] = "12:00-13:00",
+	min_block_minutes: int = 60,
+	start_date: Optional[str] = None,
+	plan_id: Optional[str] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+	"""
+	Áp delta lên lịch cũ và chỉ xếp lại phần đuôi bị ảnh hưởng.
+
+	delta: [{op: "add", task: {id?, text, duration, dateStr?}},
+	        {op: "remove", id}, {op: "resize", id, duration},
+	        {op: "pin", id, dateStr, start, duration?}]
+	Điểm ảnh hưởng = thời điểm sớm nhất mà delta chạm tới. Event bắt đầu trước điểm đó
+	và event đã ghim (pinned) giữ nguyên; các task còn lại được xếp lại theo thứ tự cũ từ điểm đó.
+	Trả {"changed": [...], "cancelled": [...]} – chỉ các event khác với lịch cũ, kèm SEQUENCE tăng.
+	"""
+	# gom event cũ theo task, giữ thứ tự xuất hiện theo thời gian
+	by_task: Dict[str, List[Dict[str, Any]]] = {}
+	for ev in sorted(previous, key=_ev_start):
+		by_task.setdefault(str(ev.get("id")), []).append(ev)
+	order = list(by_task)
+	title: Dict[str, str] = {tid: evs[0].get("title", "") for tid, evs in by_task.items()}
+	hours: Dict[str, float] = {tid: sum(float(e.get("duration") or 0) for e in evs) for tid, evs in by_task.items()}
+	# task ghim: mọi phần của nó giữ nguyên và chặn lịch
+	pinned: Dict[str, List[Dict[str, Any]]] = {
+		tid: evs for tid, evs in by_task.items() if any(e.get("pinned") for e in evs)
+	}
+	affected: Optional[datetime] = None
+
+	def _touch(dt: datetime) -> None:
+		nonlocal affected
+		affected = dt if affected is None or dt < affected else affected
+
+	# task thêm mới không có dateStr → xếp sau event cuối cùng (lịch trống → từ start_date)
+	last_end = max((_ev_end(e) for e in previous), default=None) or datetime.fromisoformat(
+		start_date or date.today().isoformat()
+	)
+	next_id = 1 + max((int(t) for t in order if t.isdigit()), default=0)
+	# event mới dùng salt của lịch cũ (cùng plan) để UID không đổi qua các lần re-plan
+	salt = _plan_salt([], plan_id) if plan_id is not None else next(
+		(m.group(1) for m in (_UID_SALT.match(str(e.get("uid") or "")) for e in previous) if m),
+		_plan_salt([{"id": tid, "text": title[tid]} for tid in order]),
+	)
+	for op in delta:
+		kind = op.get("op")
+		tid = str(op.get("id"))
+		if kind == "add":
+			t = op.get("task") or {}
+			tid = str(t.get("id") or next_id)
+			next_id += 1
+			order.append(tid)
+			by_task[tid] = []
+			title[tid] = str(t.get("text") or t.get("title") or "").strip()
+			hours[tid] = _task_hours(t)
+			_touch(datetime.fromisoformat(t["dateStr"]) if t.get("dateStr") else last_end)
+			continue
+		if tid not in by_task:
+			raise ValueError(f"Unknown task id in delta: {tid}")
+		if by_task[tid]:
+			_touch(_ev_start(by_task[tid][0]))
+		if kind == "remove":
+			order.remove(tid)
+			pinned.pop(tid, None)
+		elif kind == "resize":
+			hours[tid] = _task_hours(op)
+			pinned.pop(tid, None)
+		elif kind == "pin":
+			hrs = _task_hours(op) if op.get("duration") else int(math.ceil(hours[tid]))
+			start = datetime.fromisoformat(f"{op['dateStr']}T{op['start']}")
+			end = start + timedelta(hours=hrs)
+			_touch(start)
+			pinned[tid] = [{
+				"id": by_task[tid][0].get("id") if by_task[tid] else tid, "title": title[tid],
+				"dateStr": op["dateStr"], "start": _fmt(start.hour * 60 + start.minute),
+				"end": _fmt(end.hour * 60 + end.minute), "duration": hrs, "timezone": tz, "pinned": True,
+				"uid": _uid(salt, tid, 1),
+			}]
+		else:
+			raise ValueError(f"Unknown delta op: {kind!r}")
+
+	if affected is None:
+		return {"changed": [], "cancelled": []}
+	# event đang dở qua điểm ảnh hưởng (ví dụ bị pin mới đè lên) → xếp lại cả event đó
+	for ev in previous:
+		if str(ev.get("id")) not in pinned and _ev_start(ev) < affected < _ev_end(ev):
+			_touch(_ev_start(ev))
+
+	# event giữ nguyên: bắt đầu trước điểm ảnh hưởng; event ghim chặn lịch như busy
+	blocking = list(busy) + [ev for evs in pinned.values() for ev in evs if _ev_end(ev) > affected]
+	origin = affected.date()
+	timeline = FreeTimeline(origin, get_calendar(work_hours, holidays), busy=blocking, lunch=lunch)
+	cursor = affected.hour * 60 + affected.minute
+
+	new_events: List[Dict[str, Any]] = []
+	touched: set = set()
+	for tid in order:
+		if tid in pinned:
+			# ghim mới (delta pin) thay mọi phần cũ; ghim sẵn không đổi thì không đụng tới
+			if pinned[tid] is not by_task[tid]:
+				new_events += pinned[tid]
+				touched.add(tid)
+			continue
+		kept = [e for e in by_task[tid] if _ev_start(e) < affected]
+		remaining = int(round((hours[tid] - sum(float(e.get("duration") or 0) for e in kept)) * 60))
+		pieces: List[Tuple[int, int]] = []
+		if remaining > 0:
+			touched.add(tid)
+			pieces = timeline.allocate(cursor, remaining, min_block_minutes)
+			cursor = pieces[-1][1]
+			task_id = by_task[tid][0].get("id") if by_task[tid] else (int(tid) if tid.isdigit() else tid)
+			new_events += _events_for(timeline, pieces, task_id, title[tid], tz, salt, first_part=len(kept) + 1)
+		# số phần của task đổi → các phần giữ nguyên cũng phải cập nhật part/parts
+		total = len(kept) + len(pieces)
+		for e in kept:
+			if int(e.get("parts") or 1) != total:
+				touched.add(tid)
+				fixed = {k: v for k, v in e.items() if k not in ("part", "parts", "sequence")}
+				if total > 1:
+					fixed["part"], fixed["parts"] = int(e.get("part") or 1), total
+				new_events.append(fixed)
+
+	# diff với lịch cũ theo (id, part); task ghim không đổi không bao giờ bị huỷ
+	old = {
+		_ev_key(e): e
+		for tid in set(by_task) if tid in touched or tid not in pinned
+		for e in by_task[tid] if _ev_start(e) >= affected or tid in touched
+	}
+	changed, seen, stale = [], set(), []
+	for ev in new_events:
+		key = _ev_key(ev)
+		seen.add(key)
+		prev = old.get(key)
+		if prev is not None and all(prev.get(f) == ev.get(f) for f in ("dateStr", "start", "end", "title", "parts")):
+			continue
+		if prev is not None:
+			if prev.get("uid"):
+				# giữ UID cũ → Calendar cập nhật event (SEQUENCE tăng) thay vì tạo bản mới
+				ev["uid"] = prev["uid"]
+			else:
+				# lịch cũ không có uid: UID trong Calendar băm theo giờ cũ → huỷ bản đó
+				stale.append(prev)
+		ev["sequence"] = int(prev.get("sequence") or 0) + 1 if prev else 0
+		changed.append(ev)
+	gone = [e for key, e in old.items() if key not in seen and _ev_start(e) >= affected]
+	cancelled = [
+		{**e, "status": "cancelled", "sequence": int(e.get("sequence") or 0) + 1}
+		for e in gone + stale
+	]
+	return {"changed": changed, "cancelled": cancelled}
@@ -1,89 +1,367 @@
-import base64
-from typing import List
+import asyncio
+import hashlib
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Union
 from app.core.config import settings
-from app.utils.chunk import split_chunks
-
-# Chọn provider theo .env
-_PROVIDER = settings.LLM_PROVIDER.lower().strip()
-
-if _PROVIDER == "gemini":
-	# ===== Gemini =====
-	import google.generativeai as genai
-	genai.configure(api_key=settings.GEMINI_API_KEY)
-	_GEMINI_MODEL = settings.GEMINI_MODEL
-	_gemini = genai.GenerativeModel(_GEMINI_MODEL)
-
-	def _llm_text(prompt: str, max_tokens: int = 400) -> str:
-		resp = _gemini.generate_content(
-			prompt,
-			generation_config={"max_output_tokens": max_tokens}
-		)
-		return (resp.text or "").strip()
+from app.core.executors import io_executor
+from app.core.tracing import span
+from app.services import llm_client
+from app.services.cache import make_key, summary_cache
+from app.services.image_service import phash_index
+from app.utils import extractive
+from app.utils.chunk import estimate_tokens, iter_chunks
+from app.utils.concurrency import gather_bounded
+from app.utils.dedupe import PageDedupe, drop_near_duplicates
 
-	def _llm_vision(prompt_text: str, image_bytes: bytes, content_type: str, max_tokens: int = 400) -> str:
-		resp = _gemini.generate_content(
-			[prompt_text, {"mime_type": content_type, "data": image_bytes}],
-			generation_config={"max_output_tokens": max_tokens}
-		)
-		return (resp.text or "").strip()
-
-else:
-	# ===== OpenAI =====
-	from openai import OpenAI
-	_client = OpenAI(api_key=settings.OPENAI_API_KEY)
-	_MODEL = settings.OPENAI_MODEL
-
-	def _llm_text(prompt: str, max_tokens: int = 400) -> str:
-		resp = _client.responses.create(
-			model=_MODEL,
-			input=prompt,
-			max_output_tokens=max_tokens
-		)
-		return resp.output_text.strip()
-
-	def _llm_vision(prompt_text: str, image_bytes: bytes, content_type: str, max_tokens: int = 400) -> str:
-		b64 = base64.b64encode(image_bytes).decode("utf-8")
-		resp = _client.responses.create(
-			model=_MODEL,
-			input=[{
-				"role": "user",
-				"content": [
-					{"type": "input_text", "text": prompt_text},
-					{"type": "input_image", "image_data": b64, "mime_type": content_type}
-				]
-			}],
-			max_output_tokens=max_tokens
-		)
-		return resp.output_text.strip()
+# Tăng khi sửa prompt bên dưới để không dùng lại cache cũ
+PROMPT_VERSION = "v1"
+
+# Provider lấy theo .env (LLM_PROVIDER); client async dùng chung pool HTTP
+async def _llm_text(prompt: str, max_tokens: int = 400) -> str:
+	return await llm_client.generate_text(prompt, max_tokens=max_tokens)
+
+async def _llm_vision(prompt_text: str, image_bytes: bytes, content_type: str, max_tokens: int = 400) -> str:
+	return await llm_client.generate_vision(prompt_text, image_bytes, content_type, max_tokens=max_tokens)
 
-def _summarize_chunk(chunk: str, style: str = "bullet") -> str:
-	prompt = (
+# ===== Cache theo nội dung (router scope, style, PROMPT_VERSION, content) =====
+def _cache_key(kind: str, style: str, content: Union[str, bytes]) -> Optional[str]:
+	if not settings.SUMMARY_CACHE_ENABLED:
+		return None
+	return make_key(kind, llm_client.cache_scope(), style, PROMPT_VERSION, content)
+
+async def _cached(kind: str, style: str, content: Union[str, bytes], compute: Callable[[], Awaitable[str]]) -> str:
+	key = _cache_key(kind, style, content)
+	if key is None:
+		return await compute()
+	hit = await summary_cache.aget(key)
+	if hit is not None:
+		return hit
+	out = await compute()
+	if out:
+		await summary_cache.aset(key, out)
+	return out
+
+async def _summarize_chunk(chunk: str, style: str = "bullet") -> str:
+	# key theo chunk gốc + tham số nén: cache hit không phải nén lại
+	async def compute() -> str:
+		return await _summarize_chunk_uncached(await _precompress(chunk, style), style)
+	return await _cached("chunk", _chunk_style_key(style), chunk, compute)
+
+def _chunk_prompt(chunk: str, style: str) -> str:
+	return (
 		f"You are a precise summarizer.\n"
 		f"Summarize the following content in {style} points with key facts preserved.\n"
 		f"Avoid hallucinations.\n\nContent:\n{chunk}\n"
 	)
-	return _llm_text(prompt, max_tokens=400)
 
-def _reduce_partials(partials: List[str], style: str = "bullet") -> str:
+async def _summarize_chunk_uncached(chunk: str, style: str = "bullet") -> str:
+	return await _llm_text(_chunk_prompt(chunk, style), max_tokens=400)
+
+async def _reduce_partials(partials: List[str], style: str = "bullet") -> str:
+	return await _cached("reduce", style, "\x00".join(partials), lambda: _reduce_partials_uncached(partials, style))
+
+def _reduce_prompt(partials: List[str], style: str) -> str:
 	sep = "\n\n"
 	merged = sep.join(partials)
-	prompt = (
+	return (
 		"Merge these partial summaries into a single, non-redundant summary "
 		f"in {style} points:\n{merged}"
 	)
-	return _llm_text(prompt, max_tokens=600)
 
-def summarize_text_long(text: str, style: str = "bullet") -> str:
-	chunks = split_chunks(text, max_chars=8000)
+async def _reduce_partials_uncached(partials: List[str], style: str = "bullet") -> str:
+	return await _llm_text(_reduce_prompt(partials, style), max_tokens=600)
+
+def chunk_text(source: Union[str, Iterable[str]], report: Optional[Dict[str, Any]] = None) -> List[str]:
+	"""
+	source: text hoặc luồng text (ví dụ từng trang PDF từ pdf_service.iter_pdf_pages).
+	DEDUPE_ENABLED: với luồng trang, bỏ dòng lặp giữa các trang (header, footer, số trang...) và trang
+	gần trùng trước khi chunk; sau đó bỏ chunk gần trùng (SimHash). report (tuỳ chọn) nhận provenance
+	(chỉ số theo danh sách trước khi bỏ) + số token tiết kiệm được.
+	"""
+	dedupe: Optional[PageDedupe] = None
+	if settings.DEDUPE_ENABLED and not isinstance(source, str):
+		# bỏ trùng lười theo cửa sổ trang: trang vẫn được đọc dần từ iterator, không list() cả tài liệu
+		dedupe = PageDedupe(
+			settings.DEDUPE_WINDOW_PAGES, settings.DEDUPE_LINE_MIN_PAGES,
+			settings.DEDUPE_LINE_MIN_FRACTION, settings.DEDUPE_SIMHASH_MAX_DISTANCE,
+		)
+		source = dedupe(source)
+
+	with span("chunk") as sp:
+		chunks = list(iter_chunks(
+			source,
+			max_tokens=settings.SUMMARY_CHUNK_TOKENS,
+			overlap_tokens=settings.SUMMARY_CHUNK_OVERLAP_TOKENS,
+		))
+		sp.set(chunks=len(chunks), chars=sum(len(c) for c in chunks))
+
+	removed_lines: Dict[str, List[int]] = {}
+	duplicate_pages: Dict[int, int] = {}
+	saved = 0
+	if dedupe is not None:
+		# provenance chỉ đầy đủ sau khi luồng trang đã chạy hết (trong bước chunk ở trên)
+		removed_lines, duplicate_pages, saved = dedupe.removed_lines, dedupe.duplicate_pages, dedupe.tokens_saved
+		with span("dedupe.pages") as sp:
+			sp.set(lines=sum(len(p) for p in removed_lines.values()), pages=len(duplicate_pages), tokens_saved=saved)
+
+	n_chunks = len(chunks)
+	duplicates: Dict[int, int] = {}
+	if settings.DEDUPE_ENABLED and n_chunks > 1:
+		with span("dedupe.chunks") as sp:
+			kept, duplicates = drop_near_duplicates(chunks, settings.DEDUPE_SIMHASH_MAX_DISTANCE)
+			chunk_tokens = sum(estimate_tokens(chunks[i]) for i in duplicates)
+			sp.set(chunks=len(duplicates), tokens_saved=chunk_tokens)
+		chunks = kept
+		saved += chunk_tokens
+
+	if report is not None:
+		report.update({
+			"repeated_lines": removed_lines,
+			"duplicate_pages": duplicate_pages,
+			"duplicate_chunks": duplicates,
+			"chunks_before_dedupe": n_chunks,
+			"tokens_saved": saved,
+		})
+	return chunks
+
+async def _map_chunks(chunks: List[str], style: str = "bullet") -> List[str]:
+	with span("summarize.map", chunks=len(chunks)):
+		return await gather_bounded(chunks, lambda c: _summarize_chunk(c, style=style))
+
+# ===== Tree reduce =====
+def _group_partials(partials: List[str], max_chars: int, fan_in: int) -> List[List[str]]:
+	"""
+	Gom partials liên tiếp thành nhóm ≤ fan_in phần tử và ≤ max_chars ký tự.
+	Mỗi nhóm (trừ nhóm cuối) có ít nhất 2 phần tử để mỗi tầng luôn giảm số partial.
+	"""
+	fan_in = max(2, fan_in)
+	groups: List[List[str]] = []
+	cur: List[str] = []
+	size = 0
+	for p in partials:
+		if len(cur) >= fan_in or (len(cur) >= 2 and size + len(p) > max_chars):
+			groups.append(cur)
+			cur, size = [], 0
+		cur.append(p)
+		size += len(p) + 2
+	if cur:
+		groups.append(cur)
+	return groups
+
+async def _passthrough(value: str) -> str:
+	return value
+
+async def _reduce_levels(partials: List[str], style: str = "bullet") -> List[str]:
+	"""
+	Reduce theo tầng cho tới khi partials vừa một nhóm (hoặc chạm SUMMARY_REDUCE_MAX_DEPTH).
+	Các nhóm trong cùng tầng được reduce song song; nhóm 1 phần tử đi thẳng lên tầng trên.
+	"""
+	level = list(partials)
+	for _ in range(max(0, settings.SUMMARY_REDUCE_MAX_DEPTH - 1)):
+		groups = _group_partials(level, settings.SUMMARY_REDUCE_MAX_CHARS, settings.SUMMARY_REDUCE_FAN_IN)
+		if len(groups) <= 1:
+			break
+		level = await gather_bounded(
+			groups, lambda g: _reduce_partials(g, style=style) if len(g) > 1 else _passthrough(g[0])
+		)
+	return level
+
+async def _tree_reduce(partials: List[str], style: str = "bullet") -> str:
+	with span("summarize.reduce", partials=len(partials)):
+		level = await _reduce_levels(partials, style=style)
+		if len(level) == 1:
+			return level[0]
+		return await _reduce_partials(level, style=style)
+
+# ===== Nén extractive cục bộ (xem app/utils/extractive.py) =====
+EXTRACTIVE_STYLE = "extractive"
+
+def _chunk_style_key(style: str) -> str:
+	# style + tham số nén extractive (nếu bật cho style): đổi cấu hình nén → không dùng lại cache cũ
+	ratio = settings.EXTRACTIVE_COMPRESS_RATIO.get(style, 1.0)
+	if not 0 < ratio < 1:
+		return style
+	method = settings.EXTRACTIVE_METHOD.get(style, "textrank")
+	return f"{style}|{ratio}|{method}|{settings.EXTRACTIVE_MIN_TOKENS}|{settings.EXTRACTIVE_MAX_SENTENCES}"
+
+async def _precompress(chunk: str, style: str) -> str:
+	# giữ EXTRACTIVE_COMPRESS_RATIO[style] số token của chunk trước khi gửi LLM (NumPy → chạy trên io_executor)
+	ratio = settings.EXTRACTIVE_COMPRESS_RATIO.get(style, 1.0)
+	tokens = estimate_tokens(chunk)
+	if not 0 < ratio < 1 or tokens < settings.EXTRACTIVE_MIN_TOKENS:
+		return chunk
+	method = settings.EXTRACTIVE_METHOD.get(style, "textrank")
+	with span("compress", tokens_in=tokens) as sp:
+		out = await io_executor.run(extractive.compress, chunk, ratio, None, method)
+		sp.set(tokens_out=estimate_tokens(out))
+	return out
+
+def _extractive_summary(chunks: List[str]) -> str:
+	# map: lấy dư mỗi chunk ~2× phần của nó; reduce: chọn lại trên phần đã lấy → ≤ EXTRACTIVE_SUMMARY_TOKENS
+	budget = settings.EXTRACTIVE_SUMMARY_TOKENS
+	method = settings.EXTRACTIVE_METHOD.get(EXTRACTIVE_STYLE, "textrank")
+	ratio = min(1.0, 2 * budget / max(1, sum(estimate_tokens(c) for c in chunks)))
+	picked = "\n".join(extractive.compress(c, ratio, method=method) for c in chunks)
+	return "\n".join(f"- {sentence}" for _, sentence in extractive.select(picked, budget, method))
+
+async def summarize_extractive(chunks: List[str]) -> str:
+	"""Tóm tắt hoàn toàn offline (không gọi LLM), chạy trên io_executor."""
+	if not chunks:
+		return ""
+	with span("summarize.extractive", chunks=len(chunks)):
+		return await io_executor.run(_extractive_summary, chunks)
+
+def _provider_down(e: Exception) -> bool:
+	if isinstance(e, llm_client.LLMUnavailable):
+		return True
+	low = str(e).lower()
+	return "insufficient_quota" in low or "exceeded your current quota" in low
+
+async def summarize_text_long(text: str, style: str = "bullet") -> str:
+	return await summarize_chunks(chunk_text(text), style=style)
+
+async def summarize_chunks(chunks: List[str], style: str = "bullet") -> str:
+	if not chunks:
+		return ""
+	if style == EXTRACTIVE_STYLE:
+		return await summarize_extractive(chunks)
+	try:
+		if len(chunks) == 1:
+			return await _summarize_chunk(chunks[0], style=style)
+		partials = await _map_chunks(chunks, style=style)
+		return await _tree_reduce(partials, style=style)
+	except Exception as e:
+		# provider lỗi / hết quota → bản tóm tắt extractive nếu được bật
+		if settings.SUMMARY_EXTRACTIVE_FALLBACK and _provider_down(e):
+			return await summarize_extractive(chunks)
+		raise
+
+# ===== Resumable (job queue, xem app/services/jobs.py) =====
+async def summarize_chunks_resumable(
+	chunks: List[str],
+	style: str = "bullet",
+	done: Optional[Dict[int, str]] = None,
+	on_partial: Optional[Callable[[int, str], Awaitable[Any]]] = None,
+	on_reduce: Optional[Callable[[], Awaitable[Any]]] = None,
+) -> str:
+	"""
+	Như summarize_chunks nhưng bỏ qua các chunk đã có trong `done` (checkpoint)
+	và await on_partial(index, summary) ngay khi mỗi chunk còn lại xong, để lưu checkpoint.
+	"""
 	if not chunks:
 		return ""
+	if style == EXTRACTIVE_STYLE:
+		return await summarize_extractive(chunks)
+	partials: Dict[int, str] = dict(done or {})
+	missing = [i for i in range(len(chunks)) if i not in partials]
+
+	async def _save(k: int, partial: str) -> None:
+		# checkpoint ngay trong task của chunk: chunk xong trước khi chunk khác lỗi vẫn được lưu
+		partials[missing[k]] = partial
+		if on_partial is not None:
+			await on_partial(missing[k], partial)
+
+	with span("summarize.map", chunks=len(missing)):
+		await gather_bounded(missing, lambda i: _summarize_chunk(chunks[i], style=style), on_result=_save)
+
 	if len(chunks) == 1:
-		return _summarize_chunk(chunks[0], style=style)
-	partials = [_summarize_chunk(c, style=style) for c in chunks]
-	return _reduce_partials(partials, style=style)
+		return partials[0]
+	if on_reduce is not None:
+		await on_reduce()
+	return await _tree_reduce([partials[i] for i in range(len(chunks))], style=style)
+
+# ===== Streaming (SSE) =====
+async def _stream_cached(
+	kind: str, style: str, content: str, prompt: Callable[[], Awaitable[str]], max_tokens: int
+) -> AsyncIterator[str]:
+	# prompt dựng lười: cache hit không tốn bước chuẩn bị (ví dụ nén extractive)
+	key = _cache_key(kind, style, content)
+	hit = await summary_cache.aget(key) if key else None
+	if hit is not None:
+		yield hit
+		return
+	pieces: List[str] = []
+	async for piece in llm_client.stream_text(await prompt(), max_tokens=max_tokens):
+		pieces.append(piece)
+		yield piece
+	out = "".join(pieces).strip()
+	if key and out:
+		await summary_cache.aset(key, out)
+
+def summarize_text_stream(text: str, style: str = "bullet") -> AsyncIterator[Dict[str, Any]]:
+	return summarize_chunks_stream(chunk_text(text), style=style)
+
+async def summarize_chunks_stream(chunks: List[str], style: str = "bullet") -> AsyncIterator[Dict[str, Any]]:
+	"""
+	Như summarize_chunks nhưng trả sự kiện dần dần:
+	  start {total} → partial {index, done, total, summary} (theo thứ tự hoàn thành)
+	  → token {text} (stream bước reduce) → done {summary}
+	"""
+	total = len(chunks)
+	yield {"event": "start", "total": total}
+	if not chunks:
+		yield {"event": "done", "summary": ""}
+		return
+	if style == EXTRACTIVE_STYLE:
+		summary = await summarize_extractive(chunks)
+		yield {"event": "token", "text": summary}
+		yield {"event": "done", "summary": summary}
+		return
+
+	if total == 1:
+		async def prompt() -> str:
+			return _chunk_prompt(await _precompress(chunks[0], style), style)
+		kind, key_style, content, max_tokens = "chunk", _chunk_style_key(style), chunks[0], 400
+	else:
+		sem = asyncio.Semaphore(max(1, settings.SUMMARY_MAP_CONCURRENCY))
+
+		async def _one(i: int, chunk: str):
+			async with sem:
+				return i, await _summarize_chunk(chunk, style=style)
+
+		partials = [""] * total
+		tasks = [asyncio.ensure_future(_one(i, c)) for i, c in enumerate(chunks)]
+		try:
+			for done, fut in enumerate(asyncio.as_completed(tasks), 1):
+				i, partial = await fut
+				partials[i] = partial
+				yield {"event": "partial", "index": i, "done": done, "total": total, "summary": partial}
+		finally:
+			# client ngắt kết nối / một chunk lỗi → huỷ phần còn lại
+			for t in tasks:
+				t.cancel()
+			await asyncio.gather(*tasks, return_exceptions=True)
+		# các tầng dưới reduce song song, chỉ stream tầng cuối cùng
+		partials = await _reduce_levels(partials, style=style)
+		if len(partials) == 1:
+			yield {"event": "token", "text": partials[0]}
+			yield {"event": "done", "summary": partials[0]}
+			return
+		async def prompt() -> str:
+			return _reduce_prompt(partials, style)
+		kind, key_style, content, max_tokens = "reduce", style, "\x00".join(partials), 600
+
+	pieces: List[str] = []
+	async for piece in _stream_cached(kind, key_style, content, prompt, max_tokens):
+		pieces.append(piece)
+		yield {"event": "token", "text": piece}
+	yield {"event": "done", "summary": "".join(pieces).strip()}
+
+async def summarize_image(
+	image_bytes: bytes,
+	content_type: str = "image/png",
+	style: str = "bullet",
+	phash: Optional[str] = None,
+	thumb: Optional[bytes] = None,
+) -> str:
+	# key luôn theo hash nội dung; có phash + thumb (xem image_service) → ảnh gần trùng
+	# đã được xác nhận bằng thumbnail dùng lại key của ảnh gặp trước
+	digest = hashlib.sha256(image_bytes).hexdigest()
+	if phash and thumb:
+		digest = phash_index.canonical(phash, thumb, digest)
+	return await _cached("image", style, digest, lambda: _summarize_image_uncached(image_bytes, content_type, style))
 
-def summarize_image(image_bytes: bytes, content_type: str = "image/png", style: str = "bullet") -> str:
-	return _llm_vision(
+async def _summarize_image_uncached(image_bytes: bytes, content_type: str, style: str) -> str:
+	return await _llm_vision(
 		f"Summarize the image in {style} points. Be accurate and concise.",
 		image_bytes,
 		content_type,
@@ -0,0 +1,160 @@
+# app/services/todo_service.py
+"""
+Trích todo từ ghi chú (dài): map-only, không có bước reduce bằng LLM.
+
+- Mỗi chunk → 1 lời gọi JSON mode {items: [{text, due, estimate}]}, chạy song song (SUMMARY_MAP_CONCURRENCY)
+- Gộp kết quả các chunk tại chỗ: băm text đã chuẩn hoá (trùng tuyệt đối) + SequenceMatcher (gần trùng)
+- Output cùng shape với plan_goals ({id, text, duration, due}) → đưa thẳng vào schedule_tasks
+
+Chunk nào model trả JSON hỏng → lấy các dòng dạng bullet / checkbox / TODO của chunk đó.
+"""
+import json
+import math
+import re
+import unicodedata
+from datetime import datetime
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.tracing import span
+from app.services import llm_client
+from app.services.cache import make_key, summary_cache
+from app.services.summarize_service import chunk_text
+from app.utils.concurrency import gather_bounded
+
+# Tăng khi sửa prompt để không dùng lại cache cũ
+PROMPT_VERSION = "todos-v1"
+
+# ========= LLM (map) =========
+def _prompt(chunk: str) -> str:
+	return "\n".join([
+		"From the following note excerpt, extract the actionable todo items.",
+		'Return JSON only: {"items": [{"text": string, "due": "yyyy-mm-dd" | null, "estimate": hours | null}]}',
+		"- Keep each text short and in the language of the note.",
+		"- Only set due / estimate when the note states or clearly implies them.",
+		'- If there are no actionable items, return {"items": []}.',
+		"",
+		"Note excerpt:",
+		chunk,
+	])
+
+_BULLET = re.compile(r"^\s*(?:[-*•–]\s*(?:\[[ xX]?\]\s*)?|\d+[.)]\s+|todo\s*[:\-]\s*)(.+)$", re.IGNORECASE)
+
+def _heuristic_items(chunk: str) -> List[Dict[str, Any]]:
+	out = []
+	for line in chunk.splitlines():
+		m = _BULLET.match(line)
+		if m and m.group(1).strip():
+			out.append({"text": m.group(1).strip()})
+	return out
+
+def _parse_items(raw: str) -> Optional[List[Dict[str, Any]]]:
+	try:
+		data = json.loads(raw)
+	except (TypeError, ValueError):
+		return None
+	items = data.get("items") if isinstance(data, dict) else data
+	if not isinstance(items, list):
+		return None
+	return [it for it in items if isinstance(it, dict)]
+
+async def _extract_chunk(chunk: str) -> List[Dict[str, Any]]:
+	key = None
+	if settings.SUMMARY_CACHE_ENABLED:
+		key = make_key("todos", llm_client.cache_scope(), PROMPT_VERSION, chunk)
+		hit = await summary_cache.aget(key)
+		if hit is not None:
+			return _parse_items(hit) or []
+
+	raw = await llm_client.generate_text(_prompt(chunk), max_tokens=None, json_mode=True)
+	items = _parse_items(raw)
+	if items is None:
+		return _heuristic_items(chunk)
+	if key is not None:
+		await summary_cache.aset(key, raw)
+	return items
+
+# ========= Chuẩn hoá + gộp trùng (local) =========
+_NON_WORD = re.compile(r"[^\w\s]", re.UNICODE)
+_SPACES = re.compile(r"\s+")
+
+def normalize_text(text: str) -> str:
+	# giữ dấu tiếng Việt (bỏ dấu dễ gộp nhầm từ khác nghĩa), chỉ bỏ hoa/thường, dấu câu, khoảng trắng thừa
+	text = unicodedata.normalize("NFC", text).casefold()
+	return _SPACES.sub(" ", _NON_WORD.sub(" ", text)).strip()
+
+def _norm_date(value: Any) -> Optional[str]:
+	try:
+		return datetime.fromisoformat(str(value)).date().isoformat()
+	except (TypeError, ValueError):
+		return None
+
+def _norm_hours(value: Any) -> Optional[int]:
+	try:
+		hours = float(value)
+	except (TypeError, ValueError):
+		return None
+	# giờ nguyên ≥ 1 cho khớp calendar grid (như plan_goals)
+	return max(1, math.ceil(hours)) if hours > 0 else None
+
+def merge_items(groups: List[List[Dict[str, Any]]], similarity: Optional[float] = None) -> List[Dict[str, Any]]:
+	"""
+	Gộp item của các chunk theo thứ tự xuất hiện. Trùng khi text chuẩn hoá giống hệt,
+	hoặc SequenceMatcher.ratio() ≥ similarity (TODO_DEDUPE_SIMILARITY). Bản giữ lại lấy
+	hạn sớm nhất và ước lượng đầu tiên có giá trị.
+	"""
+	threshold = settings.TODO_DEDUPE_SIMILARITY if similarity is None else similarity
+	kept: List[Dict[str, Any]] = []
+	norms: List[str] = []
+	by_norm: Dict[str, int] = {}
+	for items in groups:
+		for it in items:
+			text = str(it.get("text") or "").strip()
+			norm = normalize_text(text)
+			if not norm:
+				continue
+			due, hours = _norm_date(it.get("due")), _norm_hours(it.get("estimate"))
+
+			idx = by_norm.get(norm)
+			if idx is None and threshold < 1:
+				for j, other in enumerate(norms):
+					m = SequenceMatcher(None, norm, other, autojunk=False)
+					if m.real_quick_ratio() >= threshold and m.quick_ratio() >= threshold and m.ratio() >= threshold:
+						idx = j
+						break
+			if idx is None:
+				by_norm[norm] = len(kept)
+				norms.append(norm)
+				kept.append({"text": text, "due": due, "estimate": hours})
+				continue
+
+			by_norm[norm] = idx
+			k = kept[idx]
+			if due and (k["due"] is None or due < k["due"]):
+				k["due"] = due
+			if k["estimate"] is None:
+				k["estimate"] = hours
+
+	return [
+		{"id": i, "text": k["text"], "duration": k["estimate"] or 1, "due": k["due"]}
+		for i, k in enumerate(kept, 1)
+	]
+
+# ========= Public =========
+async def extract_todos(text: str) -> List[Dict[str, Any]]:
+	"""
+	returns: list[{id, text, duration (giờ), due (yyyy-mm-dd | None)}]
+	Lỗi LLM (quá tải, quota...) được ném ra cho endpoint xử lý.
+	"""
+	chunks = chunk_text(text)
+	if not chunks:
+		return []
+	with span("todos.extract", chunks=len(chunks)) as sp:
+		# một chunk lỗi → các chunk còn lại bị huỷ (gather_bounded)
+		groups = await gather_bounded(chunks, _extract_chunk)
+		sp.set(items=sum(len(g) for g in groups))
+	with span("todos.merge") as sp:
+		todos = merge_items(list(groups))
+		sp.set(items=len(todos))
+	return todos
@@ -1,16 +1,111 @@
-from typing import List
+import re
+from typing import Callable, Iterable, Iterator, List, Tuple, Union
 
-def split_chunks(text: str, max_chars: int = 8000) -> List[str]:
-	parts = []
-	buf = []
+# Hàm ước lượng số token của một đoạn text
+TokenEstimator = Callable[[str], int]
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…。])\s+")
+
+def estimate_tokens(text: str) -> int:
+	"""
+	Ước lượng token ≈ số byte UTF-8 / 4.
+	Với tiếng Việt (dấu = 2–3 byte) con số này sát BPE hơn len(text)/4 nhiều.
+	Hàm cộng dồn được: tổng ước lượng các phần ≥ ước lượng của chuỗi ghép.
+	"""
+	return (len(text.encode("utf-8")) + 3) // 4
+
+def _iter_lines(text: str) -> Iterator[str]:
+	# như text.split("\n") nhưng không tạo list toàn bộ dòng
+	start = 0
+	while True:
+		end = text.find("\n", start)
+		if end < 0:
+			yield text[start:]
+			return
+		yield text[start:end]
+		start = end + 1
+
+def _hard_cut(s: str, max_tokens: int, estimator: TokenEstimator) -> Iterator[str]:
+	# cắt cứng theo ký tự: tìm nhị phân đoạn dài nhất vừa max_tokens
+	while s:
+		if estimator(s) <= max_tokens:
+			yield s
+			return
+		lo, hi = 1, len(s)
+		while lo < hi:
+			mid = (lo + hi + 1) // 2
+			if estimator(s[:mid]) <= max_tokens:
+				lo = mid
+			else:
+				hi = mid - 1
+		yield s[:lo]
+		s = s[lo:]
+
+def _iter_pieces(lines: Iterable[str], max_tokens: int, estimator: TokenEstimator) -> Iterator[Tuple[str, str, int]]:
+	"""
+	Tách thành các mẩu ≤ max_tokens theo thứ bậc: đoạn (dòng) → câu → cắt cứng.
+	Trả (separator, text, tokens); separator "\n" nếu mẩu mở đầu một đoạn mới.
+	"""
+	for line in lines:
+		line = line.strip()
+		if not line:
+			continue
+		n = estimator(line)
+		if n <= max_tokens:
+			yield "\n", line, n
+			continue
+		sep = "\n"
+		for sentence in _SENTENCE_END.split(line):
+			for piece in _hard_cut(sentence, max_tokens, estimator):
+				yield sep, piece, estimator(piece)
+				sep = " "
+
+def iter_chunks(
+	source: Union[str, Iterable[str]],
+	max_tokens: int = 4000,
+	overlap_tokens: int = 0,
+	estimator: TokenEstimator = estimate_tokens,
+) -> Iterator[str]:
+	"""
+	Chia text (hoặc một luồng text, ví dụ từng trang PDF) thành các chunk ≤ max_tokens.
+
+	- Gom tham lam các đoạn; đoạn quá dài thì tách câu, câu quá dài thì cắt cứng.
+	- overlap_tokens > 0: chunk sau lặp lại phần đuôi (≤ overlap_tokens) của chunk trước.
+	- Là generator: chỉ giữ buffer của chunk hiện tại.
+	"""
+	max_tokens = max(1, max_tokens)
+	overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+	if isinstance(source, str):
+		lines: Iterable[str] = _iter_lines(source)
+	else:
+		lines = (line for page in source for line in _iter_lines(page))
+
+	buf: List[Tuple[str, str, int]] = []
 	size = 0
-	for para in text.split("\n"):
-		if size + len(para) + 1 > max_chars:
-			parts.append("\n".join(buf).strip())
-			buf, size = [para], len(para) + 1
-		else:
-			buf.append(para)
-			size += len(para) + 1
+	for sep, piece, n in _iter_pieces(lines, max_tokens, estimator):
+		cost = n + (1 if buf else 0)
+		if buf and size + cost > max_tokens:
+			yield _join(buf)
+			# giữ lại phần đuôi làm overlap nếu vẫn còn chỗ cho mẩu mới
+			tail: List[Tuple[str, str, int]] = []
+			tail_size = 0
+			for item in reversed(buf):
+				if tail_size + item[2] + 1 > overlap_tokens:
+					break
+				tail.insert(0, item)
+				tail_size += item[2] + 1
+			if tail_size + n + 1 > max_tokens:
+				tail, tail_size = [], 0
+			buf, size = tail, tail_size
+			cost = n + (1 if buf else 0)
+		buf.append((sep, piece, n))
+		size += cost
 	if buf:
-		parts.append("\n".join(buf).strip())
-	return [p for p in parts if p]
+		yield _join(buf)
+
+def _join(buf: List[Tuple[str, str, int]]) -> str:
+	return "".join(sep + piece for sep, piece, _ in buf).strip()
+
+def split_chunks(text: str, max_chars: int = 8000) -> List[str]:
+	# API cũ (theo ký tự) – giữ cho tương thích
+	return list(iter_chunks(text, max_tokens=max_chars, estimator=len))
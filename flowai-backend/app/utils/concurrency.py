@@ -0,0 +1,38 @@
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional
+
+from app.core.config import settings
+
+async def gather_bounded(
+	items: List[Any],
+	fn: Callable[[Any], Awaitable[Any]],
+	on_result: Optional[Callable[[int, Any], Awaitable[Any]]] = None,
+	limit: Optional[int] = None,
+) -> List[Any]:
+	"""
+	Chạy fn(item) song song (tối đa limit cùng lúc, mặc định SUMMARY_MAP_CONCURRENCY).
+	Kết quả giữ đúng thứ tự đầu vào; nếu một item lỗi → huỷ các item còn lại và ném lỗi đó.
+	on_result(index, result) (tuỳ chọn) được await ngay khi từng item xong, ví dụ để lưu checkpoint.
+	"""
+	sem = asyncio.Semaphore(max(1, settings.SUMMARY_MAP_CONCURRENCY if limit is None else limit))
+	saving: List["asyncio.Future[Any]"] = []
+
+	async def _one(i: int, item: Any) -> Any:
+		async with sem:
+			out = await fn(item)
+		if on_result is not None:
+			# item khác lỗi không được huỷ on_result giữa chừng: kết quả đã có thì lưu cho xong
+			fut = asyncio.ensure_future(on_result(i, out))
+			saving.append(fut)
+			await asyncio.shield(fut)
+		return out
+
+	tasks = [asyncio.ensure_future(_one(i, x)) for i, x in enumerate(items)]
+	try:
+		return list(await asyncio.gather(*tasks))
+	except BaseException:
+		for t in tasks:
+			t.cancel()
+		await asyncio.gather(*tasks, return_exceptions=True)
+		await asyncio.gather(*saving, return_exceptions=True)
+		raise
@@ -0,0 +1,158 @@
+import hashlib
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from app.utils.chunk import estimate_tokens
+
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# ===== Dòng lặp giữa các trang (header, footer, số trang, boilerplate pháp lý) =====
+# dòng chỉ là số trang: "3", "- 3 -", "Page 3 of 40", "Trang 3/40", "p. 3"
+_PAGE_NO = re.compile(r"^[\W_]*(?:(?:page|trang|pg|p)\.?\s*)?\d+(?:\s*(?:/|of|trên)\s*\d+)?[\W_]*$")
+_EDGE_LINES = 2  # số dòng (khác rỗng) ở đầu / cuối trang được coi là header / footer
+
+def _line_key(line: str, edge: bool = False) -> str:
+	key = _SPACES.sub(" ", line.strip().casefold())
+	# chỉ số trang ở đầu / cuối trang mới bỏ qua chữ số ("Page 3 of 40" ~ "Page 4 of 40");
+	# dòng nội dung phải trùng nguyên văn ("Total: 307" ≠ "Total: 512")
+	if edge and _PAGE_NO.match(key):
+		return "#page:" + _DIGITS.sub("#", key)
+	return key
+
+def _page_keys(lines: List[str]) -> List[str]:
+	filled = [i for i, l in enumerate(lines) if l.strip()]
+	edges = set(filled[:_EDGE_LINES] + filled[-_EDGE_LINES:])
+	return [_line_key(l, i in edges) for i, l in enumerate(lines)]
+
+def _strip_window(
+	pages: List[str], base: int, first: Dict[str, str], removed: Dict[str, List[int]],
+	min_pages: int, min_fraction: float,
+) -> List[str]:
+	# first: key → dòng gốc của các dòng lặp đã biết (kể cả từ cửa sổ trước); cập nhật tại chỗ cùng removed
+	page_lines = [page.split("\n") for page in pages]
+	page_keys = [_page_keys(lines) for lines in page_lines]
+	repeated = set(first)
+	if len(pages) >= max(2, min_pages):
+		freq: Counter = Counter()
+		for keys in page_keys:
+			freq.update({k for k in keys if k})
+		threshold = max(min_pages, math.ceil(min_fraction * len(pages)))
+		repeated.update(k for k, n in freq.items() if n >= threshold)
+	if not repeated:
+		return pages
+
+	out: List[str] = []
+	for page_no, (lines, keys) in enumerate(zip(page_lines, page_keys), base):
+		kept = []
+		for line, key in zip(lines, keys):
+			if key not in repeated:
+				kept.append(line)
+			elif key not in first:
+				first[key] = line.strip()
+				kept.append(line)
+			elif not removed.get(first[key]) or removed[first[key]][-1] != page_no:
+				removed.setdefault(first[key], []).append(page_no)
+		out.append("\n".join(kept))
+	return out
+
+def strip_repeated_lines(
+	pages: List[str],
+	min_pages: int = 3,
+	min_fraction: float = 0.5,
+) -> Tuple[List[str], Dict[str, List[int]]]:
+	"""
+	Bỏ các dòng xuất hiện trên ≥ max(min_pages, min_fraction × số trang) trang.
+	Giữ lại lần xuất hiện đầu tiên (nội dung không mất hẳn, ví dụ tiêu đề tài liệu).
+	Trả (pages đã lọc, {dòng: [các trang đã bị bỏ dòng đó]}) làm provenance.
+	"""
+	removed: Dict[str, List[int]] = {}
+	return _strip_window(pages, 0, {}, removed, min_pages, min_fraction), removed
+
+# ===== Trang / chunk gần trùng (SimHash 64-bit trên 3-gram từ) =====
+def simhash(text: str, shingle: int = 3) -> int:
+	words = _WORD.findall(text.casefold())
+	if len(words) < shingle:
+		grams: Iterable[str] = [" ".join(words)]
+	else:
+		grams = (" ".join(words[i:i + shingle]) for i in range(len(words) - shingle + 1))
+	blob = b"".join(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest() for g in grams)
+	# cộng trọng số theo từng bit: đếm giá trị từng byte (Counter trên bytes chạy ở tốc độ C)
+	weights = [0] * 64
+	for j in range(8):
+		for value, n in Counter(blob[j::8]).items():
+			for bit in range(8):
+				weights[j * 8 + bit] += n if value >> bit & 1 else -n
+	out = 0
+	for i, w in enumerate(weights):
+		if w > 0:
+			out |= 1 << i
+	return out
+
+def drop_near_duplicates(texts: List[str], max_distance: int = 3) -> Tuple[List[str], Dict[int, int]]:
+	"""
+	Bỏ text (trang / chunk) có SimHash cách một text đã giữ ≤ max_distance bit (Hamming).
+	Trả (text giữ lại, {chỉ số bị bỏ: chỉ số bản gốc}) theo chỉ số đầu vào.
+	"""
+	kept: List[str] = []
+	kept_hashes: List[Tuple[int, int]] = []  # (simhash, chỉ số đầu vào)
+	dropped: Dict[int, int] = {}
+	for i, text in enumerate(texts):
+		h = simhash(text)
+		match = next((j for known, j in kept_hashes if bin(known ^ h).count("1") <= max_distance), None)
+		if match is None:
+			kept_hashes.append((h, i))
+			kept.append(text)
+		else:
+			dropped[i] = match
+	return kept, dropped
+
+# ===== Luồng trang: bỏ trùng theo cửa sổ, bộ nhớ O(window) =====
+class PageDedupe:
+	"""
+	strip_repeated_lines + drop_near_duplicates trên luồng trang (generator), không giữ cả tài liệu:
+	đếm tần suất dòng trong từng cửa sổ `window` trang; dòng lặp đã phát hiện ở cửa sổ trước
+	tiếp tục bị bỏ ở các cửa sổ sau. Trang gần trùng so với SimHash mọi trang đã giữ (chỉ giữ số 64-bit).
+	Provenance (removed_lines, duplicate_pages, tokens_saved) đầy đủ sau khi luồng chạy hết.
+	"""
+	def __init__(self, window: int = 64, min_pages: int = 3, min_fraction: float = 0.5, max_distance: int = 3):
+		self.window = max(1, window)
+		self.min_pages = min_pages
+		self.min_fraction = min_fraction
+		self.max_distance = max_distance
+		self.removed_lines: Dict[str, List[int]] = {}
+		self.duplicate_pages: Dict[int, int] = {}
+		self.tokens_saved = 0
+		self._first: Dict[str, str] = {}
+		self._hashes: List[Tuple[int, int]] = []  # (simhash, chỉ số trang)
+
+	def __call__(self, pages: Iterable[str]) -> Iterator[str]:
+		buf: List[str] = []
+		base = 0
+		for page in pages:
+			buf.append(page)
+			if len(buf) >= self.window:
+				yield from self._flush(buf, base)
+				base += len(buf)
+				buf = []
+		if buf:
+			yield from self._flush(buf, base)
+
+	def _flush(self, pages: List[str], base: int) -> Iterator[str]:
+		before = {line: len(p) for line, p in self.removed_lines.items()}
+		stripped = _strip_window(pages, base, self._first, self.removed_lines, self.min_pages, self.min_fraction)
+		self.tokens_saved += sum(
+			estimate_tokens(line) * (len(p) - before.get(line, 0)) for line, p in self.removed_lines.items()
+		)
+		for i, text in enumerate(stripped, base):
+			h = simhash(text)
+			match = next((j for known, j in self._hashes if bin(known ^ h).count("1") <= self.max_distance), None)
+			if match is None:
+				self._hashes.append((h, i))
+				yield text
+			else:
+				self.duplicate_pages[i] = match
+				self.tokens_saved += estimate_tokens(text)
@@ -0,0 +1,140 @@
+"""
+Tóm tắt extractive cục bộ: chấm điểm câu bằng TF-IDF / TextRank (NumPy, không tải model),
+giữ các câu điểm cao nhất trong ngân sách token, theo đúng thứ tự gốc.
+
+- tfidf   : độ tương đồng cosine của câu với trọng tâm văn bản, O(câu × từ vựng)
+- textrank: PageRank trên đồ thị cosine giữa các câu, O(câu²) – chậm hơn, chọn câu "trung tâm" tốt hơn
+
+NumPy được import lười (chỉ khi thật sự nén) để không làm chậm cold start.
+"""
+import re
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+from app.utils.chunk import estimate_tokens
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…。])\s+")
+_WORD = re.compile(r"\w+", re.UNICODE)
+_BULLET = re.compile(r"^\s*(?:[-*•–]\s+|\d+[.)]\s+)")
+
+def split_sentences(text: str) -> List[Tuple[int, str]]:
+	"""Trả [(chỉ số dòng, câu)]; mỗi dòng (đoạn / bullet) được tách tiếp theo dấu kết câu."""
+	out: List[Tuple[int, str]] = []
+	for line_no, line in enumerate(text.split("\n")):
+		line = _BULLET.sub("", line).strip()
+		if not line:
+			continue
+		out.extend((line_no, s.strip()) for s in _SENTENCE_END.split(line) if s.strip())
+	return out
+
+def _tfidf_matrix(sentences: List[str]):
+	import numpy as np
+
+	vocab: dict = {}
+	rows: List[int] = []
+	cols: List[int] = []
+	for i, s in enumerate(sentences):
+		for w in _WORD.findall(s.casefold()):
+			rows.append(i)
+			cols.append(vocab.setdefault(w, len(vocab)))
+	x = np.zeros((len(sentences), max(1, len(vocab))), dtype=np.float32)
+	np.add.at(x, (np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)), 1.0)
+	df = np.count_nonzero(x, axis=0)
+	idf = np.log((1 + len(sentences)) / (1 + df)) + 1.0
+	x = np.log1p(x) * idf.astype(np.float32)  # tf dạng log: từ lặp nhiều không át cả câu
+	norms = np.linalg.norm(x, axis=1, keepdims=True)
+	return x / np.maximum(norms, 1e-9)
+
+def score_sentences(sentences: List[str], method: str = "textrank"):
+	import numpy as np
+
+	x = _tfidf_matrix(sentences)
+	if method == "tfidf":
+		return x @ x.mean(axis=0)
+	sim = x @ x.T
+	np.fill_diagonal(sim, 0.0)
+	sums = sim.sum(axis=1, keepdims=True)
+	n = len(sentences)
+	# câu không giống câu nào: phân phối đều (tránh chia 0)
+	p = np.where(sums > 0, sim / np.maximum(sums, 1e-9), 1.0 / n)
+	rank = np.full(n, 1.0 / n, dtype=np.float32)
+	damping = 0.85
+	for _ in range(100):
+		new = (1 - damping) / n + damping * (p.T @ rank)
+		if np.abs(new - rank).sum() < 1e-6:
+			rank = new
+			break
+		rank = new
+	return rank
+
+def _truncate(sentence: str, max_tokens: int) -> str:
+	# cắt theo byte cho vừa estimate_tokens, lùi về ranh giới từ nếu có
+	limit = max(1, 4 * max_tokens - 3)
+	data = sentence.encode("utf-8")
+	if len(data) <= limit:
+		return sentence
+	cut = data[:max(0, limit - 3)].decode("utf-8", errors="ignore").strip()  # chừa 3 byte cho "…"
+	head = cut.rsplit(None, 1)[0] if " " in cut else cut
+	return head + "…" if head else ""
+
+def _sample(n: int, k: int) -> List[int]:
+	# k chỉ số rải đều trên [0, n): giữ độ phủ toàn văn bản, không tốn chi phí chấm điểm
+	return sorted({i * n // k for i in range(k)})
+
+def select(
+	text: str, max_tokens: int, method: str = "textrank", max_sentences: Optional[int] = None
+) -> List[Tuple[int, str]]:
+	"""
+	Các câu (kèm chỉ số dòng) điểm cao nhất có tổng ≤ max_tokens, theo thứ tự xuất hiện.
+	Quá max_sentences câu (mặc định EXTRACTIVE_MAX_SENTENCES) → chỉ chấm điểm chừng ấy câu rải đều
+	(TextRank là O(câu²)).
+	Không câu nào vừa ngân sách → câu điểm cao nhất, cắt cho vừa.
+	"""
+	sentences = split_sentences(text)
+	if max_sentences is None:
+		max_sentences = settings.EXTRACTIVE_MAX_SENTENCES
+	if len(sentences) > max_sentences > 0:
+		sentences = [sentences[i] for i in _sample(len(sentences), max_sentences)]
+	if len(sentences) <= 1:
+		return [(line_no, _truncate(s, max_tokens - 1)) for line_no, s in sentences]
+	import numpy as np
+
+	scores = score_sentences([s for _, s in sentences], method)
+	order = np.argsort(-scores, kind="stable")
+	picked: List[int] = []
+	seen = set()
+	used = 0
+	for i in order:
+		key = sentences[i][1].casefold()
+		n = estimate_tokens(sentences[i][1]) + 1
+		if key not in seen and used + n <= max_tokens:
+			# câu lặp nguyên văn chỉ lấy một lần
+			seen.add(key)
+			picked.append(int(i))
+			used += n
+	if not picked:
+		line_no, sentence = sentences[int(order[0])]
+		return [(line_no, _truncate(sentence, max_tokens - 1))]
+	return [sentences[i] for i in sorted(picked)]
+
+def compress(
+	text: str, ratio: float, max_tokens: Optional[int] = None, method: str = "textrank",
+	max_sentences: Optional[int] = None,
+) -> str:
+	"""
+	Giữ khoảng ratio số token của text (và ≤ max_tokens nếu có), giữ xuống dòng giữa các đoạn gốc.
+	Không bao giờ dài hơn ngân sách: không tách được câu → "".
+	"""
+	budget = int(estimate_tokens(text) * ratio)
+	if max_tokens is not None:
+		budget = min(budget, max_tokens)
+	picked = select(text, max(1, budget), method, max_sentences)
+	lines: List[str] = []
+	prev = None
+	for line_no, sentence in picked:
+		if line_no == prev:
+			lines[-1] += " " + sentence
+		else:
+			lines.append(sentence)
+		prev = line_no
+	return "\n".join(lines)
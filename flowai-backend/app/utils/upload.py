@@ -0,0 +1,54 @@
+import os
+import shutil
+import tempfile
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from fastapi import UploadFile
+
+from app.core.config import settings
+from app.core.executors import io_executor
+from app.core.tracing import span
+
+_COPY_CHUNK = 1024 * 1024
+
+def _copy_to_disk(src, suffix: str) -> str:
+	fd, path = tempfile.mkstemp(prefix="flowai-", suffix=suffix, dir=settings.UPLOAD_SPOOL_DIR or None)
+	try:
+		with os.fdopen(fd, "wb") as out:
+			src.seek(0)
+			shutil.copyfileobj(src, out, _COPY_CHUNK)
+	except BaseException:
+		os.unlink(path)
+		raise
+	return path
+
+def _named_path(src, suffix: str) -> Optional[str]:
+	# upload đã là file thật trên đĩa (có đường dẫn) → parser đọc thẳng, không chép lại
+	name = getattr(src, "name", None)
+	if isinstance(name, str) and name.lower().endswith(suffix.lower()) and os.path.isfile(name):
+		return name
+	return None
+
+@asynccontextmanager
+async def spool_upload(file: UploadFile, suffix: str = "") -> AsyncIterator[str]:
+	"""
+	Trả đường dẫn tới nội dung upload. Nếu upload đã là file có tên trên đĩa thì dùng luôn
+	(không xoá, chủ sở hữu tự dọn). Ngược lại (SpooledTemporaryFile của Starlette: trong RAM
+	hoặc file tạm vô danh, không có đường dẫn cho process pool mở) → ghi ra file tạm theo từng
+	khối 1 MB, xoá khi thoát context. Giới hạn kích thước do MaxBodySizeMiddleware đảm nhận.
+	"""
+	named = _named_path(file.file, suffix)
+	if named is not None:
+		yield named
+		return
+	with span("upload.spool") as sp:
+		path = await io_executor.run(_copy_to_disk, file.file, suffix)
+		sp.set(bytes=os.path.getsize(path))
+	try:
+		yield path
+	finally:
+		try:
+			os.unlink(path)
+		except OSError:
+			pass
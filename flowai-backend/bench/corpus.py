@@ -0,0 +1,121 @@
+# bench/corpus.py
+"""
+Fixture corpus cho benchmark, sinh tất định theo seed (không commit file nhị phân):
+ghi chú ngắn, ghi chú dài, PDF nhiều trang (có trang 2 cột), PDF scan, ảnh, danh sách task lớn, lịch đã xếp.
+"""
+import os
+import random
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+_WORDS_VI = (
+	"họp nhóm dự án báo cáo tiến độ khách hàng hạn chót thiết kế giao diện kiểm thử "
+	"triển khai tài liệu ngân sách kế hoạch tuần sau cần hoàn thành trước thứ sáu"
+).split()
+_WORDS_EN = (
+	"meeting project report progress customer deadline design interface testing "
+	"deployment documentation budget plan next week must finish before friday"
+).split()
+
+def _sentence(rng: random.Random, n: int) -> str:
+	words = _WORDS_VI if rng.random() < 0.6 else _WORDS_EN
+	s = " ".join(rng.choice(words) for _ in range(n))
+	return s[:1].upper() + s[1:] + "."
+
+def _paragraph(rng: random.Random, sentences: int) -> str:
+	return " ".join(_sentence(rng, rng.randint(6, 18)) for _ in range(sentences))
+
+def short_notes(n: int, seed: int = 1) -> List[str]:
+	rng = random.Random(seed)
+	return [f"Note #{i}\n" + "\n".join(_paragraph(rng, 3) for _ in range(rng.randint(1, 3))) for i in range(n)]
+
+def long_note(paragraphs: int = 400, seed: int = 2) -> str:
+	rng = random.Random(seed)
+	return "\n\n".join(_paragraph(rng, rng.randint(3, 8)) for _ in range(paragraphs))
+
+def make_pdf(path: str, pages: int = 60, seed: int = 3) -> str:
+	import fitz  # PyMuPDF
+
+	rng = random.Random(seed)
+	doc = fitz.open()
+	for i in range(pages):
+		page = doc.new_page()
+		if i % 10 == 9:
+			# trang 2 cột để đi qua nhánh pdfplumber
+			for col, x in enumerate((50, 310)):
+				page.insert_textbox(fitz.Rect(x, 50, x + 240, 780), _paragraph(rng, 14), fontsize=9)
+		else:
+			page.insert_textbox(fitz.Rect(50, 50, 545, 780), f"Page {i + 1}\n" + _paragraph(rng, 20), fontsize=10)
+	doc.save(path)
+	doc.close()
+	return path
+
+def make_scanned_pdf(path: str, text_pdf: str, pages: int = 12, dpi: int = 100) -> str:
+	# PDF chỉ có ảnh (không text layer), render từ PDF chữ → đi qua nhánh OCR
+	import fitz  # PyMuPDF
+
+	src = fitz.open(text_pdf)
+	doc = fitz.open()
+	for i in range(min(pages, src.page_count)):
+		pix = src[i].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+		page = doc.new_page(width=src[i].rect.width, height=src[i].rect.height)
+		page.insert_image(page.rect, stream=pix.tobytes("jpeg", jpg_quality=80))
+	doc.save(path)
+	doc.close()
+	src.close()
+	return path
+
+def make_image(path: str, width: int = 3000, height: int = 2000, seed: int = 4) -> str:
+	from PIL import Image, ImageDraw
+
+	rng = random.Random(seed)
+	img = Image.new("RGB", (width, height), (245, 245, 240))
+	draw = ImageDraw.Draw(img)
+	for y in range(80, height - 80, 60):
+		# các dòng "chữ" giả + nhiễu để ảnh nén không quá nhỏ
+		x = 80
+		while x < width - 200:
+			w = rng.randint(40, 180)
+			g = rng.randint(10, 90)
+			draw.rectangle([x, y, x + w, y + 28], fill=(g, g, g))
+			x += w + rng.randint(15, 40)
+	img.save(path, "JPEG", quality=92)
+	return path
+
+def task_list(n: int = 500, seed: int = 5) -> List[Dict[str, Any]]:
+	rng = random.Random(seed)
+	return [
+		{"id": i, "text": _sentence(rng, rng.randint(3, 8)), "duration": rng.choice([1, 1, 2, 2, 3, 4, 6])}
+		for i in range(1, n + 1)
+	]
+
+def scheduled_events(n: int = 2000, seed: int = 6, tz: str = "Asia/Ho_Chi_Minh") -> List[Dict[str, Any]]:
+	rng = random.Random(seed)
+	out: List[Dict[str, Any]] = []
+	day = date(2025, 1, 6)
+	hour = 9
+	for i in range(1, n + 1):
+		dur = rng.choice([1, 1, 2, 3])
+		if hour + dur > 17:
+			day += timedelta(days=1)
+			hour = 9
+		out.append({
+			"id": i, "title": _sentence(rng, rng.randint(3, 10)), "dateStr": day.isoformat(),
+			"start": f"{hour:02d}:00", "end": f"{hour + dur:02d}:00", "duration": dur, "timezone": tz,
+		})
+		hour += dur
+	return out
+
+def build(root: str) -> Dict[str, Any]:
+	"""Sinh toàn bộ corpus vào thư mục root; trả dict các fixture dùng cho run.py."""
+	os.makedirs(root, exist_ok=True)
+	pdf = make_pdf(os.path.join(root, "long.pdf"))
+	return {
+		"short_notes": short_notes(200),
+		"long_note": long_note(),
+		"pdf": pdf,
+		"scanned_pdf": make_scanned_pdf(os.path.join(root, "scanned.pdf"), pdf),
+		"image": make_image(os.path.join(root, "photo.jpg")),
+		"tasks": task_list(),
+		"events": scheduled_events(),
+	}
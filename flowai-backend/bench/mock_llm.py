@@ -0,0 +1,161 @@
+# bench/mock_llm.py
+"""
+Stub LLM server cho benchmark (không gọi mạng, không tốn tiền).
+
+Trả response đúng shape của (JSON mode kèm ảnh → {pages: [...]} như OCR):
+- Gemini : POST /v1beta/models/{model}:generateContent
+           POST /v1beta/models/{model}:streamGenerateContent?alt=sse
+- OpenAI : POST /v1/chat/completions (stream=true → SSE, kết thúc bằng [DONE])
+
+Độ trễ = latency_ms ± jitter_ms + ms_per_token × số token output; lỗi tiêm ngẫu nhiên:
+error_rate → 503, throttle_rate → 429 + Retry-After.
+
+	python -m bench.mock_llm --port 9100 --latency-ms 300 --jitter-ms 100 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import random
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+def _fake_plan() -> Dict[str, Any]:
+	subtasks = [
+		{"id": i, "text": text, "duration": dur}
+		for i, (text, dur) in enumerate(
+			[("Research requirements", 2), ("Draft outline", 1), ("Implement main part", 3), ("Review & polish", 1)], 1
+		)
+	]
+	items = [{"text": "Follow up with team", "due": None, "estimate": 1}]
+	return {"subtasks": subtasks, "items": items, "notes": "mock"}
+
+def _fake_summary(prompt: str, max_tokens: Optional[int]) -> str:
+	# output ~ min(max_tokens, 120) token, lấy từ chính prompt để độ dài có ý nghĩa
+	words = prompt.split()[-400:] or ["summary"]
+	n_words = max(8, min(max_tokens or 120, 120) * 3 // 4)
+	lines, i = [], 0
+	while sum(len(l.split()) for l in lines) < n_words:
+		lines.append("- " + " ".join(words[i % len(words):i % len(words) + 12]))
+		i += 12
+	return "\n".join(lines)
+
+def _fake_ocr(n_images: int) -> Dict[str, Any]:
+	return {"pages": [f"Scanned page {i + 1}. " + "Meeting notes about the project deadline and budget. " * 20 for i in range(n_images)]}
+
+def create_app(
+	latency_ms: float = 300,
+	jitter_ms: float = 100,
+	ms_per_token: float = 0,
+	error_rate: float = 0.0,
+	throttle_rate: float = 0.0,
+	seed: Optional[int] = None,
+) -> FastAPI:
+	app = FastAPI(title="FlowAI mock LLM")
+	rng = random.Random(seed)
+	counters = {"requests": 0, "errors": 0, "throttled": 0}
+
+	def _delay(out_tokens: int) -> float:
+		base = latency_ms + rng.uniform(-jitter_ms, jitter_ms) + ms_per_token * out_tokens
+		return max(0.0, base) / 1000
+
+	def _injected() -> Optional[JSONResponse]:
+		counters["requests"] += 1
+		r = rng.random()
+		if r < error_rate:
+			counters["errors"] += 1
+			return JSONResponse({"error": {"code": 503, "message": "mock overloaded"}}, status_code=503)
+		if r < error_rate + throttle_rate:
+			counters["throttled"] += 1
+			return JSONResponse(
+				{"error": {"code": 429, "message": "mock rate limit"}}, status_code=429, headers={"Retry-After": "1"}
+			)
+		return None
+
+	async def _sse(pieces: List[str], delay: float, encode) -> AsyncIterator[bytes]:
+		for p in pieces:
+			await asyncio.sleep(delay / max(1, len(pieces)))
+			yield f"data: {json.dumps(encode(p), ensure_ascii=False)}\r\n\r\n".encode("utf-8")
+
+	def _split(text: str, n: int = 5) -> List[str]:
+		step = max(1, len(text) // n + 1)
+		return [text[i:i + step] for i in range(0, len(text), step)]
+
+	@app.get("/health")
+	async def health():
+		return {"ok": True, **counters}
+
+	@app.post("/v1beta/models/{model_action}")
+	async def gemini(model_action: str, request: Request):
+		_, _, action = model_action.partition(":")
+		body = await request.json()
+		err = _injected()
+		if err is not None:
+			return err
+		parts = body.get("contents", [{}])[0].get("parts", [])
+		prompt = " ".join(p.get("text", "") for p in parts)
+		images = sum(1 for p in parts if "inline_data" in p)
+		config = body.get("generationConfig", {})
+		if config.get("responseMimeType") == "application/json":
+			text = json.dumps(_fake_ocr(images) if images else _fake_plan())
+		else:
+			text = _fake_summary(prompt, config.get("maxOutputTokens"))
+		delay = _delay(len(text) // 4)
+
+		def encode(t: str) -> Dict[str, Any]:
+			return {"candidates": [{"content": {"role": "model", "parts": [{"text": t}]}}]}
+
+		if action == "streamGenerateContent":
+			return StreamingResponse(_sse(_split(text), delay, encode), media_type="text/event-stream")
+		await asyncio.sleep(delay)
+		return encode(text)
+
+	@app.post("/v1/chat/completions")
+	async def openai(request: Request):
+		body = await request.json()
+		err = _injected()
+		if err is not None:
+			return err
+		content = body.get("messages", [{}])[-1].get("content", "")
+		images = 0
+		if isinstance(content, list):
+			images = sum(1 for c in content if c.get("type") == "image_url")
+			content = " ".join(c.get("text", "") for c in content if c.get("type") == "text")
+		if (body.get("response_format") or {}).get("type") == "json_object":
+			text = json.dumps(_fake_ocr(images) if images else _fake_plan())
+		else:
+			text = _fake_summary(content, body.get("max_tokens"))
+		delay = _delay(len(text) // 4)
+
+		if body.get("stream"):
+			async def gen() -> AsyncIterator[bytes]:
+				async for chunk in _sse(_split(text), delay, lambda t: {"choices": [{"delta": {"content": t}}]}):
+					yield chunk
+				yield b"data: [DONE]\r\n\r\n"
+			return StreamingResponse(gen(), media_type="text/event-stream")
+		await asyncio.sleep(delay)
+		return {"choices": [{"message": {"role": "assistant", "content": text}}]}
+
+	return app
+
+def main(argv: Optional[List[str]] = None) -> None:
+	import uvicorn
+
+	ap = argparse.ArgumentParser(description="Mock Gemini / OpenAI server for FlowAI benchmarks")
+	ap.add_argument("--host", default="127.0.0.1")
+	ap.add_argument("--port", type=int, default=9100)
+	ap.add_argument("--latency-ms", type=float, default=300)
+	ap.add_argument("--jitter-ms", type=float, default=100)
+	ap.add_argument("--ms-per-token", type=float, default=0)
+	ap.add_argument("--error-rate", type=float, default=0.0)
+	ap.add_argument("--throttle-rate", type=float, default=0.0)
+	ap.add_argument("--seed", type=int, default=None)
+	args = ap.parse_args(argv)
+	app = create_app(
+		args.latency_ms, args.jitter_ms, args.ms_per_token, args.error_rate, args.throttle_rate, args.seed
+	)
+	uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+	main()
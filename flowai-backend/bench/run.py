@@ -0,0 +1,286 @@
+# bench/run.py
+"""
+Benchmark offline: dựng mock LLM + FlowAI backend (2 subprocess trên localhost),
+bắn tải ở mức concurrency cố định và báo p50/p95/p99, RPS, lỗi, peak RSS.
+
+	cd flowai-backend
+	python -m bench.run                                   # mọi scenario, concurrency 8
+	python -m bench.run -s summarize_text,plan_goal -c 32 -n 400 --latency-ms 500
+	python -m bench.run --json out.json                   # lưu kết quả để so sánh giữa các commit
+
+Mặc định tắt summary cache và rate limiter phía client (--cache / --limits để bật)
+để số đo phản ánh pipeline chứ không phải cache hit.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from bench import corpus
+
+Builder = Callable[[int], Dict[str, Any]]
+
+# ========= Scenarios: i → kwargs cho httpx.request =========
+def _scenarios(fx: Dict[str, Any]) -> Dict[str, Builder]:
+	with open(fx["pdf"], "rb") as f:
+		pdf = f.read()
+	with open(fx["scanned_pdf"], "rb") as f:
+		scanned = f.read()
+	with open(fx["image"], "rb") as f:
+		image = f.read()
+	notes = fx["short_notes"]
+	tasks = fx["tasks"]
+	events = fx["events"]
+
+	return {
+		"summarize_text": lambda i: {
+			"method": "POST", "url": "/summarize/text",
+			"data": {"text": notes[i % len(notes)] + f"\n#{i}", "style": "bullet"},
+		},
+		"summarize_text_long": lambda i: {
+			"method": "POST", "url": "/summarize/text",
+			"data": {"text": f"#{i}\n" + fx["long_note"], "style": "bullet"},
+		},
+		"summarize_text_stream": lambda i: {
+			"method": "POST", "url": "/summarize/text/stream",
+			"data": {"text": notes[i % len(notes)] + f"\n#{i}"},
+		},
+		"summarize_pdf": lambda i: {
+			"method": "POST", "url": "/summarize/pdf",
+			"files": {"file": (f"doc{i}.pdf", pdf + f"\n%{i}".encode(), "application/pdf")},
+			"data": {"style": "bullet"},
+		},
+		"summarize_pdf_scanned": lambda i: {
+			"method": "POST", "url": "/summarize/pdf",
+			"files": {"file": (f"scan{i}.pdf", scanned + f"\n%{i}".encode(), "application/pdf")},
+			"data": {"style": "bullet"},
+		},
+		"summarize_image": lambda i: {
+			"method": "POST", "url": "/summarize/image",
+			"files": {"file": (f"img{i}.jpg", image, "image/jpeg")},
+			"data": {"style": "bullet"},
+		},
+		"plan_goal": lambda i: {
+			"method": "POST", "url": "/api/ai/plan_goal",
+			"json": {"title": f"Course assignment {i}", "desc": notes[i % len(notes)], "scope": "weekly"},
+		},
+		"schedule": lambda i: {
+			"method": "POST", "url": "/ai/schedule",
+			"json": {"tasks": tasks, "start_date": "2025-01-06", "holidays": ["2025-01-29"]},
+		},
+		"export_ics": lambda i: {
+			"method": "POST", "url": "/calendar/export-ics",
+			"json": {"scheduled": events, "calendar_name": f"Bench {i}"},
+		},
+	}
+
+# ========= Đo =========
+def _percentile(xs: List[float], q: float) -> Optional[float]:
+	if not xs:
+		return None
+	xs = sorted(xs)
+	return xs[min(len(xs) - 1, max(0, int(round(q * len(xs))) - 1))]
+
+async def _drive(client: httpx.AsyncClient, build: Builder, n: int, concurrency: int) -> Dict[str, Any]:
+	sem = asyncio.Semaphore(concurrency)
+	latencies: List[float] = []
+	statuses: Dict[str, int] = {}
+
+	async def one(i: int) -> None:
+		async with sem:
+			t0 = time.perf_counter()
+			try:
+				resp = await client.request(**build(i))
+				await resp.aread()
+				key = str(resp.status_code)
+			except httpx.HTTPError as e:
+				key = type(e).__name__
+			latencies.append(time.perf_counter() - t0)
+			statuses[key] = statuses.get(key, 0) + 1
+
+	t0 = time.perf_counter()
+	await asyncio.gather(*(one(i) for i in range(n)))
+	wall = time.perf_counter() - t0
+	ok = sum(v for k, v in statuses.items() if k.startswith("2"))
+	return {
+		"requests": n,
+		"ok": ok,
+		"statuses": statuses,
+		"rps": round(n / wall, 2),
+		"p50_ms": round(_percentile(latencies, 0.50) * 1000, 1),
+		"p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+		"p99_ms": round(_percentile(latencies, 0.99) * 1000, 1),
+		"wall_s": round(wall, 2),
+	}
+
+def _rss_kb(pid: int, field: str = "VmHWM") -> int:
+	try:
+		with open(f"/proc/{pid}/status") as f:
+			for line in f:
+				if line.startswith(field + ":"):
+					return int(line.split()[1])
+	except OSError:
+		pass
+	return 0
+
+def _descendants(pid: int) -> List[int]:
+	# cây process (worker của process pool) từ /proc; chỉ Linux
+	children: Dict[int, List[int]] = {}
+	for name in os.listdir("/proc") if os.path.isdir("/proc") else []:
+		if not name.isdigit():
+			continue
+		try:
+			with open(f"/proc/{name}/stat") as f:
+				ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+		except (OSError, IndexError, ValueError):
+			continue
+		children.setdefault(ppid, []).append(int(name))
+	out, stack = [], [pid]
+	while stack:
+		p = stack.pop()
+		out.append(p)
+		stack.extend(children.get(p, []))
+	return out
+
+def _peak_rss_mb(pid: int) -> Dict[str, Optional[float]]:
+	main = _rss_kb(pid)
+	if not main:
+		return {"server_mb": None, "tree_mb": None}
+	tree = sum(_rss_kb(p) for p in _descendants(pid))
+	return {"server_mb": round(main / 1024, 1), "tree_mb": round(tree / 1024, 1)}
+
+# ========= Subprocess =========
+def _free_port() -> int:
+	with socket.socket() as s:
+		s.bind(("127.0.0.1", 0))
+		return s.getsockname()[1]
+
+def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 30) -> None:
+	deadline = time.time() + timeout
+	while time.time() < deadline:
+		if proc.poll() is not None:
+			raise RuntimeError(f"process exited early ({proc.returncode}) while waiting for {url}")
+		try:
+			if httpx.get(url, timeout=1).status_code == 200:
+				return
+		except httpx.HTTPError:
+			pass
+		time.sleep(0.2)
+	raise RuntimeError(f"timed out waiting for {url}")
+
+def _start_mock(args: argparse.Namespace, port: int) -> subprocess.Popen:
+	cmd = [
+		sys.executable, "-m", "bench.mock_llm", "--port", str(port),
+		"--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+		"--ms-per-token", str(args.ms_per_token),
+		"--error-rate", str(args.error_rate), "--throttle-rate", str(args.throttle_rate), "--seed", "42",
+	]
+	return subprocess.Popen(cmd)
+
+def _start_app(args: argparse.Namespace, port: int, mock_port: int, tmp: str) -> subprocess.Popen:
+	env = dict(os.environ)
+	env.update({
+		"LLM_PROVIDER": "gemini",
+		"GEMINI_API_KEY": "bench",
+		"GEMINI_BASE_URL": f"http://127.0.0.1:{mock_port}/v1beta",
+		"OPENAI_BASE_URL": f"http://127.0.0.1:{mock_port}/v1",
+		"OPENAI_API_KEY": "bench",
+		"SUMMARY_CACHE_ENABLED": "true" if args.cache else "false",
+		"UPLOAD_SPOOL_DIR": tmp,
+	})
+	if not args.limits:
+		env.update({"LLM_RPM_LIMIT": "0", "LLM_TPM_LIMIT": "0"})
+	cmd = [
+		sys.executable, "-m", "uvicorn", "app.main:app",
+		"--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--no-access-log",
+	]
+	return subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL)
+
+def _stop(proc: subprocess.Popen) -> None:
+	proc.terminate()
+	try:
+		proc.wait(timeout=10)
+	except subprocess.TimeoutExpired:
+		proc.kill()
+
+# ========= Main =========
+def _print_table(results: Dict[str, Dict[str, Any]]) -> None:
+	cols = ("requests", "ok", "rps", "p50_ms", "p95_ms", "p99_ms")
+	print(f"{'scenario':<24}" + "".join(f"{c:>10}" for c in cols))
+	for name, r in results.items():
+		print(f"{name:<24}" + "".join(f"{r[c]!s:>10}" for c in cols))
+
+async def _run(args: argparse.Namespace, base_url: str, fx: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+	scenarios = _scenarios(fx)
+	names = list(scenarios) if args.scenarios == "all" else [s.strip() for s in args.scenarios.split(",")]
+	unknown = [n for n in names if n not in scenarios]
+	if unknown:
+		raise SystemExit(f"unknown scenario(s): {', '.join(unknown)}; choose from {', '.join(scenarios)}")
+
+	results: Dict[str, Dict[str, Any]] = {}
+	limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+	async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+		for name in names:
+			if args.warmup:
+				await _drive(client, scenarios[name], min(args.warmup, args.requests), args.concurrency)
+			results[name] = await _drive(client, scenarios[name], args.requests, args.concurrency)
+	return results
+
+def main(argv: Optional[List[str]] = None) -> None:
+	ap = argparse.ArgumentParser(description="Offline FlowAI benchmark against a mock LLM server")
+	ap.add_argument("-s", "--scenarios", default="all", help="comma-separated list, or 'all'")
+	ap.add_argument("-c", "--concurrency", type=int, default=8)
+	ap.add_argument("-n", "--requests", type=int, default=100, help="requests per scenario")
+	ap.add_argument("--warmup", type=int, default=5, help="warm-up requests per scenario (not measured)")
+	ap.add_argument("--timeout", type=float, default=120)
+	ap.add_argument("--latency-ms", type=float, default=300)
+	ap.add_argument("--jitter-ms", type=float, default=100)
+	ap.add_argument("--ms-per-token", type=float, default=0)
+	ap.add_argument("--error-rate", type=float, default=0.0)
+	ap.add_argument("--throttle-rate", type=float, default=0.0)
+	ap.add_argument("--cache", action="store_true", help="keep the summary cache enabled")
+	ap.add_argument("--limits", action="store_true", help="keep the client-side RPM/TPM limiter enabled")
+	ap.add_argument("--json", dest="json_out", default="", help="write results to this file")
+	args = ap.parse_args(argv)
+
+	with tempfile.TemporaryDirectory(prefix="flowai-bench-") as tmp:
+		print("building corpus...", flush=True)
+		fx = corpus.build(tmp)
+		mock_port, app_port = _free_port(), _free_port()
+		mock = _start_mock(args, mock_port)
+		app = None
+		try:
+			_wait_ready(f"http://127.0.0.1:{mock_port}/health", mock)
+			app = _start_app(args, app_port, mock_port, tmp)
+			_wait_ready(f"http://127.0.0.1:{app_port}/health", app)
+			results = asyncio.run(_run(args, f"http://127.0.0.1:{app_port}", fx))
+			rss = _peak_rss_mb(app.pid)
+			upstream = httpx.get(f"http://127.0.0.1:{mock_port}/health").json()
+		finally:
+			if app is not None:
+				_stop(app)
+			_stop(mock)
+
+	_print_table(results)
+	print(f"peak RSS: server {rss['server_mb']} MB, incl. workers {rss['tree_mb']} MB")
+	print(f"upstream LLM requests: {upstream['requests']} (errors {upstream['errors']}, throttled {upstream['throttled']})")
+	if args.json_out:
+		report = {
+			"config": {k: v for k, v in vars(args).items() if k != "json_out"},
+			"results": results,
+			"peak_rss": rss,
+			"upstream": upstream,
+		}
+		with open(args.json_out, "w", encoding="utf-8") as f:
+			json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,109 @@
+# bench/startup.py
+"""
+Benchmark cold start: thời gian import app.main (python -X importtime) và thời gian từ lúc
+chạy uvicorn đến response 200 đầu tiên của /health. Dùng làm chỉ số regression giữa các commit.
+
+	cd flowai-backend
+	python -m bench.startup                      # 5 lần, báo min / median
+	python -m bench.startup --warmup             # bật WARMUP_ON_STARTUP
+	python -m bench.startup --json startup.json --max-ms 3000   # exit 1 nếu median vượt ngưỡng
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from bench.run import _free_port, _stop
+
+# ========= Import time =========
+def import_profile(module: str = "app.main", top: int = 15) -> Dict[str, Any]:
+	"""Chạy `python -X importtime -c 'import module'` trong process mới; trả tổng + top module theo thời gian tự import."""
+	proc = subprocess.run(
+		[sys.executable, "-X", "importtime", "-c", f"import {module}"],
+		capture_output=True, text=True, check=True,
+	)
+	rows = []
+	for line in proc.stderr.splitlines():
+		if not line.startswith("import time:") or "self [us]" in line:
+			continue
+		self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+		rows.append((name.strip(), int(self_us), int(cum_us)))
+	total = next((cum for name, _, cum in rows if name == module), 0)
+	heaviest = sorted(rows, key=lambda r: r[1], reverse=True)[:top]
+	return {
+		"module": module,
+		"total_ms": round(total / 1000, 1),
+		"modules": len(rows),
+		"top_self_ms": [{"module": n, "self_ms": round(s / 1000, 1), "cumulative_ms": round(c / 1000, 1)} for n, s, c in heaviest],
+	}
+
+# ========= Time to first 200 =========
+def _first_200(warmup: bool, timeout: float = 60) -> float:
+	port = _free_port()
+	env = dict(os.environ)
+	env.update({
+		"GEMINI_API_KEY": env.get("GEMINI_API_KEY", "bench"),
+		# warm-up mở kết nối LLM: trỏ vào cổng đóng để không ra mạng
+		"GEMINI_BASE_URL": f"http://127.0.0.1:{_free_port()}/v1beta",
+		"WARMUP_ON_STARTUP": "true" if warmup else "false",
+	})
+	cmd = [
+		sys.executable, "-m", "uvicorn", "app.main:app",
+		"--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--no-access-log",
+	]
+	t0 = time.perf_counter()
+	proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL)
+	try:
+		url = f"http://127.0.0.1:{port}/health"
+		while time.perf_counter() - t0 < timeout:
+			if proc.poll() is not None:
+				raise RuntimeError(f"server exited early ({proc.returncode})")
+			try:
+				if httpx.get(url, timeout=1).status_code == 200:
+					return time.perf_counter() - t0
+			except httpx.HTTPError:
+				pass
+			time.sleep(0.01)
+		raise RuntimeError(f"timed out waiting for {url}")
+	finally:
+		_stop(proc)
+
+# ========= Main =========
+def main(argv: Optional[List[str]] = None) -> None:
+	ap = argparse.ArgumentParser(description="FlowAI cold-start benchmark")
+	ap.add_argument("-r", "--runs", type=int, default=5)
+	ap.add_argument("--warmup", action="store_true", help="start the server with WARMUP_ON_STARTUP=true")
+	ap.add_argument("--top", type=int, default=15, help="heaviest imports to report")
+	ap.add_argument("--max-ms", type=float, default=0, help="fail (exit 1) if median time-to-first-200 exceeds this")
+	ap.add_argument("--json", dest="json_out", default="", help="write results to this file")
+	args = ap.parse_args(argv)
+
+	imports = import_profile(top=args.top)
+	print(f"import app.main: {imports['total_ms']} ms ({imports['modules']} modules)")
+	for row in imports["top_self_ms"]:
+		print(f"  {row['self_ms']:>8} ms self  {row['cumulative_ms']:>8} ms cum  {row['module']}")
+
+	samples = [_first_200(args.warmup) * 1000 for _ in range(args.runs)]
+	startup = {
+		"warmup": args.warmup,
+		"runs": [round(s, 1) for s in samples],
+		"min_ms": round(min(samples), 1),
+		"median_ms": round(statistics.median(samples), 1),
+	}
+	print(f"time to first 200 on /health: min {startup['min_ms']} ms, median {startup['median_ms']} ms ({args.runs} runs)")
+
+	if args.json_out:
+		with open(args.json_out, "w", encoding="utf-8") as f:
+			json.dump({"imports": imports, "startup": startup}, f, indent=2)
+	if args.max_ms and startup["median_ms"] > args.max_ms:
+		print(f"REGRESSION: median {startup['median_ms']} ms > {args.max_ms} ms", file=sys.stderr)
+		sys.exit(1)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,26 @@
+import asyncio
+import time
+
+from app.services.cache import SummaryCache
+
+def test_memory_lookup_does_not_wait_for_sqlite(tmp_path):
+	cache = SummaryCache(db_path=str(tmp_path / "cache.sqlite3"))
+	cache.set("k", "v")
+	with cache._db_lock:  # một io thread đang giữ SQLite (query / commit)
+		assert asyncio.run(cache.aget("k")) == "v"
+
+def test_disk_tier_is_capped_and_expires(tmp_path):
+	path = str(tmp_path / "cache.sqlite3")
+	cache = SummaryCache(max_entries=1, ttl_s=3600, db_path=path, db_max_entries=10)
+	for i in range(3 * SummaryCache.PRUNE_EVERY):
+		cache.set(f"k{i}", "v")
+	(count,) = cache._db.execute("SELECT COUNT(*) FROM summary_cache").fetchone()
+	assert count <= 10
+	assert cache.get(f"k{3 * SummaryCache.PRUNE_EVERY - 1}") == "v"
+	assert cache.get("k0") is None
+
+	cache._db.execute("UPDATE summary_cache SET created_at = ?", (time.time() - 7200,))
+	cache._db.commit()
+	reopened = SummaryCache(ttl_s=3600, db_path=path, db_max_entries=10)  # prune lúc mở
+	(count,) = reopened._db.execute("SELECT COUNT(*) FROM summary_cache").fetchone()
+	assert count == 0
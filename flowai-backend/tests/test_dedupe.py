@@ -0,0 +1,63 @@
+from app.utils.dedupe import PageDedupe, strip_repeated_lines
+
+def _invoice(n: int) -> str:
+	return "\n".join([
+		"ACME Corp - Invoice",
+		f"Item A {8 + n}",
+		f"Item B {12 + n}",
+		f"{32 + n}",
+		f"Total: {300 + 7 * n}",
+		"Payment due within 30 days.",
+		f"Page {n + 1} of 6",
+	])
+
+def test_numbers_in_body_lines_are_not_boilerplate():
+	pages = [_invoice(n) for n in range(6)]
+	out, removed = strip_repeated_lines(pages)
+	for n, page in enumerate(out):
+		lines = page.split("\n")
+		# nội dung riêng của từng trang còn nguyên
+		assert f"Item A {8 + n}" in lines
+		assert f"Total: {300 + 7 * n}" in lines
+		assert f"{32 + n}" in lines
+		if n:
+			assert "ACME Corp - Invoice" not in lines
+			assert "Payment due within 30 days." not in lines
+			assert f"Page {n + 1} of 6" not in lines
+	assert removed == {
+		"ACME Corp - Invoice": [1, 2, 3, 4, 5],
+		"Payment due within 30 days.": [1, 2, 3, 4, 5],
+		"Page 1 of 6": [1, 2, 3, 4, 5],
+	}
+
+def test_bare_page_numbers_only_match_at_page_edges():
+	pages = [f"Report\nbody {n}\n{n + 1}\nmore text {n}\n- {n + 1} -" for n in range(4)]
+	out, removed = strip_repeated_lines(pages)
+	assert removed["- 1 -"] == [1, 2, 3]
+	for n, page in enumerate(out[1:], 1):
+		assert page.split("\n") == [f"body {n}", f"{n + 1}", f"more text {n}"]
+
+def test_page_dedupe_streams_in_windows():
+	pulled = []
+
+	def pages():
+		for n in range(12):
+			pulled.append(n)
+			yield _invoice(n)
+
+	dedupe = PageDedupe(window=4)
+	stream = dedupe(pages())
+	first = next(stream)
+	assert len(pulled) == 4  # chỉ đọc cửa sổ đầu tiên
+	out = [first] + list(stream)
+	assert len(out) == 12
+	# header lặp học ở cửa sổ đầu vẫn bị bỏ ở các cửa sổ sau; nội dung riêng còn nguyên
+	assert dedupe.removed_lines["ACME Corp - Invoice"] == list(range(1, 12))
+	assert all(f"Total: {300 + 7 * n}" in page for n, page in enumerate(out))
+	assert dedupe.tokens_saved > 0
+
+def test_page_dedupe_matches_the_list_version_within_one_window():
+	pages = [_invoice(n) for n in range(6)]
+	dedupe = PageDedupe(window=64)
+	assert list(dedupe(pages)) == strip_repeated_lines(pages)[0]
+	assert dedupe.removed_lines == strip_repeated_lines(pages)[1]
@@ -0,0 +1,43 @@
+from app.utils import extractive
+from app.utils.chunk import estimate_tokens
+
+def test_compress_never_returns_more_than_the_budget():
+	text = "Short one. " + "A very long sentence " * 50 + "stop. Tiny."
+	assert extractive.compress(text, 0.05, max_tokens=3) == "Tiny."
+	single = "word " * 400 + "end."
+	out = extractive.compress(single, 0.1)
+	assert out and out != single and estimate_tokens(out) <= int(estimate_tokens(single) * 0.1)
+	assert extractive.compress(" \n ", 0.5) == ""
+
+def test_select_scores_at_most_max_sentences():
+	text = " ".join(f"Sentence {i} about topic {i % 7}." for i in range(5000))
+	picked = extractive.select(text, 10_000, "textrank", max_sentences=200)
+	assert 0 < len(picked) <= 200
+
+def test_cache_hit_skips_compression(monkeypatch):
+	import asyncio
+	import uuid
+
+	from app.core.config import settings
+	from app.services import llm_client, summarize_service
+
+	compressed = []
+
+	async def precompress(chunk, style):
+		compressed.append(chunk)
+		return chunk
+
+	async def generate(prompt, max_tokens=None, **kwargs):
+		return "summary"
+
+	monkeypatch.setattr(settings, "SUMMARY_CACHE_ENABLED", True)
+	monkeypatch.setattr(settings, "EXTRACTIVE_COMPRESS_RATIO", {"bullet": 0.5})
+	monkeypatch.setattr(summarize_service, "_precompress", precompress)
+	monkeypatch.setattr(llm_client, "generate_text", generate)
+	chunk = f"chunk {uuid.uuid4().hex}"
+
+	async def main():
+		return [await summarize_service._summarize_chunk(chunk) for _ in range(2)]
+
+	assert asyncio.run(main()) == ["summary", "summary"]
+	assert compressed == [chunk]
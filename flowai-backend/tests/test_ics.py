@@ -0,0 +1,16 @@
+import re
+
+from app.services.ics import vtimezone
+
+def _observances(tzid, years):
+	text = "".join(vtimezone(tzid, years))
+	return re.findall(r"BEGIN:(STANDARD|DAYLIGHT)\r\nDTSTART:(\d{8})T\d{6}\r\nTZOFFSETFROM:([+-]\d{4})\r\nTZOFFSETTO:([+-]\d{4})", text)
+
+def test_vtimezone_covers_events_before_the_first_transition_of_the_year():
+	obs = _observances("Europe/Berlin", [2025])
+	# event tháng 1: observance mới nhất trước đó phải là giờ chuẩn +0100
+	covering = max((o for o in obs if o[1] <= "20250115"), key=lambda o: o[1])
+	assert covering[0] == "STANDARD" and covering[3] == "+0100"
+
+def test_vtimezone_without_dst_has_a_single_baseline():
+	assert _observances("Asia/Ho_Chi_Minh", [2025]) == [("STANDARD", "19700101", "+0700", "+0700")]
@@ -0,0 +1,155 @@
+import asyncio
+import random
+import sqlite3
+
+import pytest
+
+from app.core.config import settings
+from app.services import llm_client
+from app.services.jobs import JobManager
+
+def _document(paragraphs: int = 6) -> str:
+	rng = random.Random(7)
+	words = [f"w{i}" for i in range(500)]
+	return "\n\n".join(
+		f"para{i} " + " ".join(rng.choice(words) for _ in range(120)) + "." for i in range(paragraphs)
+	)
+
+class FakeLLM:
+	def __init__(self, fail_on=None, block_on=None):
+		self.fail_on = fail_on
+		self.block_on = block_on
+		self.released = asyncio.Event()
+		self.map_calls = []
+
+	async def __call__(self, prompt, max_tokens=None, **kwargs):
+		if prompt.startswith("Merge these partial summaries"):
+			return "final summary"
+		para = next(w for w in prompt.split() if w.startswith("para"))
+		if para == self.fail_on:
+			raise RuntimeError("upstream failed")
+		if para == self.block_on:
+			await self.released.wait()
+		self.map_calls.append(para)
+		return f"summary of {para}"
+
+@pytest.fixture(autouse=True)
+def _settings(monkeypatch):
+	monkeypatch.setattr(settings, "SUMMARY_CHUNK_TOKENS", 200)
+	monkeypatch.setattr(settings, "SUMMARY_MAP_CONCURRENCY", 1)
+	monkeypatch.setattr(settings, "SUMMARY_CACHE_ENABLED", False)
+	monkeypatch.setattr(settings, "JOBS_RETENTION_S", 0)
+
+async def _wait(manager, job_id, statuses=("done", "failed"), timeout=10.0):
+	loop = asyncio.get_running_loop()
+	deadline = loop.time() + timeout
+	while loop.time() < deadline:
+		job = await manager.get(job_id)
+		if job["status"] in statuses:
+			return job
+		await asyncio.sleep(0.01)
+	raise AssertionError(f"job {job_id} stuck in {job['status']}")
+
+def test_start_does_not_create_the_jobs_dir(tmp_path):
+	root = tmp_path / "jobs"
+
+	async def main():
+		manager = JobManager(str(root), workers=1, max_pending=10)
+		await manager.start()
+		assert await manager.get("missing") is None
+		await manager.stop()
+
+	asyncio.run(main())
+	assert not root.exists()
+
+def test_resubmitting_the_same_document_is_deduplicated(tmp_path, monkeypatch):
+	llm = FakeLLM()
+	monkeypatch.setattr(llm_client, "generate_text", llm)
+
+	async def main():
+		manager = JobManager(str(tmp_path), workers=1, max_pending=10)
+		job, dedup = await manager.submit_text(_document(), "bullet")
+		again, dedup_again = await manager.submit_text(_document(), "bullet")
+		assert (dedup, dedup_again) == (False, True)
+		assert again["id"] == job["id"]
+		done = await _wait(manager, job["id"])
+		await manager.stop()
+		return done
+
+	done = asyncio.run(main())
+	assert done["status"] == "done" and done["result"] == "final summary"
+	assert len(llm.map_calls) == len(set(llm.map_calls)) == done["total"]
+
+def test_failed_job_resumes_from_checkpoints(tmp_path, monkeypatch):
+	llm = FakeLLM(fail_on="para4")
+	monkeypatch.setattr(llm_client, "generate_text", llm)
+
+	async def main():
+		manager = JobManager(str(tmp_path), workers=1, max_pending=10)
+		job, _ = await manager.submit_text(_document(), "bullet")
+		failed = await _wait(manager, job["id"])
+		first_run = list(llm.map_calls)
+		llm.fail_on, llm.map_calls = None, []
+		retry, dedup = await manager.submit_text(_document(), "bullet")
+		done = await _wait(manager, retry["id"])
+		await manager.stop()
+		return failed, first_run, dedup, done
+
+	failed, first_run, dedup, done = asyncio.run(main())
+	assert failed["status"] == "failed" and "upstream failed" in failed["error"]
+	assert dedup is False  # job lỗi được xếp lại
+	assert done["status"] == "done"
+	assert done["done"] == done["total"]  # chunk lưu lại không bị đếm hai lần
+	# chỉ các chunk chưa có checkpoint được gọi lại
+	assert "para4" in llm.map_calls
+	assert set(llm.map_calls) == {f"para{i}" for i in range(done["total"])} - set(first_run)
+
+def test_store_error_before_running_marks_the_job_failed(tmp_path):
+	async def main():
+		manager = JobManager(str(tmp_path), workers=1, max_pending=10)
+		manager.store.create_or_get("j1", "text", "bullet", "hash", str(tmp_path / "missing.text"))
+		real_db = manager._db
+		calls = []
+
+		async def flaky(method, *args, **kwargs):
+			calls.append(method)
+			if method == "get" and calls.count("get") == 1:
+				raise sqlite3.OperationalError("database is locked")
+			return await real_db(method, *args, **kwargs)
+
+		manager._db = flaky
+		await manager._run("j1")  # không được ném lỗi ra worker
+		job = await real_db("get", "j1")
+		await manager.stop()
+		return job
+
+	job = asyncio.run(main())
+	assert job["status"] == "failed" and "database is locked" in job["error"]
+
+def test_restart_requeues_interrupted_jobs(tmp_path, monkeypatch):
+	llm = FakeLLM(block_on="para3")
+	monkeypatch.setattr(llm_client, "generate_text", llm)
+
+	async def first_run():
+		manager = JobManager(str(tmp_path), workers=1, max_pending=10)
+		job, _ = await manager.submit_text(_document(), "bullet")
+		while "para2" not in llm.map_calls:
+			await asyncio.sleep(0.01)
+		await manager.stop()  # app tắt giữa chừng
+		return job["id"]
+
+	job_id = asyncio.run(first_run())
+	interrupted = list(llm.map_calls)
+
+	async def second_run():
+		llm.block_on, llm.released, llm.map_calls = None, asyncio.Event(), []
+		manager = JobManager(str(tmp_path), workers=1, max_pending=10)
+		assert (await manager.get(job_id))["status"] == "running"
+		await manager.start()
+		done = await _wait(manager, job_id)
+		await manager.stop()
+		return done
+
+	done = asyncio.run(second_run())
+	assert done["status"] == "done"
+	assert set(llm.map_calls) == {f"para{i}" for i in range(done["total"])} - set(interrupted)
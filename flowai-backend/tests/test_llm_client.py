@@ -0,0 +1,28 @@
+import asyncio
+import json
+
+import httpx
+
+from app.services import llm_client
+
+def test_gemini_stream_skips_the_usage_only_final_chunk(monkeypatch):
+	events = [
+		{"candidates": [{"content": {"parts": [{"text": "Hello "}]}}]},
+		{"candidates": [{"content": {"parts": [{"text": "world"}]}, "finishReason": "STOP"}]},
+		{"usageMetadata": {"promptTokenCount": 3, "candidatesTokenCount": 2}},
+	]
+	body = "".join(f"data: {json.dumps(e)}\r\n\r\n" for e in events)
+
+	def handler(request):
+		return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+
+	async def main():
+		client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+		monkeypatch.setattr(llm_client, "get_http_client", lambda: client)
+		backend = llm_client.GeminiBackend("gemini-test", api_key="k")
+		try:
+			return [t async for t in backend.stream("hi")]
+		finally:
+			await client.aclose()
+
+	assert asyncio.run(main()) == ["Hello ", "world"]
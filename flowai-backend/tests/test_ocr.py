@@ -0,0 +1,38 @@
+import asyncio
+
+from app.core.config import settings
+from app.services import llm_client, ocr_service
+from app.services.cache import summary_cache
+
+def test_malformed_page_output_is_salvaged_but_not_cached(monkeypatch):
+	outputs = iter([
+		'{"pages": ["Invoice 42\\nTotal: 307", "Second pa',  # cắt cụt giữa chừng, thiếu trang
+		'{"pages": ["Invoice 42\\nTotal: 307"]}',
+		'{"pages": ["Second pa',
+	])
+
+	async def fake(prompt, images, max_tokens=None, json_mode=False):
+		return next(outputs)
+
+	saved = {}
+
+	async def aset(key, value):
+		saved[key] = value
+
+	async def aget(key):
+		return None
+
+	monkeypatch.setattr(settings, "SUMMARY_CACHE_ENABLED", True)
+	monkeypatch.setattr(settings, "OCR_BATCH_SIZE", 2)
+	monkeypatch.setattr(llm_client, "generate_multimodal", fake)
+	monkeypatch.setattr(summary_cache, "aget", aget)
+	monkeypatch.setattr(summary_cache, "aset", aset)
+
+	out = asyncio.run(ocr_service._ocr_rendered([(0, b"page-0"), (1, b"page-1")]))
+	assert out == {0: "Invoice 42\nTotal: 307", 1: "Second pa"}
+	assert list(saved.values()) == ["Invoice 42\nTotal: 307"]
+
+def test_salvage_keeps_plain_text_and_drops_json_syntax():
+	assert ocr_service._salvage("  Plain transcription  ") == "Plain transcription"
+	assert ocr_service._salvage('{"pages": ["a \\"quoted\\" line", "b"], "note": "x') == 'a "quoted" line\nb\nx'
+	assert ocr_service._salvage('{"pages": [') == ""
@@ -0,0 +1,74 @@
+from app.services.scheduler import replan, schedule
+
+TASKS = [
+	{"id": 1, "text": "a", "duration": 2},
+	{"id": 2, "text": "b", "duration": 3},
+	{"id": 3, "text": "c", "duration": 2},
+]
+
+def _slots(events):
+	return sorted((e["id"], e["dateStr"], e["start"], e["end"]) for e in events)
+
+def _overlaps(events):
+	spans = sorted((e["dateStr"], e["start"], e["end"]) for e in events)
+	return any(a[0] == b[0] and b[1] < a[2] for a, b in zip(spans, spans[1:]))
+
+def _apply(previous, result):
+	# lịch sau re-plan: bỏ event bị huỷ / thay thế, thêm event mới
+	keys = {(str(e["id"]), e.get("part") or 1) for e in result["changed"] + result["cancelled"]}
+	rest = [e for e in previous if (str(e["id"]), e.get("part") or 1) not in keys]
+	return rest + result["changed"]
+
+def test_unchanged_pinned_event_is_not_cancelled():
+	prev = schedule(TASKS[:3], "2025-01-06")
+	for e in prev:
+		if e["id"] == 3:
+			e["pinned"] = True
+	out = replan(prev, [{"op": "resize", "id": 1, "duration": 1}])
+	assert all(e["id"] != 3 for e in out["changed"] + out["cancelled"])
+	assert not _overlaps(_apply(prev, out))
+
+def test_every_part_of_a_pinned_task_blocks_the_timeline():
+	prev = schedule(TASKS, "2025-01-06")
+	pinned = [e for e in prev if e["id"] == 2]
+	assert len(pinned) == 2
+	for e in pinned:
+		e["pinned"] = True
+	out = replan(prev, [{"op": "resize", "id": 1, "duration": 3}])
+	assert all(e["id"] != 2 for e in out["changed"] + out["cancelled"])
+	assert not _overlaps(_apply(prev, out))
+
+def test_kept_parts_get_the_new_part_count():
+	tasks = [{"id": 1, "text": "a", "duration": 2}, {"id": 2, "text": "b", "duration": 3}, {"id": 3, "text": "c", "duration": 1}]
+	prev = schedule(tasks, "2025-01-06")
+	out = replan(prev, [{"op": "pin", "id": 3, "dateStr": "2025-01-06", "start": "14:00"}])
+	after = _apply(prev, out)
+	parts = [e for e in after if e["id"] == 2]
+	assert {e["parts"] for e in parts} == {len(parts)}
+	assert sorted(e["part"] for e in parts) == list(range(1, len(parts) + 1))
+	assert not _overlaps(after)
+
+def test_replan_keeps_uids_of_moved_events():
+	prev = schedule(TASKS, "2025-01-06")
+	out = replan(prev, [{"op": "resize", "id": 1, "duration": 1}])
+	before = {(e["id"], e.get("part")): e["uid"] for e in prev}
+	for e in out["changed"]:
+		if (e["id"], e.get("part")) in before:
+			assert e["uid"] == before[(e["id"], e.get("part"))]
+			assert e["sequence"] == 1
+
+def test_same_plan_keeps_uids_and_other_plans_get_distinct_uids():
+	a = schedule(TASKS, "2025-01-06")
+	again = schedule(TASKS, "2025-01-13")
+	assert [e["uid"] for e in a] == [e["uid"] for e in again]
+	other = schedule([{**t, "text": t["text"] + "!"} for t in TASKS], "2025-01-06")
+	assert _slots(a) == _slots(other)
+	assert not {e["uid"] for e in a} & {e["uid"] for e in other}
+	by_id = [schedule(TASKS, "2025-01-06", plan_id=p) for p in ("alice", "bob")]
+	assert not {e["uid"] for e in by_id[0]} & {e["uid"] for e in by_id[1]}
+
+def test_replan_reuses_the_plan_salt_for_new_events():
+	prev = schedule(TASKS, "2025-01-06", plan_id="alice")
+	out = replan(prev, [{"op": "add", "task": {"text": "d", "duration": 1}}])
+	salt = prev[0]["uid"].split("-")[1]
+	assert out["changed"] and all(e["uid"].split("-")[1] == salt for e in out["changed"])
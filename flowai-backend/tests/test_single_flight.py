@@ -0,0 +1,35 @@
+import asyncio
+
+from app.services.llm_client import SingleFlight
+
+def test_caller_arriving_while_abandoned_call_unwinds_gets_a_fresh_call():
+	calls = []
+
+	async def upstream():
+		calls.append(1)
+		try:
+			await asyncio.sleep(10)
+		except asyncio.CancelledError:
+			await asyncio.sleep(0.05)  # dọn dẹp chậm (đóng kết nối...)
+			raise
+		return "stale"
+
+	async def main():
+		flight = SingleFlight()
+		a = asyncio.ensure_future(flight.do("k", upstream))
+		await asyncio.sleep(0.01)
+		a.cancel()  # waiter cuối bỏ đi → task upstream bị huỷ
+		await asyncio.sleep(0.01)  # task vẫn đang huỷ dở
+		calls_before = len(calls)
+
+		async def fresh():
+			calls.append(1)
+			return "fresh"
+
+		b = await flight.do("k", fresh)
+		return b, calls_before, flight.stats()
+
+	b, calls_before, stats = asyncio.run(main())
+	assert b == "fresh"
+	assert calls_before == 1 and len(calls) == 2
+	assert stats["abandoned"] == 1